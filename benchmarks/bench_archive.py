@@ -0,0 +1,95 @@
+"""
+JSON-per-entity history vs the columnar HistoryArchive (needs pyarrow).
+
+Builds a synthetic dataset, exports it to a Parquet and an Arrow IPC archive
+in a temp directory and times loading a report window into DataHandler both
+ways:
+
+    python benchmarks/bench_archive.py --operators 500 --days 365
+    python benchmarks/bench_archive.py --operators 100 --days 60 --repeat 5
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+from synthetic import FakeS3, generate_dataset, dataset_dates
+from bench_pipeline import RESULTS_DIR, git_commit, time_case
+
+from DataHandler import DataHandler
+from HistoryArchive import HistoryArchive, REPORT_METRICS
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def load_archive(archive, dates, metrics):
+    def run(_):
+        DataHandler().load_archive(archive, dates, metrics)
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operators', action='store', type=int, default=500,
+                        help='number of synthetic CSM operators')
+    parser.add_argument('--days', action='store', type=int, default=365,
+                        help='days of history per entity')
+    parser.add_argument('--window', action='store', type=int, default=5,
+                        help='report window length in days')
+    parser.add_argument('--repeat', action='store', type=int, default=3,
+                        help='timed runs per case')
+    parser.add_argument('--seed', action='store', type=int, default=0,
+                        help='dataset seed')
+    parser.add_argument('--output', action='store', type=str, default="",
+                        help='results path, default is benchmarks/results/<commit>-archive-<operators>x<days>.json')
+    args = parser.parse_args()
+
+    dataset = generate_dataset(csm_operators=args.operators, days=args.days, seed=args.seed)
+    s3 = FakeS3(dataset)
+    histories = {key.split("/")[-1]: history for key, history in dataset.items()}
+    window = dataset_dates(args.days)[-args.window:]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sizes = {"json_bytes": sum(len(body) for body in s3.objects.values())}
+        archives = {}
+        for format in ["parquet", "arrow"]:
+            archives[format] = HistoryArchive(os.path.join(tmp, format), format=format)
+            start = time.perf_counter()
+            archives[format].export(histories)
+            print(f"export {format:<8} {time.perf_counter() - start:.2f}s")
+            sizes[f"{format}_bytes"] = dir_size(os.path.join(tmp, format))
+
+        cases = {
+            "json_load_all": (lambda: None, lambda _: DataHandler().load_data(s3)),
+            "parquet_window_report": (lambda: None, load_archive(archives["parquet"], window, REPORT_METRICS)),
+            "parquet_window_all": (lambda: None, load_archive(archives["parquet"], window, None)),
+            "arrow_window_report": (lambda: None, load_archive(archives["arrow"], window, REPORT_METRICS)),
+            "parquet_year_report": (lambda: None, load_archive(archives["parquet"], dataset_dates(args.days), REPORT_METRICS)),
+        }
+        results = {}
+        for name, (setup, run) in cases.items():
+            results[name] = time_case(setup, run, args.repeat)
+            print(f"{name:<24} median {results[name]['median_s']:.4f}s  min {results[name]['min_s']:.4f}s")
+
+    for name, size in sizes.items():
+        print(f"{name:<24} {size / 1e6:.1f} MB")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-archive-{args.operators}x{args.days}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "python": platform.python_version(),
+                "operators": args.operators,
+                "days": args.days,
+                "window": args.window,
+                "repeat": args.repeat,
+                "seed": args.seed,
+                "sizes": sizes,
+            },
+            "cases": results,
+        }, f, indent=2)
+    print(f"results written to {output}")
@@ -0,0 +1,278 @@
+"""
+Offline benchmark suite for the analysis and rendering pipeline.
+
+Generates a synthetic Rated-shaped dataset (see synthetic.py), serves it from
+an in-memory S3 stub and times each pipeline step. Results are written as
+json under benchmarks/results/ so runs can be compared across commits:
+
+    python benchmarks/bench_pipeline.py --operators 400 --days 30
+    python benchmarks/bench_pipeline.py --cases normalize,stats,zscores --repeat 10
+    python benchmarks/bench_pipeline.py --compare results/a.json results/b.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import matplotlib
+matplotlib.use("Agg")
+
+from synthetic import FakeS3, generate_dataset, dataset_dates
+
+from DataHandler import DataHandler
+from StateSnapshot import STATE_TABLES
+from utils import DESCRIPTIONS, ATTEST_METRICS
+
+# histories per normalize_histories call in normalize_batched
+NORMALIZE_BATCH = 64
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+class Bench:
+    def __init__(self, operators, days, window, seed):
+        self.operators = operators
+        self.days = days
+        self.dates = dataset_dates(days)
+        self.window = self.dates[-window:]
+        self.window_key = f"{self.window[0]}_{self.window[-1]}"
+        self.dataset = generate_dataset(csm_operators=operators, days=days, seed=seed)
+        self.s3 = FakeS3(self.dataset)
+        self.operator_id = 1
+
+    def loaded(self):
+        dh = DataHandler()
+        dh.load_data(self.s3)
+        return dh
+
+    def analysed(self):
+        dh = self.loaded()
+        for module in ["csm", "sdvt", "curated"]:
+            dh.get_mva(self.window, module=module)
+        for module in ["csm", "sdvt", "curated"]:
+            dh.get_statistics(module=module)
+            dh.get_zscores(module=module)
+        return dh
+
+    # each case returns (setup, run); setup output is passed to run and is not timed
+    def cases(self):
+        return {
+            "normalize": (lambda: list(self.dataset.values()), self.run_normalize),
+            "normalize_batched": (lambda: list(self.dataset.values()), self.run_normalize_batched),
+            "load": (lambda: None, lambda _: self.loaded()),
+            "load_window": (lambda: None, lambda _: DataHandler().load_data(self.s3, dates=self.window)),
+            "mva": (self.loaded, self.run_mva),
+            "stats": (self.with_mva, self.run_stats),
+            "zscores": (self.with_stats, self.run_zscores),
+            "create_df": (self.analysed, lambda dh: dh.create_df()),
+            "plotting_data": (self.analysed, self.run_plotting_data),
+            "render_histograms": (self.analysed, self.run_histograms),
+            "render_time_series": (self.analysed, self.run_time_series),
+            "build_pdf": (self.with_charts, self.run_pdfs),
+            "state_save": (self.analysed, self.run_state_save),
+            "state_load": (self.with_state, self.run_state_load),
+            "state_load_window": (self.with_state, lambda root: self.run_state_load(root, [self.window_key])),
+            "state_load_report": (self.with_state, lambda root: self.run_state_load(root, read=[self.window_key])),
+        }
+
+    def run_normalize(self, histories):
+        dh = DataHandler()
+        for history in histories:
+            dh.normalize_data(history)
+
+    def run_normalize_batched(self, histories):
+        dh = DataHandler()
+        for start in range(0, len(histories), NORMALIZE_BATCH):
+            dh.normalize_histories(histories[start:start + NORMALIZE_BATCH])
+
+    def run_mva(self, dh):
+        for module in ["csm", "sdvt", "curated"]:
+            dh.get_mva(self.window, module=module)
+
+    def with_mva(self):
+        dh = self.loaded()
+        self.run_mva(dh)
+        return dh
+
+    def run_stats(self, dh):
+        for module in ["csm", "sdvt", "curated"]:
+            dh.get_statistics(module=module)
+
+    def with_stats(self):
+        dh = self.with_mva()
+        self.run_stats(dh)
+        return dh
+
+    def run_zscores(self, dh):
+        for module in ["csm", "sdvt", "curated"]:
+            dh.get_zscores(module=module)
+
+    def run_plotting_data(self, dh):
+        from visualizations import generate_plotting_data
+        for variable, meta_data in DESCRIPTIONS.items():
+            generate_plotting_data(dh.node_data, variable, [self.operator_id], meta_data["variant"], self.window_key, dh.sdvt_data, dh.curated_module_data)
+
+    def run_histograms(self, dh):
+        from VisualHandler import VisualHandler
+        with in_temp_dir():
+            VisualHandler([self.operator_id], dh).generate_histograms(node_data=dh.node_data, date=self.window_key, sdvt_data=dh.sdvt_data, curated_module_data=dh.curated_module_data)
+
+    def run_time_series(self, dh):
+        from VisualHandler import VisualHandler
+        with in_temp_dir():
+            VisualHandler([self.operator_id], dh).generate_time_series(data=dh.node_data, agg_data=dh.agg_data)
+
+    def with_charts(self):
+        from VisualHandler import VisualHandler
+        dh = self.analysed()
+        # one chart is enough to exercise image embedding in the PDF
+        buffer = io.BytesIO()
+        with in_temp_dir():
+            from visualizations import plot_zscores
+            import matplotlib.pyplot as plt
+            plot_zscores(node_data=dh.node_data, variable="avgValidatorEffectiveness", operator_ids=[self.operator_id], variant="metric", date=self.window_key)
+            for root, _, files in os.walk("reports"):
+                for name in files:
+                    with open(os.path.join(root, name), "rb") as f:
+                        buffer = io.BytesIO(f.read())
+        return dh, buffer
+
+    def run_pdfs(self, state):
+        from visualizations import create_metric_page
+        dh, buffer = state
+        operator = f"CSM Operator {self.operator_id} - Lido Community Staking Module"
+        with in_temp_dir():
+            for key, meta in DESCRIPTIONS.items():
+                stat_type = "per_val" if key in ATTEST_METRICS else "metric"
+                metric_data = {
+                    **dh.node_stats[self.window_key][key][stat_type],
+                    **dh.node_data[self.window_key][operator][key],
+                    **{f"{k}_sdvt": v for k, v in dh.sdvt_stats[self.window_key][key][stat_type].items()},
+                    **{f"{k}_curated": v for k, v in dh.curated_stats[self.window_key][key][stat_type].items()},
+                }
+                metric_data["validatorCount"] = dh.node_data[self.window_key][operator]["validatorCount"]["metric"]
+                metric_data["totalUniqueAttestations"] = dh.node_data[self.window_key][operator]["totalUniqueAttestations"]["metric"]
+                metric_data.setdefault("sum", None)
+                for k in ["zscore_per_val", "zscore_attest_pct", "zscore_metric", "attest_pct", "per_val"]:
+                    metric_data.setdefault(k, None)
+                buffers = [io.BytesIO(buffer.getvalue()) for _ in range(7)]
+                create_metric_page(f"{key}.pdf", operator, key, meta["desc"], buffers, metric_data, self.window_key)
+
+    def run_state_save(self, dh):
+        with tempfile.TemporaryDirectory() as tmp:
+            dh.save_state(tmp)
+
+    def with_state(self):
+        # kept for the whole run, the OS page cache is warm as it would be for the next run
+        if not hasattr(self, "state_dir"):
+            self.state_dir = tempfile.mkdtemp()
+            self.analysed().save_state(self.state_dir)
+        return self.state_dir
+
+    def run_state_load(self, root, dates=None, read=None):
+        # tables decode on first read, every loaded date is read unless read names a few
+        dh = DataHandler()
+        dh.load_state(root, dates)
+        for table in STATE_TABLES:
+            state = getattr(dh, table)
+            for date in read if read is not None else list(state):
+                state.get(date)
+
+@contextmanager
+def in_temp_dir():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            yield tmp
+        finally:
+            os.chdir(cwd)
+
+def time_case(setup, run, repeat):
+    runs = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        runs.append(time.perf_counter() - start)
+    return {
+        "min_s": min(runs),
+        "median_s": statistics.median(runs),
+        "runs": runs,
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'case':<20} {base['meta']['commit']:>12} {new['meta']['commit']:>12}   ratio")
+    for case, res in new["cases"].items():
+        if case not in base["cases"]:
+            continue
+        before = base["cases"][case]["median_s"]
+        after = res["median_s"]
+        ratio = after / before if before else float("nan")
+        print(f"{case:<20} {before:>11.4f}s {after:>11.4f}s   {ratio:5.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operators', action='store', type=int, default=400,
+                        help='number of synthetic CSM operators')
+    parser.add_argument('--days', action='store', type=int, default=30,
+                        help='days of history per entity')
+    parser.add_argument('--window', action='store', type=int, default=5,
+                        help='MVA window length in days')
+    parser.add_argument('--repeat', action='store', type=int, default=3,
+                        help='timed runs per case')
+    parser.add_argument('--cases', action='store', type=str, default="",
+                        help='comma separated cases to run, default is all')
+    parser.add_argument('--seed', action='store', type=int, default=0,
+                        help='dataset seed')
+    parser.add_argument('--output', action='store', type=str, default="",
+                        help='results path, default is benchmarks/results/<commit>-<operators>x<days>.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two result files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    bench = Bench(args.operators, args.days, args.window, args.seed)
+    selected = [c.strip() for c in args.cases.split(",") if c.strip()]
+    results = {}
+    for name, (setup, run) in bench.cases().items():
+        if selected and name not in selected:
+            continue
+        results[name] = time_case(setup, run, args.repeat)
+        print(f"{name:<20} median {results[name]['median_s']:.4f}s  min {results[name]['min_s']:.4f}s")
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{args.operators}x{args.days}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "meta": {
+                "commit": commit,
+                "python": platform.python_version(),
+                "operators": args.operators,
+                "days": args.days,
+                "window": args.window,
+                "repeat": args.repeat,
+                "seed": args.seed,
+            },
+            "cases": results,
+        }, f, indent=2)
+    print(f"results written to {output}")
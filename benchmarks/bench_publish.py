@@ -0,0 +1,52 @@
+"""
+Publishing a synthetic reports tree with ReportPublisher against a local
+S3 stand-in with simulated per-request latency:
+
+    python benchmarks/bench_publish.py --operators 400 --workers 1,16
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from synthetic import FakeS3
+
+from ReportPublisher import ReportPublisher
+
+def build_tree(root, operators, charts, reports):
+    # random bytes, so the hashing cost is that of real images and PDFs
+    for n in range(operators):
+        for kind, count, size, ext in [("histogram", charts, 60_000, "png"), ("report", reports, 200_000, "pdf")]:
+            directory = os.path.join(root, "CSM", str(n), kind)
+            os.makedirs(directory, exist_ok=True)
+            for m in range(count):
+                with open(os.path.join(directory, f"{m}.{ext}"), "wb") as f:
+                    f.write(os.urandom(size))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operators', action='store', type=int, default=400,
+                        help='operators with a report set each')
+    parser.add_argument('--charts', action='store', type=int, default=6,
+                        help='PNG charts per operator')
+    parser.add_argument('--reports', action='store', type=int, default=4,
+                        help='PDF reports per operator')
+    parser.add_argument('--s3-latency', action='store', type=float, default=0.03,
+                        help='seconds per simulated S3 request')
+    parser.add_argument('--workers', action='store', type=str, default="1,16",
+                        help='comma separated uploader counts')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        build_tree(root, args.operators, args.charts, args.reports)
+        for workers in [int(n) for n in args.workers.split(",")]:
+            publisher = ReportPublisher(FakeS3(latency=args.s3_latency), root, workers)
+            first = publisher.publish("bench")
+            started = time.perf_counter()
+            second = publisher.publish("bench")
+            rerun = time.perf_counter() - started
+            print(f"workers {workers:>2}  {first['files']} files  full {first['seconds']:6.2f}s  unchanged rerun {rerun:5.2f}s ({second['uploaded']} uploaded)")
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,109 @@
+"""
+Load test of the query service. Analyses a synthetic dataset (see
+synthetic.py), serves it with QueryService on a local port and fires a mix
+of operator, rank, window and module stats queries from client threads
+over keep-alive connections:
+
+    python benchmarks/bench_query_service.py --operators 400 --days 30 --clients 8 --requests 2000
+"""
+import argparse
+import random
+import threading
+import time
+from http.client import HTTPConnection
+
+import numpy as np
+
+from synthetic import FakeS3, generate_dataset, dataset_dates
+
+from DataHandler import DataHandler
+from QueryService import QueryService, serve
+
+METRICS = ["avgValidatorEffectiveness", "avgInclusionDelay", "sumMissedAttestations", "avgCorrectness"]
+
+def analysed(operators, days, window):
+    dh = DataHandler()
+    dh.load_data(FakeS3(generate_dataset(csm_operators=operators, days=days)))
+    for module in ["csm", "sdvt", "curated"]:
+        dh.get_mva(window, module=module)
+        dh.get_statistics(module=module)
+        dh.get_zscores(module=module)
+    return dh
+
+def queries(rng, operators, dates, window_key):
+    # operator lookups and windows over a few popular ranges, as dashboards would ask
+    ranges = [(dates[-n], dates[-1]) for n in (7, 14, 30) if n <= len(dates)]
+    while True:
+        op = rng.randrange(operators)
+        metric = rng.choice(METRICS)
+        kind = rng.random()
+        if kind < 0.4:
+            yield "operator", f"/operators/csm/{op}?date={rng.choice([window_key, dates[-1]])}"
+        elif kind < 0.6:
+            yield "rank", f"/operators/csm/{op}/rank?metric={metric}&date={window_key}"
+        elif kind < 0.9:
+            start, end = rng.choice(ranges)
+            yield "window", f"/operators/csm/{op}/window?metric={metric}&start={start}&end={end}"
+        else:
+            yield "stats", f"/modules/csm/stats?metric={metric}"
+
+def client(port, generator, count, latencies):
+    connection = HTTPConnection("127.0.0.1", port)
+    for _ in range(count):
+        kind, path = next(generator)
+        started = time.perf_counter()
+        connection.request("GET", path)
+        response = connection.getresponse()
+        response.read()
+        latencies.setdefault(kind, []).append(time.perf_counter() - started)
+        assert response.status == 200, (path, response.status)
+    connection.close()
+
+def report(name, values):
+    ms = np.array(values) * 1000
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    print(f"{name:<9} {len(ms):>6}  p50 {p50:6.2f}ms  p90 {p90:6.2f}ms  p99 {p99:6.2f}ms  max {ms.max():7.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--operators', action='store', type=int, default=400)
+    parser.add_argument('--days', action='store', type=int, default=30)
+    parser.add_argument('--window', action='store', type=int, default=5,
+                        help='days of the MVA window')
+    parser.add_argument('--clients', action='store', type=int, default=8)
+    parser.add_argument('--requests', action='store', type=int, default=2000,
+                        help='requests per client')
+    args = parser.parse_args()
+
+    dates = dataset_dates(args.days)
+    window = dates[-args.window:]
+    started = time.perf_counter()
+    service = QueryService(analysed(args.operators, args.days, window))
+    print(f"analysed and indexed in {time.perf_counter() - started:.1f}s")
+
+    server = serve(service, port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    window_key = f"{window[0]}_{window[-1]}"
+    results = [{} for _ in range(args.clients)]
+    threads = [
+        threading.Thread(target=client, args=(server.server_port, queries(random.Random(n), args.operators, dates, window_key), args.requests, results[n]))
+        for n in range(args.clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    by_kind = {}
+    for latencies in results:
+        for kind, values in latencies.items():
+            by_kind.setdefault(kind, []).extend(values)
+    for kind in ["operator", "rank", "window", "stats"]:
+        report(kind, by_kind.get(kind, []))
+    report("all", [v for values in by_kind.values() for v in values])
+    info = service.window.cache_info()
+    total = args.clients * args.requests
+    print(f"{total / elapsed:.0f} requests/s with {args.clients} clients, window cache {info.hits} hits / {info.misses} misses")
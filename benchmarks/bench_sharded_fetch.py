@@ -0,0 +1,66 @@
+"""
+Sharded fetch throughput against a local S3 stand-in.
+
+Each worker is a ShardedFetcher thread with its own id, as separate
+processes or hosts would be. Rated and S3 round trips are simulated with
+sleeps, so the numbers show how coordination (leases, conditional writes,
+retries) scales with worker count rather than CPU speed:
+
+    python benchmarks/bench_sharded_fetch.py --entities 500 --workers 1,2,4,8
+"""
+import argparse
+import threading
+import time
+
+from synthetic import FakeS3, entity_ids, generate_history
+
+from RatedHandler import RatedHandler
+from ShardedFetch import ShardedFetcher
+
+class FakeRated(RatedHandler):
+    def __init__(self, ids, latency):
+        self.rated_ids = ids
+        self.registry = None
+        self.latency = latency
+
+    def fetch_entity(self, id):
+        # attestations, effectiveness, rewards, penalties
+        time.sleep(4 * self.latency)
+        return generate_history(id, days=5)
+
+def run(entities, workers, shards, rated_latency, s3_latency):
+    ids = entity_ids(csm_operators=entities)
+    s3 = FakeS3(latency=s3_latency)
+    fetchers = [ShardedFetcher(s3, FakeRated(ids, rated_latency), shards, worker_id=f"worker-{n}") for n in range(workers)]
+    threads = [threading.Thread(target=fetcher.run) for fetcher in fetchers]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    persisted = sum(f.counts["persisted"] for f in fetchers)
+    conflicts = sum(f.counts["conflicts"] for f in fetchers)
+    assert persisted == len(ids), (persisted, len(ids))
+    return elapsed, len(ids), conflicts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entities', action='store', type=int, default=500,
+                        help='number of synthetic CSM operators')
+    parser.add_argument('--workers', action='store', type=str, default="1,2,4,8",
+                        help='comma separated worker counts')
+    parser.add_argument('--shards', action='store', type=int, default=32,
+                        help='shards the entities are split into')
+    parser.add_argument('--rated-latency', action='store', type=float, default=0.005,
+                        help='seconds per simulated Rated request')
+    parser.add_argument('--s3-latency', action='store', type=float, default=0.002,
+                        help='seconds per simulated S3 request')
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in [int(n) for n in args.workers.split(",")]:
+        elapsed, entities, conflicts = run(args.entities, workers, args.shards, args.rated_latency, args.s3_latency)
+        baseline = baseline or elapsed
+        print(f"workers {workers:>2}  {elapsed:6.2f}s  {entities / elapsed:7.1f} entities/s  speedup {baseline / elapsed:4.1f}x  conflicts {conflicts}")
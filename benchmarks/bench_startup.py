@@ -0,0 +1,112 @@
+"""
+Startup-time benchmark for the csm_analysis CLI.
+
+Runs `python -X importtime` for the import set of each run profile (fetch,
+analysis, render) in a fresh interpreter and reports the cumulative import
+time in milliseconds. Results are compared against STARTUP_BUDGET_MS so a
+change that drags a heavy module back onto the startup path fails loudly.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--output results.json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# modules imported by each stage of JobRunner.run
+PROFILES = {
+    "cli": ["csm_analysis"],
+    "fetch": ["JobRunner", "RatedHandler"],
+    "analysis": ["JobRunner", "DataHandler"],
+    "render": ["JobRunner", "DataHandler", "VisualHandler", "ReportHandler"],
+}
+
+# modules that must never be imported by a profile
+FORBIDDEN = {
+    "cli": ["pandas", "matplotlib", "seaborn", "reportlab", "requests"],
+    "fetch": ["pandas", "matplotlib", "seaborn", "reportlab"],
+    "analysis": ["pandas", "matplotlib", "seaborn", "reportlab"],
+    "render": [],
+}
+
+STARTUP_BUDGET_MS = {
+    "cli": 600,
+    "fetch": 800,
+    "analysis": 900,
+    "render": 3000,
+}
+
+def parse_importtime(stderr):
+    # lines look like: "import time:      self [us] | cumulative | imported package"
+    total_us = 0
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative_us)
+        # top level imports are indented by a single space only
+        if not name.startswith("  "):
+            total_us += int(cumulative_us)
+    return total_us, modules
+
+def measure(profile):
+    code = "import " + ", ".join(PROFILES[profile])
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import failed for profile {profile}: {result.stderr.splitlines()[-1:]}")
+    return parse_importtime(result.stderr)
+
+def run(repeat=5):
+    results = {}
+    for profile in PROFILES:
+        runs = []
+        modules = {}
+        for _ in range(repeat):
+            total_us, modules = measure(profile)
+            runs.append(total_us / 1000)
+        runs.sort()
+        results[profile] = {
+            "median_ms": runs[len(runs) // 2],
+            "min_ms": runs[0],
+            "budget_ms": STARTUP_BUDGET_MS[profile],
+            "forbidden_loaded": [m for m in FORBIDDEN[profile] if m in modules],
+            "slowest": sorted(modules.items(), key=lambda x: x[1], reverse=True)[:10],
+        }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', action='store', type=int, default=5,
+                        help='number of fresh interpreters per profile')
+    parser.add_argument('--output', action='store', type=str, default="",
+                        help='write results as json to this path')
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    failed = False
+    for profile, res in results.items():
+        status = "ok"
+        if res["forbidden_loaded"]:
+            status = f"FAIL loads {', '.join(res['forbidden_loaded'])}"
+            failed = True
+        elif res["median_ms"] > res["budget_ms"]:
+            status = "FAIL over budget"
+            failed = True
+        print(f"{profile:<10} median {res['median_ms']:8.1f} ms  (budget {res['budget_ms']} ms)  {status}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if failed else 0)
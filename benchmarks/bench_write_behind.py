@@ -0,0 +1,46 @@
+"""
+Sequential fetch (RatedHandler.write_api_data) with synchronous PUTs versus
+a WriteBehindWriter. Rated and S3 round trips are simulated with sleeps:
+
+    python benchmarks/bench_write_behind.py --entities 500 --s3-latency 0.02
+"""
+import argparse
+import time
+
+from synthetic import FakeS3, entity_ids
+from bench_sharded_fetch import FakeRated
+
+from WriteBehind import WriteBehindWriter
+
+def run(entities, rated_latency, s3_latency, workers):
+    ids = entity_ids(csm_operators=entities)
+    s3 = FakeS3(latency=s3_latency)
+    start = time.perf_counter()
+    if workers:
+        writer = WriteBehindWriter(s3, workers=workers)
+        FakeRated(ids, rated_latency).write_api_data(writer)
+        fetched = time.perf_counter() - start
+        results = writer.close()
+        assert all(results.values()) and len(results) == len(ids)
+    else:
+        FakeRated(ids, rated_latency).write_api_data(s3)
+        fetched = time.perf_counter() - start
+    assert s3.puts == len(ids)
+    return fetched, time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entities', action='store', type=int, default=500,
+                        help='number of synthetic CSM operators')
+    parser.add_argument('--rated-latency', action='store', type=float, default=0.005,
+                        help='seconds per simulated Rated request')
+    parser.add_argument('--s3-latency', action='store', type=float, default=0.02,
+                        help='seconds per simulated S3 request')
+    parser.add_argument('--workers', action='store', type=str, default="0,4,8",
+                        help='comma separated uploader counts, 0 writes synchronously')
+    args = parser.parse_args()
+
+    for workers in [int(n) for n in args.workers.split(",")]:
+        fetched, total = run(args.entities, args.rated_latency, args.s3_latency, workers)
+        label = f"write-behind x{workers}" if workers else "synchronous"
+        print(f"{label:<16}  fetch loop {fetched:6.2f}s  until stored {total:6.2f}s")
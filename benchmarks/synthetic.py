@@ -0,0 +1,209 @@
+"""
+Synthetic Rated-shaped datasets for offline benchmarks.
+
+Entity histories mirror what RatedHandler.write_api_data stores under
+lido_csm/operator_data/{id}: one record per day keyed by date, carrying the
+ATTEST_METRICS/OTHER_METRICS fields, epoch/slot bounds and timestamps, with
+None gaps and a long-tailed validatorCount.
+"""
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils import LIDO_CURATED, LIDO_SDVT
+
+OPERATOR_PREFIX = "lido_csm/operator_data/"
+SLOTS_PER_DAY = 7200
+EPOCHS_PER_DAY = 225
+# first slot of 2025-02-01, only used to keep slot/epoch fields plausible
+GENESIS_OFFSET_SLOT = 10_890_000
+
+# demo dates dropped by DataHandler.normalize_data, start after them
+DEFAULT_START_DATE = "2025-02-01"
+
+def entity_ids(csm_operators=400, curated=None, sdvt=None):
+    curated = len(LIDO_CURATED) if curated is None else curated
+    sdvt = len(LIDO_SDVT) if sdvt is None else sdvt
+    ids = ["Lido", "Lido Community Staking Module"]
+    ids += [f"CSM Operator {n} - Lido Community Staking Module" for n in range(csm_operators)]
+    ids += [f"{name} - Lido" for name in _names(LIDO_CURATED, curated)]
+    ids += [f"{name} - Lido SimpleDVT Module" for name in _names(LIDO_SDVT, sdvt)]
+    return ids
+
+def _names(base, count):
+    names = list(base[:count])
+    n = 0
+    while len(names) < count:
+        names.append(f"{base[n % len(base)]} {n}")
+        n += 1
+    return names
+
+def generate_day(rng, date, validators, none_rate=0.02, quality=1.0):
+    day = datetime.strptime(date, "%Y-%m-%d")
+    day_index = (day - datetime(2025, 2, 1)).days
+    start_slot = GENESIS_OFFSET_SLOT + day_index * SLOTS_PER_DAY
+    attestations = validators * EPOCHS_PER_DAY
+
+    missed = int(attestations * rng.betavariate(1, 400) / quality)
+    wrong_head = int(attestations * rng.betavariate(1, 120) / quality)
+    wrong_target = int(attestations * rng.betavariate(1, 900) / quality)
+    late_source = int(attestations * rng.betavariate(1, 700) / quality)
+    included = max(attestations - missed, 0)
+    inclusion_delay = 1.0 + rng.expovariate(30) / quality
+    correctness = max(0.0, 1.0 - (wrong_head + wrong_target) / max(attestations, 1))
+    attester_eff = max(0.0, min(100.0, 100.0 * correctness / inclusion_delay - 100.0 * missed / max(attestations, 1)))
+    proposer_eff = None if rng.random() < 0.6 else min(100.0, rng.gauss(99, 3))
+    sync = rng.random() < 0.05
+
+    record = {
+        "startEpoch": start_slot // 32,
+        "endEpoch": (start_slot + SLOTS_PER_DAY) // 32 - 1,
+        "startTimestamp": f"{date}T12:00:23",
+        "endTimestamp": f"{date}T12:00:11",
+        "startSlot": start_slot,
+        "endSlot": start_slot + SLOTS_PER_DAY - 1,
+        "validatorCount": validators,
+        "totalUniqueAttestations": included,
+        "sumMissedAttestations": missed,
+        "sumMissedSyncSignatures": rng.randint(0, 64) if sync else None,
+        "sumCorrectHead": included - wrong_head,
+        "sumCorrectTarget": included - wrong_target,
+        "sumCorrectSource": included,
+        "sumWrongHeadVotes": wrong_head,
+        "sumWrongTargetVotes": wrong_target,
+        "sumLateTargetVotes": 0,
+        "sumLateSourceVotes": late_source,
+        "avgAttesterEffectiveness": attester_eff,
+        "sumInclusionDelay": int(included * inclusion_delay),
+        "sumSyncSignatureCount": rng.randint(0, 8192) if sync else None,
+        "avgInclusionDelay": inclusion_delay,
+        "avgUptime": min(1.0, included / max(attestations, 1)),
+        "avgCorrectness": correctness,
+        "avgProposerEffectiveness": proposer_eff,
+        "avgValidatorEffectiveness": attester_eff if proposer_eff is None else (attester_eff * 31 + proposer_eff) / 32,
+    }
+
+    # random gaps, Rated returns null for metrics it could not compute
+    for key in list(record):
+        if key.startswith(("sum", "avg")) and rng.random() < none_rate:
+            record[key] = None
+    return record
+
+def generate_history(entity_id, days=30, start_date=DEFAULT_START_DATE, seed=0, none_rate=0.02):
+    rng = random.Random(f"{seed}:{entity_id}")
+    if entity_id in ("Lido", "Lido Community Staking Module"):
+        validators = rng.randint(20_000, 400_000)
+    elif "CSM Operator" in entity_id:
+        # most CSM operators run a handful of keys, a few run hundreds
+        validators = max(1, int(rng.paretovariate(1.2)))
+    else:
+        validators = rng.randint(500, 8_000)
+    quality = rng.uniform(0.5, 1.5)
+
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    history = {}
+    for n in range(days):
+        date = (start + timedelta(days=n)).strftime("%Y-%m-%d")
+        # validator set drifts slowly over time
+        validators = max(1, validators + rng.choice([-1, 0, 0, 0, 1]))
+        history[date] = generate_day(rng, date, validators, none_rate=none_rate, quality=quality)
+    return history
+
+def generate_dataset(csm_operators=400, days=30, curated=None, sdvt=None, start_date=DEFAULT_START_DATE, seed=0, none_rate=0.02):
+    return {
+        f"{OPERATOR_PREFIX}{id}": generate_history(id, days=days, start_date=start_date, seed=seed, none_rate=none_rate)
+        for id in entity_ids(csm_operators, curated, sdvt)
+    }
+
+def dataset_dates(days=30, start_date=DEFAULT_START_DATE):
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    return [(start + timedelta(days=n)).strftime("%Y-%m-%d") for n in range(days)]
+
+def _etag(body):
+    return f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+class FakeS3:
+    """
+    In-memory stand-in for S3ReadWrite. Objects are stored serialized so
+    reads pay the same json decode cost as the real client. latency adds a
+    per-request sleep to stand in for the network round trip.
+    """
+    def __init__(self, objects=None, latency=0.0):
+        self.objects = {}
+        self.gets = 0
+        self.puts = 0
+        self.latency = latency
+        self.lock = threading.Lock()
+        for key, value in (objects or {}).items():
+            self.write_data(key, value)
+        self.puts = 0
+
+    def get_data(self, file_key, tag=""):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.gets += 1
+            body = self.objects.get(file_key + tag)
+        if body is None:
+            return None
+        return json.loads(body)
+
+    def write_data(self, file_key, data, tag=""):
+        body = json.dumps(data)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.puts += 1
+            self.objects[file_key + tag] = body
+        return True
+
+    def write_object(self, file_key, body, content_type="application/octet-stream", content_encoding=None, cache_control=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.puts += 1
+            self.objects[file_key] = body
+        return True
+
+    def upload_path(self, file_key, path, content_type="application/octet-stream", cache_control=None, metadata=None):
+        with open(path, "rb") as f:
+            return self.write_object(file_key, f.read(), content_type, cache_control=cache_control)
+
+    def get_data_versioned(self, file_key):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.gets += 1
+            body = self.objects.get(file_key)
+        if body is None:
+            return None, None
+        return json.loads(body), _etag(body)
+
+    def write_data_conditional(self, file_key, data, etag=None):
+        body = json.dumps(data)
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.puts += 1
+            current = self.objects.get(file_key)
+            if (current is None) if etag is None else (current is not None and _etag(current) == etag):
+                self.objects[file_key] = body
+                return _etag(body)
+        return None
+
+    def get_dir_files(self, path):
+        return [key for key in list(self.objects) if key.startswith(path)]
+
+    def delete_data(self, file_keys):
+        for key in file_keys:
+            self.objects.pop(key, None)
+
+    def write_logs(self):
+        pass
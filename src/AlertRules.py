@@ -0,0 +1,79 @@
+import json
+import numpy as np
+from utils import MODULES
+
+COMPARISONS = {"<": np.less, "<=": np.less_equal, ">": np.greater, ">=": np.greater_equal}
+# "latest" is the newest day of the MVA window, "window" the window itself
+RULE_DATES = ["latest", "window"]
+
+DEFAULT_RULES = [
+    {"name": "low_effectiveness", "metric": "avgValidatorEffectiveness", "variant": "metric", "op": "<", "threshold": 90, "tag": "low_eff"},
+    # more missed attestations per validator than the other CSM operators
+    {"name": "missed_attestations_outlier", "metric": "sumMissedAttestations", "variant": "zscore_per_val", "op": ">", "threshold": 2, "tag": "low_eff"},
+]
+
+def check_rule(rule):
+    rule = {"variant": "metric", "tag": "low_eff", "modules": ["csm"], "date": "latest", **rule}
+    for field in ["name", "metric", "op", "threshold"]:
+        if field not in rule:
+            raise ValueError(f"alert rule {rule} has no {field}")
+    if rule["op"] not in COMPARISONS:
+        raise ValueError(f"alert rule {rule['name']}: unknown op {rule['op']}, expected one of {list(COMPARISONS)}")
+    if rule["date"] not in RULE_DATES:
+        raise ValueError(f"alert rule {rule['name']}: unknown date {rule['date']}, expected one of {RULE_DATES}")
+    unknown = [module for module in rule["modules"] if module not in MODULES]
+    if unknown:
+        raise ValueError(f"alert rule {rule['name']}: unknown modules {unknown}")
+    rule["threshold"] = float(rule["threshold"])
+    return rule
+
+def load_rules(source):
+    # "default" or the path of a json list of rules
+    if source == "default":
+        return [check_rule(rule) for rule in DEFAULT_RULES]
+    with open(source) as f:
+        return [check_rule(rule) for rule in json.load(f)]
+
+class AlertEngine:
+    """
+    Threshold rules over the analysed module data, e.g.
+
+        {"name": "low_effectiveness", "metric": "avgValidatorEffectiveness",
+         "variant": "metric", "op": "<", "threshold": 90,
+         "modules": ["csm"], "date": "latest", "tag": "low_eff"}
+
+    variant is any stored variant, zscore_per_val etc. included. Each
+    (module, date) is laid out once as operator-aligned columns (see
+    DataHandler.build_module_snapshot) and every rule is one array
+    comparison over a column; None and NaN never fire.
+    """
+    def __init__(self, rules):
+        self.rules = [check_rule(rule) for rule in rules]
+
+    def evaluate(self, data_handler, dates):
+        """
+        {rule name: [(module, operator, value)]} of the rules that fire.
+        dates maps "latest" and "window" to the keys of the module data.
+        """
+        layouts = {}
+        columns = {}
+        fired = {}
+        for rule in self.rules:
+            date = dates[rule["date"]]
+            for module in rule["modules"]:
+                if (module, date) not in layouts:
+                    layouts[(module, date)] = data_handler.build_module_snapshot(module, date)
+                layout = layouts[(module, date)]
+                key = (module, date, rule["metric"], rule["variant"])
+                if key not in columns:
+                    column = layout["values"].get(rule["metric"], {}).get(rule["variant"], [])
+                    columns[key] = np.array([v if isinstance(v, (int, float)) else np.nan for v in column], dtype=float)
+                values = columns[key]
+                if not len(values):
+                    continue
+                with np.errstate(invalid="ignore"):
+                    hits = np.flatnonzero(COMPARISONS[rule["op"]](values, rule["threshold"]))
+                if len(hits):
+                    operators = layout["operators"]
+                    fired.setdefault(rule["name"], []).extend((module, operators[i], float(values[i])) for i in hits.tolist())
+        return fired
@@ -0,0 +1,142 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from logger_config import logger
+from profiler import profiler
+from utils import BACKFILL_PREFIX
+from EntityRegistry import MISSING
+
+def date_windows(start, end, days):
+    """
+    (from, to) pairs covering start..end inclusive, days long except the last.
+    """
+    if days < 1:
+        raise ValueError(f"backfill windows must be at least 1 day long, got {days}")
+    first = datetime.strptime(start, "%Y-%m-%d")
+    last = datetime.strptime(end, "%Y-%m-%d")
+    windows = []
+    while first <= last:
+        to = min(first + timedelta(days=days - 1), last)
+        windows.append((first.strftime("%Y-%m-%d"), to.strftime("%Y-%m-%d")))
+        first = to + timedelta(days=1)
+    return windows
+
+class Backfill:
+    """
+    Fetch start..end for every entity in window_days chunks, several
+    entities at a time through the rated handler's rate limiter. Each
+    entity's windows are done in order and the checkpoint at
+    lido_csm/backfill/{start}_{end}_{window_days} records how many are done:
+
+        {"done": {id: windows_done}, "finished": [ids]}
+
+    A window is only counted once its data is written, and the checkpoint is
+    saved every checkpoint_interval seconds and on exit, so a rerun of the
+    same command picks up where the last one stopped.
+    """
+    def __init__(self, s3, rated_handler, start, end, window_days=30, workers=4, partition_store=None, checkpoint_interval=5):
+        self.s3 = s3
+        self.rated_handler = rated_handler
+        self.windows = date_windows(start, end, window_days)
+        self.key = f"{BACKFILL_PREFIX}{start}_{end}_{window_days}"
+        self.workers = max(1, workers)
+        self.partition_store = partition_store
+        self.checkpoint_interval = checkpoint_interval
+        self.counts = {"windows": 0, "skipped": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock()
+        checkpoint = s3.get_data(self.key) or {}
+        self.done = checkpoint.get("done", {})
+        self.finished = set(checkpoint.get("finished", []))
+        # entities whose written windows could not be flushed, left for the next run
+        self.failed = set()
+        # windows written but not in a saved checkpoint yet (partition parts still pending)
+        self._pending = {}
+        self._saved_at = time.time()
+
+    def remaining(self):
+        return [id for id in self.rated_handler.rated_ids if id not in self.finished and self.done.get(id, 0) < len(self.windows)]
+
+    def run(self):
+        ids = self.remaining()
+        logger.info(f"backfill {self.key}: {len(ids)} entities, {len(self.windows)} windows each")
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for _ in pool.map(self.backfill_entity, ids):
+                    pass
+        finally:
+            self.save_checkpoint()
+        logger.info(f"backfill {self.key} finished {self.counts}")
+        return self.counts
+
+    def backfill_entity(self, id):
+        start = self.done.get(id, 0) + self._pending.get(id, 0)
+        for n in range(start, len(self.windows)):
+            if id in self.failed:
+                return
+            from_date, to_date = self.windows[n]
+            try:
+                with profiler.stage("backfill.window"):
+                    data, status = self.rated_handler.fetch_window(id, from_date, to_date)
+                    if status is None:
+                        # errors are left for the next run, later windows would leave a gap
+                        self._count("errors")
+                        return
+                    if status == MISSING:
+                        # unknown to Rated, no window will have data
+                        with self._lock:
+                            self.finished.add(id)
+                        self._count("skipped")
+                        return
+                    if data:
+                        self.write(id, data)
+                self.mark(id)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred in backfill of {id} {from_date}..{to_date}: {e}")
+                self._count("errors")
+                return
+
+    def write(self, id, data):
+        if self.partition_store is not None:
+            self.partition_store.append(id, data)
+        else:
+            written, _ = self.rated_handler.merge_write(self.s3, id, data)
+            if not written:
+                raise RuntimeError(f"could not write {id}")
+
+    def mark(self, id):
+        with self._lock:
+            self._pending[id] = self._pending.get(id, 0) + 1
+            self.counts["windows"] += 1
+        if time.time() - self._saved_at >= self.checkpoint_interval:
+            self.save_checkpoint()
+
+    def save_checkpoint(self):
+        with self._checkpoint_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if self.partition_store is not None:
+                # appended parts have to be durable before their windows count as done
+                try:
+                    self.partition_store.flush()
+                except Exception as e:
+                    logger.error(f"An error occurred flushing backfill windows of {len(pending)} entities: {e}")
+                    with self._lock:
+                        self.failed.update(pending)
+                        self.counts["errors"] += len(pending)
+                    pending = {}
+            with self._lock:
+                for id, windows in pending.items():
+                    if id in self.failed:
+                        continue
+                    self.done[id] = self.done.get(id, 0) + windows
+                checkpoint = {"done": dict(self.done), "finished": sorted(self.finished), "windows": len(self.windows), "updated": int(time.time())}
+            self.s3.write_data(self.key, checkpoint)
+            self._saved_at = time.time()
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
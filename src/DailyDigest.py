@@ -0,0 +1,90 @@
+import math
+import numpy as np
+from utils import MODULES, LOWER_IS_BETTER, DIGEST_PREFIX
+
+DIGEST_METRIC = "avgValidatorEffectiveness"
+DIGEST_THRESHOLD = 90
+DIGEST_TOP = 5
+MODULE_NAMES = {"csm": "CSM", "sdvt": "SDVT", "curated": "Curated"}
+
+def leaders(values, n, lower_is_better=False):
+    """
+    Indices of the n best values, best first. argpartition picks them in
+    O(len(values)) and only those n are sorted.
+    """
+    n = min(n, len(values))
+    if not n:
+        return np.empty(0, dtype=int)
+    keys = values if lower_is_better else -values
+    picked = np.argpartition(keys, n - 1)[:n]
+    return picked[np.argsort(keys[picked], kind="stable")]
+
+def metric_column(operators_data, metric, variant="metric"):
+    # (operators, values) of the numeric non-NaN values of metric
+    operators = []
+    values = []
+    for operator, metrics in operators_data.items():
+        value = metrics.get(metric, {}).get(variant)
+        if isinstance(value, (int, float)) and not math.isnan(value):
+            operators.append(operator)
+            values.append(value)
+    return operators, np.array(values, dtype=float)
+
+def short_name(operator):
+    return operator.split(" - ")[0]
+
+def build_digest(data_handler, date, previous=None, metric=DIGEST_METRIC, threshold=DIGEST_THRESHOLD, top=DIGEST_TOP, modules=MODULES):
+    """
+    Daily summary per module from the already computed module stats plus
+    one column of metric per day: operator count, mean and median, how many
+    operators are on the wrong side of threshold (above it for
+    LOWER_IS_BETTER metrics), the top and bottom operators and, with
+    previous, the biggest movers since that day.
+    """
+    lower_is_better = metric in LOWER_IS_BETTER
+    digest = {"date": date, "previous": previous, "metric": metric, "threshold": threshold, "modules": {}}
+    for module in modules:
+        data, stats = data_handler.module_state(module)
+        operators, values = metric_column(data.get(date, {}), metric)
+        if not operators:
+            continue
+        summary = stats.get(date, {}).get(metric, {}).get("metric") or {}
+        entry = {
+            "operators": len(operators),
+            "mean": summary.get("mean"),
+            "median": summary.get("median"),
+            "past_threshold": int(np.count_nonzero(values > threshold if lower_is_better else values < threshold)),
+            "top": [(operators[i], float(values[i])) for i in leaders(values, top, lower_is_better).tolist()],
+            "bottom": [(operators[i], float(values[i])) for i in leaders(values, top, not lower_is_better).tolist()],
+            "movers": [],
+        }
+        if previous:
+            before = data.get(previous, {})
+            changes = []
+            for operator, value in zip(operators, values.tolist()):
+                old = before.get(operator, {}).get(metric, {}).get("metric")
+                if isinstance(old, (int, float)) and not math.isnan(old):
+                    changes.append((operator, value - old))
+            if changes:
+                deltas = np.array([change for _, change in changes])
+                entry["movers"] = [changes[i] for i in leaders(np.abs(deltas), top).tolist() if deltas[i]]
+        digest["modules"][module] = entry
+    return digest
+
+def format_digest(digest):
+    lines = [f"{digest['date']} {digest['metric']}"]
+    side = "above" if digest["metric"] in LOWER_IS_BETTER else "below"
+    for module, entry in digest["modules"].items():
+        mean = "n/a" if entry["mean"] is None else f"{entry['mean']:.2f}"
+        median = "n/a" if entry["median"] is None else f"{entry['median']:.2f}"
+        lines.append(f"{MODULE_NAMES[module]}: {entry['operators']} operators, mean {mean}, median {median}, {entry['past_threshold']} {side} {digest['threshold']}")
+    csm = digest["modules"].get("csm")
+    if csm:
+        lines.append("Top: " + ", ".join(f"{short_name(operator)} {value:.2f}" for operator, value in csm["top"]))
+        lines.append("Bottom: " + ", ".join(f"{short_name(operator)} {value:.2f}" for operator, value in csm["bottom"]))
+        if csm["movers"]:
+            lines.append(f"Movers since {digest['previous']}: " + ", ".join(f"{short_name(operator)} {change:+.2f}" for operator, change in csm["movers"]))
+    return "\n".join(lines)
+
+def write_digest(s3, digest):
+    s3.write_data(f"{DIGEST_PREFIX}{digest['date']}", digest)
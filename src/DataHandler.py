@@ -1,11 +1,42 @@
 from logger_config import logger
-from utils import ATTEST_METRICS, OTHER_METRICS, find_date_groups, get_syn_std_dev
+from profiler import profiler
+from StateSnapshot import StateSnapshot
+from RankIndex import RankIndex, RANKED_METRICS, RANKED_VARIANTS
+from QuantileSketch import KLLSketch, SKETCH_K
+from utils import ATTEST_METRICS, OTHER_METRICS, MODULES, OPERATOR_DATA_PREFIX, MODULE_SNAPSHOT_PREFIX, SKETCH_PREFIX, entity_module, find_date_groups, get_syn_std_dev
 import traceback
 import time
+import math
 import statistics
 import numpy as np
 import re
-import pandas
+
+# slot and epoch bounds are not metrics
+SKIPPED_FIELDS = ["startSlot", "endSlot", "startEpoch", "endEpoch"]
+#for demo dates to match remove in prod
+DROPPED_DATES = ["2024-12-26", "2024-12-25", "2024-12-24", "2025-01-17", "2025-01-18"]
+DATE_ALIASES = {"2024-12-27": "2025-01-16"}
+# ingest copies the aggregates' 2025-01-11 to 2025-01-12
+DEMO_AGG_DATES = {"2025-01-12": "2025-01-11"}
+# how normalize_data treats a key
+SKIPPED, PLAIN, SUM, ATTEST_SUM = 0, 1, 2, 3
+_NUMBER_TYPES = {int, float, bool}
+
+def stored_dates(dates, aggregate=False):
+    # the stored days that normalize into dates
+    dates = set(dates)
+    stored = set(dates)
+    stored.update(date for date, alias in DATE_ALIASES.items() if alias in dates)
+    if aggregate:
+        stored.update(source for date, source in DEMO_AGG_DATES.items() if date in dates)
+    return stored
+
+def field_kind(key):
+    if key in SKIPPED_FIELDS:
+        return SKIPPED
+    if "sum" in key:
+        return ATTEST_SUM if key in ATTEST_METRICS else SUM
+    return PLAIN
 
 class DataHandler:
     def __init__(self):
@@ -14,9 +45,18 @@ class DataHandler:
         self.curated_module_data = {}
         self.sdvt_data = {}
         self.node_stats = {}
+        self.sdvt_stats = {}
+        self.curated_stats = {}
         self.df = None
+        # None unless a windowed load ran, then the dates loaded so far, see require_dates
+        self.loaded_dates = None
+        self.fault_in = None
+        self._rank_index = None
 
     def create_df(self):
+        # pandas is only needed here, keep it off the import path of every run
+        import pandas
+
         rows = []
         dates = set()
         for data in [self.node_data,self.curated_module_data, self.sdvt_data]:
@@ -73,46 +113,112 @@ class DataHandler:
         }
         self.df = df        
 
-    def load_data(self, s3):
-        files = s3.get_dir_files("lido_csm/operator_data/")
+    def load_data(self, s3, dates=None):
+        """
+        Load every operator history. With dates only those days are
+        normalized and the rest can be faulted in later, see require_dates.
+        """
+        if dates is not None:
+            self.limit_dates(dates, lambda missing: self.load_data(s3, missing))
+        files = s3.get_dir_files(OPERATOR_DATA_PREFIX)
         for key in files:
             try:
-                s3_data = s3.get_data(key)
-                id = key.split('/')[2]
-                op_data = self.normalize_data(s3_data)
-                
-                if "CSM Operator" in id: 
-                    data = self.node_data
-                elif "- Lido SimpleDVT Module" in id:
-                    data = self.sdvt_data
-                elif "- Lido" in id:
-                    data = self.curated_module_data
-                else:
-                    #for demo date match remove in prod
-                    if "2025-01-11" in op_data:
-                        op_data['2025-01-12'] = op_data["2025-01-11"]
-                    data = self.agg_data
-
-                for date in op_data:
-                    if date not in data:
-                        data[date] = {}
-                    data[date][id] = op_data[date]
+                with profiler.stage("load.s3"):
+                    s3_data = s3.get_data(key)
+                if dates is not None and s3_data:
+                    # drop the other days before the next object is read
+                    s3_data = self.window_history(key, s3_data, dates)
+                self.ingest(key, s3_data)
 
             except Exception as e:
                 traceback.print_exc()
                 logger.error(f"An error occurred in load_data: {e}")
+
+    def limit_dates(self, dates, fault_in):
+        # loads that follow only keep dates (plus any already loaded), fault_in(dates) loads more
+        self.loaded_dates = (self.loaded_dates or set()) | set(dates)
+        self.fault_in = fault_in
+
+    def window_history(self, key, history, dates):
+        stored = stored_dates(dates, aggregate=entity_module(key.split('/')[2]) == "aggregate")
+        return {date: values for date, values in history.items() if date in stored}
+
+    def require_dates(self, dates):
+        """
+        Fault in the dates a windowed load skipped, for consumers that reach
+        past the window (e.g. a longer time series). Returns the dates loaded.
+        """
+        if self.loaded_dates is None or self.fault_in is None:
+            return []
+        missing = sorted(set(dates) - self.loaded_dates)
+        if missing:
+            with profiler.stage("load.fault_in"):
+                self.fault_in(missing)
+            self.loaded_dates.update(missing)
+        return missing
+
+    def load_partitions(self, partition_store, dates=None):
+        # only the day parts / segment rows covering dates are decoded, every stored day without dates
+        if dates is not None:
+            self.limit_dates(dates, lambda missing: self.load_partitions(partition_store, missing))
+        with profiler.stage("load.partitions"):
+            history = partition_store.read(dates)
+        for id, records in history.items():
+            try:
+                self.ingest(f"{OPERATOR_DATA_PREFIX}{id}", records)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred in load_partitions: {e}")
+
+    def load_archive(self, archive, dates, metrics=None):
+        # partitions outside dates and columns outside metrics are never decoded
+        self.limit_dates(dates, lambda missing: self.load_archive(archive, missing, metrics))
+        with profiler.stage("load.archive"):
+            history = archive.read(dates, metrics)
+        for id, records in history.items():
+            try:
+                self.ingest(f"{OPERATOR_DATA_PREFIX}{id}", records)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred in load_archive: {e}")
+        return len(history)
+
+    def ingest(self, key, s3_data):
+        if self.loaded_dates is not None and s3_data:
+            # streamed in by the pipeline after a windowed load
+            s3_data = self.window_history(key, s3_data, self.loaded_dates)
+        with profiler.stage("load.normalize"):
+            op_data = self.normalize_data(s3_data)
+        self.add_operator(key, op_data)
+
+    def add_operator(self, key, op_data):
+        id = key.split('/')[2]
+        if "CSM Operator" in id: 
+            data = self.node_data
+        elif "- Lido SimpleDVT Module" in id:
+            data = self.sdvt_data
+        elif "- Lido" in id:
+            data = self.curated_module_data
+        else:
+            #for demo date match remove in prod
+            if "2025-01-11" in op_data:
+                op_data['2025-01-12'] = op_data["2025-01-11"]
+            data = self.agg_data
+
+        for date in op_data:
+            if date not in data:
+                data[date] = {}
+            data[date][id] = op_data[date]
     
     def normalize_data(self, data):
         normalized_data = {}
         for date, values in data.items():
-            if date not in ["2024-12-26", "2024-12-25", 
-                            "2024-12-24", "2025-01-17", 
-                            "2025-01-18"]:
+            if date not in DROPPED_DATES:
                 normalized_entry = {}
                 num_vals = values.get("validatorCount", 0)
                 total_attest = values.get("totalUniqueAttestations", 0)
                 for k, v in values.items():
-                    if k not in ["startSlot", "endSlot", "startEpoch", "endEpoch"]:
+                    if k not in SKIPPED_FIELDS:
                         normalized_entry[k] = {"metric": v}
                         if "sum" in k:                                     
                             if v is None:
@@ -127,13 +233,87 @@ class DataHandler:
                                 normalized_entry[k]["per_val"] = v / num_vals
                                 if k in ATTEST_METRICS:
                                     normalized_entry[k]["attest_pct"] = self.calc_percent(stat=v, total_attest=total_attest) 
-                entry_date = date
-                #for demo dates to match remove in prod
-                if date == "2024-12-27": 
-                    entry_date = "2025-01-16"
-                normalized_data[entry_date] = normalized_entry
+                normalized_data[DATE_ALIASES.get(date, date)] = normalized_entry
         return normalized_data
 
+    def normalize_histories(self, histories):
+        """
+        normalize_data of many histories at once: per_val and attest_pct of
+        every nonzero sum, across all dates and histories, are computed as
+        one array operation. Entries, and the errors for a missing
+        validatorCount or null totalUniqueAttestations, are normalize_data's.
+        load_data stays on normalize_data: building the entry dicts dominates
+        and collecting the sums for the arrays costs more than the loop's
+        own division (bench_pipeline normalize vs normalize_batched).
+        """
+        kinds = {}
+        results = []
+        counts, totals = [], []
+        # one item per nonzero sum: its value, record row and entry to fill in
+        sums, rows, entries = [], [], []
+        attest = []
+        for data in histories:
+            normalized_data = {}
+            for date, values in data.items():
+                if date in DROPPED_DATES:
+                    continue
+                row = len(counts)
+                counts.append(values.get("validatorCount", 0))
+                totals.append(values.get("totalUniqueAttestations", 0))
+                normalized_entry = {}
+                for k, v in values.items():
+                    kind = kinds.get(k)
+                    if kind is None:
+                        kind = kinds[k] = field_kind(k)
+                    if kind == PLAIN:
+                        normalized_entry[k] = {"metric": v}
+                    elif kind == SKIPPED:
+                        continue
+                    elif v is None:
+                        normalized_entry[k] = {"metric": None, "per_val": None, "attest_pct": None} if kind == ATTEST_SUM else {"metric": None, "per_val": None}
+                    elif v == 0:
+                        normalized_entry[k] = {"metric": 0.0, "per_val": 0.0, "attest_pct": 0.0} if kind == ATTEST_SUM else {"metric": 0.0, "per_val": 0.0}
+                    else:
+                        if kind == ATTEST_SUM:
+                            attest.append(len(sums))
+                        entry = normalized_entry[k] = {"metric": v}
+                        sums.append(v)
+                        rows.append(row)
+                        entries.append(entry)
+                normalized_data[DATE_ALIASES.get(date, date)] = normalized_entry
+            results.append(normalized_data)
+        if not sums:
+            return results
+
+        if not _NUMBER_TYPES.issuperset(map(type, sums)):
+            raise TypeError("unsupported operand type for a sum metric")
+        sums = np.array(sums, dtype=float)
+        rows = np.array(rows)
+        num_vals = self._number_column(counts, rows, "validatorCount")
+        if (num_vals == 0).any():
+            raise ZeroDivisionError("validatorCount is missing or 0 for a nonzero sum")
+        for entry, per_val in zip(entries, (sums / num_vals).tolist()):
+            entry["per_val"] = per_val
+
+        if attest:
+            attest = np.array(attest)
+            total_attest = self._number_column(totals, rows[attest], "totalUniqueAttestations")
+            # calc_percent: NaN for a 0 (or missing) total
+            with np.errstate(divide="ignore", invalid="ignore"):
+                attest_pct = np.where(total_attest == 0, np.nan, sums[attest] / total_attest * 100)
+            for i, pct in zip(attest.tolist(), attest_pct.tolist()):
+                entries[i]["attest_pct"] = pct
+        return results
+
+    def _number_column(self, column, rows, name):
+        # column[rows] as floats, raising where normalize_data's arithmetic would
+        if _NUMBER_TYPES.issuperset(map(type, column)):
+            return np.array(column, dtype=float)[rows]
+        selected = [column[row] for row in rows.tolist()]
+        if not _NUMBER_TYPES.issuperset(map(type, selected)):
+            raise TypeError(f"unsupported operand type for {name}")
+        return np.array(selected, dtype=float)
+
     def get_statistics(self, module="csm"):
         #stats_per_date = {}
         data = {}
@@ -311,6 +491,140 @@ class DataHandler:
                                 mean = None  # Set mean to None if no valid values exist
                             data[date_range_key][operator][metric][variable] = mean
 
+    def module_state(self, module="csm"):
+        if module == "csm":
+            return self.node_data, self.node_stats
+        elif module == "curated":
+            return self.curated_module_data, self.curated_stats
+        elif module == "sdvt":
+            return self.sdvt_data, self.sdvt_stats
+        raise ValueError(f"unknown module {module}")
+
+    def build_module_snapshot(self, module, date):
+        """
+        Column layout of one module on one date (or MVA window): the operator
+        list plus one value array per metric/variant aligned with it, and the
+        precomputed population stats for that date.
+        """
+        data, stats = self.module_state(module)
+        operators = sorted(data.get(date, {}))
+        values = {}
+        for i, operator in enumerate(operators):
+            for metric, variants in data[date][operator].items():
+                for variant, value in variants.items():
+                    column = values.setdefault(metric, {}).setdefault(variant, [None] * len(operators))
+                    column[i] = value
+        return {
+            "module": module,
+            "date": date,
+            "operators": operators,
+            "values": values,
+            "stats": stats.get(date, {}),
+        }
+
+    def write_module_snapshots(self, s3, dates=None, modules=MODULES):
+        written = 0
+        for module in modules:
+            data, _ = self.module_state(module)
+            for date in (dates or list(data)):
+                if date not in data:
+                    continue
+                s3.write_data(f"{MODULE_SNAPSHOT_PREFIX}{module}/{date}", self.build_module_snapshot(module, date))
+                written += 1
+        logger.info(f"wrote {written} module snapshots")
+        return written
+
+    def apply_module_snapshot(self, snapshot):
+        # values that were absent for an operator come back as None
+        data, stats = self.module_state(snapshot["module"])
+        date = snapshot["date"]
+        operators = snapshot["operators"]
+        entries = data.setdefault(date, {})
+        for operator in operators:
+            entries[operator] = {}
+        for metric, variants in snapshot["values"].items():
+            for variant, column in variants.items():
+                for operator, value in zip(operators, column):
+                    entries[operator].setdefault(metric, {})[variant] = value
+        stats[date] = snapshot["stats"]
+
+    def load_from_snapshots(self, s3, operator_ids, dates, modules=MODULES):
+        """
+        Load the histories of the requested CSM operators and the Lido/CSM
+        aggregates, and take every other operator plus the population stats
+        for the given dates from module snapshots. Returns the snapshot keys
+        that were missing; an empty list means the state is complete for dates.
+        """
+        ids = [f"CSM Operator {id} - Lido Community Staking Module" for id in operator_ids]
+        ids += ["Lido", "Lido Community Staking Module"]
+        for id in ids:
+            key = f"{OPERATOR_DATA_PREFIX}{id}"
+            s3_data = s3.get_data(key)
+            if s3_data:
+                self.ingest(key, s3_data)
+
+        missing = []
+        for module in modules:
+            for date in dates:
+                key = f"{MODULE_SNAPSHOT_PREFIX}{module}/{date}"
+                snapshot = s3.get_data(key)
+                if snapshot:
+                    self.apply_module_snapshot(snapshot)
+                else:
+                    missing.append(key)
+        if missing:
+            logger.info(f"module snapshots missing: {missing}")
+        return missing
+
+    def build_sketches(self, module, date, k=SKETCH_K):
+        """
+        {metric: {variant: KLLSketch}} of the module's operator values on
+        date, the population get_statistics uses (NaN left out).
+        """
+        data, _ = self.module_state(module)
+        values = {}
+        for operator, metrics in data.get(date, {}).items():
+            for metric, variants in metrics.items():
+                if metric not in RANKED_METRICS:
+                    continue
+                for variant in RANKED_VARIANTS:
+                    value = variants.get(variant)
+                    if isinstance(value, (int, float)) and not math.isnan(value):
+                        values.setdefault(metric, {}).setdefault(variant, []).append(value)
+        sketches = {}
+        for metric, variants in values.items():
+            for variant, column in variants.items():
+                sketch = sketches.setdefault(metric, {})[variant] = KLLSketch(k)
+                sketch.update_many(column)
+        return sketches
+
+    def write_sketches(self, s3, dates=None, modules=MODULES):
+        # daily sketches only, windows are merged from them, see QuantileSketch.window_statistics
+        written = 0
+        for module in modules:
+            data, _ = self.module_state(module)
+            for date in (dates or list(data)):
+                if date not in data or "_" in date:
+                    continue
+                sketches = self.build_sketches(module, date)
+                s3.write_data(f"{SKETCH_PREFIX}{module}/{date}", {metric: {variant: sketch.to_dict() for variant, sketch in variants.items()} for metric, variants in sketches.items()})
+                written += 1
+        logger.info(f"wrote {written} daily sketches")
+        return written
+
+    def rank_index(self):
+        # peer ranks of the module data, query it once the analysis is done
+        if self._rank_index is None:
+            self._rank_index = RankIndex(self)
+        return self._rank_index
+
+    def save_state(self, root, meta=None):
+        # computed data, MVA windows, stats and z-scores for the next run
+        return StateSnapshot(root).write(self, meta)
+
+    def load_state(self, root, dates=None, meta=None, max_age=None):
+        return StateSnapshot(root).read(self, dates, meta, max_age)
+
     def calc_percent(self, stat, total_attest):
         if total_attest == 0:
             return float('nan')
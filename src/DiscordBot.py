@@ -1,26 +1,171 @@
+import atexit
 import requests
-from datetime import datetime
-from discord_webhook import DiscordWebhook
+import threading
+import time
 import os
 from logger_config import logger
+from rate_limit import RateLimiter
+
+# Discord rejects message content over 2000 characters
+DISCORD_LIMIT = 2000
+# per webhook, Discord allows about 5 posts every 2 seconds
+WEBHOOK_RATE = 2.5
+WEBHOOK_BURST = 5
+# how long a finishing process waits for queued messages
+EXIT_FLUSH_TIMEOUT = 60
+
+HEADERS = {
+    "exit_request": ("DISCORD_HOOK", "LIDO VALIDATOR EXIT REQUEST"),
+    "low_eff": ("DISCORD_HOOK", "ALERT LOW EFFECTIVENESS"),
+    "rated_stats": ("DISCORD_HOOK_RATED", "CSM DAILY STATS"),
+}
+
+def split_message(message, limit=DISCORD_LIMIT):
+    # on line breaks where possible, hard cuts for a single line over the limit
+    parts = []
+    part = ""
+    for line in message.split("\n"):
+        while len(line) > limit:
+            if part:
+                parts.append(part)
+                part = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        if part and len(part) + 1 + len(line) > limit:
+            parts.append(part)
+            part = line
+        else:
+            part = f"{part}\n{line}" if part else line
+    if part:
+        parts.append(part)
+    return parts
+
+def batch_messages(messages, limit=DISCORD_LIMIT):
+    # consecutive messages packed into as few posts of up to limit characters as possible
+    posts = []
+    for message in messages:
+        for part in split_message(message, limit):
+            if posts and len(posts[-1]) + 2 + len(part) <= limit:
+                posts[-1] = f"{posts[-1]}\n\n{part}"
+            else:
+                posts.append(part)
+    return posts
+
+class DiscordQueue:
+    """
+    Background delivery of webhook messages. put() only queues; a worker
+    thread takes everything pending for a webhook, packs it into posts
+    within DISCORD_LIMIT and sends them through a RateLimiter per webhook,
+    backing off on 429 Retry-After and on an exhausted X-RateLimit bucket.
+    flush() waits until everything queued so far has been sent or dropped,
+    it also runs at interpreter exit so a finished run still delivers.
+    """
+    def __init__(self, rate=WEBHOOK_RATE, burst=WEBHOOK_BURST, max_retries=5, timeout=10):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.pending = {}
+        self.limiters = {}
+        self.sent = 0
+        self.dropped = 0
+        self._queued = 0
+        self._done = 0
+        self._condition = threading.Condition()
+        self._worker = None
+        self._session = requests.Session()
+        atexit.register(self.flush, EXIT_FLUSH_TIMEOUT)
+
+    def put(self, url, message):
+        with self._condition:
+            self.pending.setdefault(url, []).append(message)
+            self._queued += 1
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="discord-queue", daemon=True)
+                self._worker.start()
+            self._condition.notify_all()
+
+    def flush(self, timeout=None):
+        # True when everything queued before the call is done
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            target = self._queued
+            while self._done < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self.pending:
+                    if not self._condition.wait(60):
+                        # idle, put() starts a new worker
+                        self._worker = None
+                        return
+                url, messages = self.pending.popitem()
+            try:
+                for post in batch_messages(messages):
+                    self._post(url, post)
+            except Exception as e:
+                logger.error(f"Error in Discord Hook: {e}")
+            finally:
+                with self._condition:
+                    self._done += len(messages)
+                    self._condition.notify_all()
+
+    def _post(self, url, content):
+        limiter = self.limiters.setdefault(url, RateLimiter(self.rate, self.burst))
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire()
+            try:
+                response = self._session.post(url, json={"content": content}, timeout=self.timeout)
+            except requests.RequestException as e:
+                logger.error(f"Error in Discord Hook: {e}")
+                limiter.pause(2 ** attempt)
+                continue
+            if response.headers.get("X-RateLimit-Remaining") == "0":
+                limiter.pause(float(response.headers.get("X-RateLimit-Reset-After", 1)))
+            if response.status_code == 429:
+                retry_after = response.headers.get("Retry-After")
+                if retry_after is None:
+                    try:
+                        retry_after = response.json().get("retry_after", 1)
+                    except ValueError:
+                        retry_after = 1
+                limiter.pause(float(retry_after))
+                continue
+            if response.status_code >= 500:
+                limiter.pause(2 ** attempt)
+                continue
+            if response.status_code >= 400:
+                logger.error(f"Discord Hook failed with status code {response.status_code}: {response.text}")
+                break
+            self.sent += 1
+            return True
+        self.dropped += 1
+        return False
+
+notifications = DiscordQueue()
 
 class DiscordBot:
     @staticmethod
     def send_msg(body, tag_msg):
+        # queued and sent in the background, see DiscordQueue
         try:
-            if tag_msg == "exit_request":
-                url = os.getenv("DISCORD_HOOK")
-                message = f"LIDO VALIDATOR EXIT REQUEST \n{body}"
-            elif tag_msg == "low_eff":
-                url = os.getenv("DISCORD_HOOK")
-                message = f"ALERT LOW EFFECTIVENESS \n{body}"
-            elif tag_msg == "rated_stats":
-                url = os.getenv("DISCORD_HOOK_RATED")
-                message = f"CSM DAILY STATS \n{body}"
-            else:
+            if tag_msg not in HEADERS:
                 return
-            
-            webhook = DiscordWebhook(url=url, content=message)
-            _ = webhook.execute()
+            env, header = HEADERS[tag_msg]
+            url = os.getenv(env)
+            if not url:
+                logger.error(f"Error in Discord Hook: {env} is not set")
+                return
+            notifications.put(url, f"{header} \n{body}")
         except Exception as e:
-            logger.error(f"Error in Discord Hook: {e}")
\ No newline at end of file
+            logger.error(f"Error in Discord Hook: {e}")
+
+    @staticmethod
+    def flush(timeout=None):
+        return notifications.flush(timeout)
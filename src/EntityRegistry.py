@@ -0,0 +1,102 @@
+import re
+import threading
+import time
+from logger_config import logger
+from utils import ENTITY_REGISTRY_KEY, READ_FAILED
+
+CSM_OPERATOR = re.compile(r"^CSM Operator (\d+) - Lido Community Staking Module$")
+
+ACTIVE = "active"
+# negative results, cached until their TTL runs out
+MISSING = "missing"
+EMPTY = "empty"
+
+def csm_operator_id(id):
+    match = CSM_OPERATOR.match(id)
+    return int(match.group(1)) if match else None
+
+def csm_operator(n):
+    return f"CSM Operator {n} - Lido Community Staking Module"
+
+class EntityRegistry:
+    """
+    What Rated knows about each entity we ask it for, persisted at
+    lido_csm/entity_registry:
+
+        {"entities": {id: {"status": ..., "checked": ts, "misses": n}}}
+
+    Entities that came back not found (404) or without validators are not
+    asked for again until ttl * 2**(misses - 1) seconds have passed, capped
+    at max_ttl. CSM operator ids are probed probe_ahead past the highest
+    active one, so new operators are picked up without a hardcoded range.
+    """
+    def __init__(self, s3=None, entities=None, ttl=6 * 3600, max_ttl=7 * 24 * 3600, probe_ahead=20):
+        self.s3 = s3
+        self.entities = entities or {}
+        self.ttl = ttl
+        self.max_ttl = max_ttl
+        self.probe_ahead = probe_ahead
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, s3, **kwargs):
+        data = s3.get_data(ENTITY_REGISTRY_KEY) or {}
+        return cls(s3, data.get("entities"), **kwargs)
+
+    def save(self, max_retries=5):
+        # sharded fetch workers save concurrently, merge with what is stored and keep the newest check per entity
+        with self._lock:
+            entities = dict(self.entities)
+        for _ in range(max_retries):
+            stored, etag = self.s3.get_data_versioned(ENTITY_REGISTRY_KEY)
+            if etag == READ_FAILED:
+                logger.error(f"could not read {ENTITY_REGISTRY_KEY}, not saving over it")
+                return False
+            merged = dict((stored or {}).get("entities", {}))
+            for id, entry in entities.items():
+                if id not in merged or entry["checked"] >= merged[id]["checked"]:
+                    merged[id] = entry
+            if self.s3.write_data_conditional(ENTITY_REGISTRY_KEY, {"entities": merged, "updated": int(time.time())}, etag):
+                return True
+        logger.error(f"could not save {ENTITY_REGISTRY_KEY} after {max_retries} conflicts")
+        return False
+
+    def status(self, id):
+        entry = self.entities.get(id)
+        return entry["status"] if entry else None
+
+    def is_cached_negative(self, id, now=None):
+        entry = self.entities.get(id)
+        if not entry or entry["status"] == ACTIVE:
+            return False
+        now = time.time() if now is None else now
+        ttl = min(self.ttl * 2 ** max(entry.get("misses", 1) - 1, 0), self.max_ttl)
+        return now - entry["checked"] < ttl
+
+    def highest_csm_id(self):
+        ids = [csm_operator_id(id) for id, entry in self.entities.items() if entry["status"] == ACTIVE]
+        ids = [n for n in ids if n is not None]
+        return max(ids) if ids else None
+
+    def candidates(self, seed_ids, now=None):
+        """
+        seed_ids plus every known entity plus the CSM probe frontier, without
+        the ones with a live negative cache entry.
+        """
+        ids = list(dict.fromkeys(list(seed_ids) + list(self.entities)))
+        highest = self.highest_csm_id()
+        if highest is not None:
+            known = set(ids)
+            ids += [csm_operator(n) for n in range(highest + 1, highest + 1 + self.probe_ahead) if csm_operator(n) not in known]
+
+        selected = [id for id in ids if not self.is_cached_negative(id, now)]
+        active = sum(self.status(id) == ACTIVE for id in selected)
+        logger.info(f"entity discovery: {active} active, {len(selected) - active} to probe, {len(ids) - len(selected)} cached as missing/empty")
+        return selected
+
+    def record(self, id, status, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self.entities.get(id, {})
+            misses = 0 if status == ACTIVE else entry.get("misses", 0) + 1
+            self.entities[id] = {"status": status, "checked": now, "misses": misses}
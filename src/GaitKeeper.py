@@ -1,14 +1,61 @@
 from DiscordBot import DiscordBot
 from datetime import datetime
 from logger_config import logger
+from utils import ALERT_STATE_KEY, READ_FAILED
 
 class GaitKeeper:
-    def __init__(self):
-        self.sent_messages = []
+    """
+    Sends the alerts of an AlertEngine run. What is firing is kept at
+    ALERT_STATE_KEY as {"rule|module|operator": {"since", "value"}}, so an
+    operator is alerted once when a rule starts firing for it and again only
+    after it has cleared. Entries of rules and modules a run does not
+    evaluate are carried over untouched. When the state cannot be read
+    nothing is sent or saved, rather than alerting everything again.
+    """
+    def __init__(self, s3=None):
+        self.s3 = s3
+        self.firing = {}
+        self.state_failed = False
+        if s3 is not None:
+            state, etag = s3.get_data_versioned(ALERT_STATE_KEY)
+            if etag == READ_FAILED:
+                self.state_failed = True
+            elif isinstance(state, dict):
+                self.firing = state
 
     def send_alert(self, message, tag_msg):
-        alerter = DiscordBot()
-        alerter.send_msg(message, tag_msg)
+        DiscordBot.send_msg(message, tag_msg)
+
+    def check_alerts(self, engine, data_handler, dates, now=None):
+        if self.state_failed:
+            logger.error(f"could not read {ALERT_STATE_KEY}, skipping alerts this run")
+            return {}
+        now = (now or datetime.now()).isoformat(timespec="seconds")
+        fired = engine.evaluate(data_handler, dates)
+        evaluated = {f"{rule['name']}|{module}" for rule in engine.rules for module in rule["modules"]}
+        firing = {key: entry for key, entry in self.firing.items() if "|".join(key.split("|", 2)[:2]) not in evaluated}
+        new_alerts = {}
+        for rule in engine.rules:
+            for module, operator, value in fired.get(rule["name"], []):
+                key = f"{rule['name']}|{module}|{operator}"
+                if key in self.firing:
+                    firing[key] = {"since": self.firing[key]["since"], "value": value}
+                else:
+                    firing[key] = {"since": now, "value": value}
+                    new_alerts.setdefault(rule["name"], []).append((module, operator, value))
+            if rule["name"] in new_alerts:
+                lines = [f"{operator} ({module}): {rule['metric']} {rule['variant']} {value:.2f} {rule['op']} {rule['threshold']:g}" for module, operator, value in new_alerts[rule["name"]]]
+                self.send_alert(f"{rule['name']}\n" + "\n".join(lines), rule["tag"])
+        cleared = len(set(self.firing) - set(firing))
+        self.firing = firing
+        self.save()
+        logger.info(f"Alerts: {sum(len(v) for v in new_alerts.values())} new, {len(firing)} firing, {cleared} cleared")
+        return new_alerts
+
+    def save(self):
+        if self.s3 is not None:
+            self.s3.write_data(ALERT_STATE_KEY, self.firing)
 
     def purge_message_list(self):
-        self.sent_messages = []
\ No newline at end of file
+        self.firing = {}
+        self.save()
@@ -0,0 +1,193 @@
+import os
+import traceback
+from logger_config import logger
+from profiler import profiler
+from utils import ATTEST_METRICS, OTHER_METRICS, DESCRIPTIONS, OPERATOR_DATA_PREFIX, entity_module
+from PartitionStore import PARTITION_MODULES
+
+ARCHIVE_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+# the columns a report page reads, see ReportHandler.build_reports
+REPORT_METRICS = list(DESCRIPTIONS) + ["validatorCount", "totalUniqueAttestations"]
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.fs
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("the history archive needs pyarrow, install it with: pip install pyarrow")
+    return pyarrow
+
+def archive_fields():
+    fields = ["startEpoch", "endEpoch", "startSlot", "endSlot", "startTimestamp", "endTimestamp"]
+    for metric in ATTEST_METRICS + OTHER_METRICS:
+        if metric not in fields:
+            fields.append(metric)
+    return fields
+
+def archive_schema():
+    pa = _arrow()
+    columns = [("entity", pa.string())]
+    for field in archive_fields():
+        if field.endswith("Timestamp"):
+            columns.append((field, pa.string()))
+        elif field.startswith("avg"):
+            columns.append((field, pa.float64()))
+        else:
+            columns.append((field, pa.int64()))
+    return pa.schema(columns)
+
+class HistoryArchive:
+    """
+    Columnar copy of the operator histories, one Parquet (or Arrow IPC) file
+    per module and day in a hive layout:
+
+        {root}/module={module}/date={YYYY-MM-DD}/part-0.parquet
+
+    root is a local directory or an s3://bucket/prefix URI. Reads only open
+    the partitions of the requested dates and modules and decode only the
+    requested metric columns. export() rewrites whole day partitions.
+    """
+    def __init__(self, root, filesystem=None, format="parquet"):
+        if format not in ARCHIVE_FORMATS:
+            raise ValueError(f"unknown archive format {format}, expected one of {list(ARCHIVE_FORMATS)}")
+        pa = _arrow()
+        self.format = format
+        self.schema = archive_schema()
+        if filesystem is not None:
+            self.filesystem, self.root = filesystem, root.split("://", 1)[-1].rstrip("/")
+        elif "://" in root:
+            self.filesystem, self.root = pa.fs.FileSystem.from_uri(root)
+        else:
+            self.filesystem, self.root = pa.fs.LocalFileSystem(), os.path.abspath(root)
+
+    def partition_dir(self, module, date):
+        return f"{self.root}/module={module}/date={date}"
+
+    def partition_file(self, module, date):
+        return f"{self.partition_dir(module, date)}/part-0{ARCHIVE_FORMATS[self.format]}"
+
+    def export(self, histories, dates=None):
+        """
+        Write {entity: {date: record}} histories, the shape stored under
+        lido_csm/operator_data, restricted to dates when given. Returns the
+        files written. An entity day that does not fit the schema is logged
+        and left out, the rest of its partition is still written.
+        """
+        pa = _arrow()
+        dates = set(dates) if dates is not None else None
+        rows = {}
+        for entity, history in histories.items():
+            try:
+                module = entity_module(entity)
+                for date, record in history.items():
+                    if dates is None or date in dates:
+                        rows.setdefault((module, date), []).append((entity, dict(record)))
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred archiving {entity}: {e}")
+
+        written = []
+        for (module, date), records in sorted(rows.items()):
+            records.sort(key=lambda row: row[0])
+            try:
+                table = self._table(records)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                records = [row for row in records if self._fits(row, date)]
+                if not records:
+                    continue
+                table = self._table(records)
+
+            path = self.partition_file(module, date)
+            self.filesystem.create_dir(self.partition_dir(module, date), recursive=True)
+            with profiler.stage("archive.write"):
+                if self.format == "parquet":
+                    pa.parquet.write_table(table, path, filesystem=self.filesystem, compression="zstd")
+                else:
+                    with self.filesystem.open_output_stream(path) as sink:
+                        with pa.ipc.new_file(sink, self.schema) as writer:
+                            writer.write_table(table)
+            written.append(path)
+        logger.info(f"archived {len(written)} day partitions to {self.root}")
+        return written
+
+    def _table(self, records):
+        pa = _arrow()
+        columns = [pa.array([entity for entity, _ in records], pa.string())]
+        for field in self.schema.names[1:]:
+            # safe cast, a fractional value in an integer column raises instead of truncating
+            column = pa.array([record.get(field) for _, record in records])
+            columns.append(column.cast(self.schema.field(field).type))
+        return pa.Table.from_arrays(columns, schema=self.schema)
+
+    def _fits(self, row, date):
+        try:
+            self._table([row])
+            return True
+        except Exception as e:
+            logger.error(f"An error occurred archiving {row[0]} on {date}: {e}")
+            return False
+
+    def export_from_s3(self, s3, dates=None):
+        histories = {}
+        for key in s3.get_dir_files(OPERATOR_DATA_PREFIX) or []:
+            history = s3.get_data(key)
+            if history:
+                histories[key[len(OPERATOR_DATA_PREFIX):]] = history
+        return self.export(histories, dates)
+
+    def _files(self, dates, modules):
+        pa = _arrow()
+        files = []
+        for module in modules:
+            for date in sorted(set(dates)):
+                selector = pa.fs.FileSelector(self.partition_dir(module, date), allow_not_found=True)
+                files += [info.path for info in self.filesystem.get_file_info(selector) if info.type == pa.fs.FileType.File]
+        return files
+
+    def read_table(self, dates, metrics=None, modules=PARTITION_MODULES):
+        """
+        Arrow table with entity, module, date and the requested metric
+        columns for the given dates. None reads every archived metric.
+        """
+        pa = _arrow()
+        columns = ["entity", "module", "date"]
+        columns += [field for field in (metrics or self.schema.names[1:]) if field not in columns]
+        with profiler.stage("archive.list"):
+            files = self._files(dates, modules)
+        if not files:
+            return None
+
+        partitioning = pa.dataset.partitioning(pa.schema([("module", pa.string()), ("date", pa.string())]), flavor="hive")
+        dataset = pa.dataset.dataset(
+            files,
+            schema=self.schema.append(pa.field("module", pa.string())).append(pa.field("date", pa.string())),
+            format="parquet" if self.format == "parquet" else "ipc",
+            filesystem=self.filesystem,
+            partitioning=partitioning,
+            partition_base_dir=self.root,
+        )
+        date_filter = pa.dataset.field("date").isin(sorted(set(dates)))
+        with profiler.stage("archive.scan"):
+            return dataset.to_table(columns=columns, filter=date_filter)
+
+    def read(self, dates, metrics=None, modules=PARTITION_MODULES):
+        """
+        Histories for the given dates as {entity: {date: record}}. Nulls come
+        back as None, the same as Rated's missing values.
+        """
+        table = self.read_table(dates, metrics, modules)
+        history = {}
+        if table is None:
+            return history
+        columns = table.to_pydict()
+        entities = columns.pop("entity")
+        row_dates = columns.pop("date")
+        columns.pop("module")
+        fields = list(columns)
+        values = [columns[field] for field in fields]
+        for row, (entity, date) in enumerate(zip(entities, row_dates)):
+            history.setdefault(entity, {})[date] = {field: column[row] for field, column in zip(fields, values)}
+        return history
@@ -1,79 +1,342 @@
 import traceback
-from RatedHandler import RatedHandler
 from S3ReadWrite import S3ReadWrite
-from GaitKeeper import GaitKeeper
-from VisualHandler import VisualHandler
-from DataHandler import DataHandler
-from ReportHandler import ReportHandler
-from visualizations import plot_line, plot_histogram
-import time
 import base64
-import json
 import os
+import threading
 import time
 from logger_config import logger
-from utils import find_date_groups
+from profiler import profiler
+from utils import last_days
+
+# Stage modules are imported inside the stage that uses them so a fetch-only
+# run never pays for pandas/matplotlib/seaborn/reportlab at startup.
 
 class JobRunner:
-    def __init__(self, operator_ids, rated_api_call):
+    def __init__(self, operator_ids, rated_api_call, render=True, workers=4, from_snapshots=False, storage="entity", compact=False, archive="", export_archive=False, warm_start="", warm_start_ttl=3600, shards=0, worker_id="", backfill="", backfill_window=30, rate_limit=0, series_days=0, sketch_days=0, alert_rules="", digest=False, publish=False, import_histories=False):
         self.counter = 0
         self.operator_ids = operator_ids
         self.rated_api_call = rated_api_call
+        self.render = render
+        self.workers = workers
+        self.from_snapshots = from_snapshots
+        self.storage = storage
+        self.compact = compact
+        self.import_histories = import_histories
+        self.export_archive = export_archive
+        self.warm_start = warm_start
+        self.warm_start_ttl = warm_start_ttl
+        self.shards = shards
+        self.worker_id = worker_id
+        self.backfill = backfill
+        self.backfill_window = backfill_window
+        self.rate_limit = rate_limit
+        self.window = ['2025-01-16', '2025-01-15', '2025-01-14', '2025-01-13', '2025-01-12']
+        self.window_key = f"{min(self.window)}_{max(self.window)}"
+        # days of the time series charts, with series_days only these and the window are loaded up front
+        self.series_days = series_days
+        self.series_dates = last_days(max(self.window), series_days) if series_days else None
+        self.sketch_days = sketch_days
+        # "default" or the path of a json rules file, see AlertRules
+        self.alert_rules = alert_rules
+        self.digest = digest
+        self.publish = publish
+        self.analysed = False
         sk = decrypt_string(os.getenv("AWS_S3_SECRET_KEY"), os.getenv("KEY"))
         self.s3ReadWriter = S3ReadWrite(sk, os.getenv("AWS_S3_ACCESS_KEY"))
-        self.DataHandler =  DataHandler()
-        self.VisualHandler = VisualHandler(self.operator_ids, self.DataHandler)
-        self.ReportHandler = ReportHandler(self.operator_ids, self.DataHandler)
+        self.DataHandler = None
+        self.VisualHandler = None
+        self.ReportHandler = None
+        self.partition_store = None
+        if storage == "partitioned":
+            from PartitionStore import PartitionStore
+            self.partition_store = PartitionStore(self.s3ReadWriter)
+        self.archive = None
+        if archive:
+            from HistoryArchive import HistoryArchive
+            filesystem = self.s3ReadWriter.arrow_filesystem() if archive.startswith("s3://") else None
+            self.archive = HistoryArchive(archive, filesystem)
 
     def run(self):
+        self.analysed = False
+        compaction = None
         try:
-            if self.rated_api_call:
-                logger.info("checking Rated.network stats [--rated-api-call set to True]")
-                rated_handler = RatedHandler(os.getenv("RATED_API_SK_4"))
-                rated_handler.write_api_data(s3=self.s3ReadWriter)
+            if self.import_histories and self.partition_store:
+                with profiler.stage("partitions.import"):
+                    self.import_stage()
+
+            if self.backfill:
+                with profiler.stage("backfill"):
+                    self.backfill_stage()
+
+            if self.rated_api_call or self.operator_ids:
+                with profiler.stage("ingest"):
+                    self.ingest_stage()
+
+            if self.export_archive and self.archive:
+                with profiler.stage("archive.export"):
+                    self.export_stage()
+
+            if self.compact and self.partition_store:
+                # merges day parts while analysis and rendering carry on
+                compaction = threading.Thread(target=self.compaction_stage, daemon=True)
+                compaction.start()
 
             if self.operator_ids:
-                self.DataHandler.load_data(s3=self.s3ReadWriter)
-
-                nos = self.DataHandler.node_data
-                agg_data = self.DataHandler.agg_data
-  
-                self.DataHandler.get_mva(['2025-01-16', '2025-01-15', '2025-01-14', '2025-01-13', '2025-01-12'], module="csm")
-                self.DataHandler.get_mva(['2025-01-16', '2025-01-15', '2025-01-14', '2025-01-13', '2025-01-12'], module="sdvt")
-                self.DataHandler.get_mva(['2025-01-16', '2025-01-15', '2025-01-14', '2025-01-13', '2025-01-12'], module="curated")
-                
-                self.DataHandler.get_statistics(module="csm")
-                self.DataHandler.get_zscores(module="csm")
-
-                self.DataHandler.get_statistics(module="sdvt")
-                self.DataHandler.get_zscores(module="sdvt")
-
-                self.DataHandler.get_statistics(module="curated")
-                self.DataHandler.get_zscores(module="curated")
-
-                for date, operators in self.DataHandler.node_data.items():
-                    for id, stats in operators.items():
-                        if "107" in id:
-                            print(date)
-                            print(id)
-                            for metric, values in stats.items():
-                                if metric == "sumWrongHeadVotes":
-                                    print(metric, values)
-
-                self.VisualHandler.generate_histograms(node_data=nos, date="2025-01-12_2025-01-16", sdvt_data=self.DataHandler.sdvt_data, curated_module_data=self.DataHandler.curated_module_data)
-                self.VisualHandler.generate_time_series(data=nos, agg_data=agg_data)
-
-                self.ReportHandler.generate_report()
+                if not self.analysed:
+                    with profiler.stage("analysis"):
+                        self.analysis_stage()
+                if self.alert_rules:
+                    with profiler.stage("alerts"):
+                        self.alert_stage()
+                if self.digest:
+                    with profiler.stage("digest"):
+                        self.digest_stage()
+                if self.render:
+                    with profiler.stage("render"):
+                        self.render_stage()
+                    if self.publish:
+                        with profiler.stage("publish"):
+                            self.publish_stage()
+
+            if self.sketch_days:
+                with profiler.stage("sketch_window"):
+                    self.sketch_window_stage()
+
+            if compaction:
+                compaction.join()
 
             last_write = int(time.time())
             self.s3ReadWriter.write_data("lido_csm/last_write", last_write)
             logger.info(f"round {self.counter}")
+            profiler.write()
             self.s3ReadWriter.write_logs()
             self.counter += 1
-        
+
         except Exception as e:
             traceback.print_exc()
             logger.error(f"An error occurred in build_from_creation: {e}")
+            profiler.write()
+
+    def rated_handler(self):
+        from RatedHandler import RatedHandler
+        from EntityRegistry import EntityRegistry
+        rate_limiter = None
+        if self.rate_limit:
+            from rate_limit import RateLimiter
+            rate_limiter = RateLimiter(self.rate_limit)
+        return RatedHandler(os.getenv("RATED_API_SK_4"), EntityRegistry.load(self.s3ReadWriter), rate_limiter)
+
+    def backfill_stage(self):
+        from Backfill import Backfill
+        start, end = self.backfill.split(":")
+        logger.info(f"backfilling Rated data {start}..{end} [--backfill set]")
+        rated_handler = self.rated_handler()
+        Backfill(self.s3ReadWriter, rated_handler, start, end, self.backfill_window, self.workers, self.partition_store).run()
+
+    def ingest_stage(self):
+        rated_handler = None
+        if self.rated_api_call:
+            logger.info("checking Rated.network stats [--rated-api-call set to True]")
+            rated_handler = self.rated_handler()
+
+        if self.operator_ids:
+            from DataHandler import DataHandler
+            self.DataHandler = DataHandler()
+
+            if self.warm_start and not rated_handler:
+                # state computed by a recent run for the same window, no load or analysis
+                if self.DataHandler.load_state(self.warm_start, meta={"window": self.window_key}, max_age=self.warm_start_ttl):
+                    logger.info(f"warm start from {self.warm_start}")
+                    self.analysed = True
+                    return
+                self.DataHandler = DataHandler()
+
+            if self.from_snapshots and not rated_handler:
+                # own history + a few module snapshots instead of the whole bucket
+                with profiler.stage("load.snapshots"):
+                    missing = self.DataHandler.load_from_snapshots(self.s3ReadWriter, self.operator_ids, self.window + [self.window_key])
+                if not missing:
+                    self.analysed = True
+                    return
+                logger.info("module snapshots incomplete, falling back to full load")
+                self.DataHandler = DataHandler()
+
+            if self.archive and not rated_handler:
+                # report columns for the window only
+                from HistoryArchive import REPORT_METRICS
+                if self.DataHandler.load_archive(self.archive, self.window, REPORT_METRICS):
+                    return
+                logger.info("archive has no data for the window, falling back to full load")
+                self.DataHandler = DataHandler()
+
+        # with partitioned storage fetched days are read back from their partitions
+        stream_into = None if self.partition_store else self.DataHandler
+        load_dates = sorted(set(self.window) | set(self.series_dates)) if self.series_dates else None
+        if stream_into and load_dates:
+            logger.info(f"loading {len(load_dates)} days [--series-days set], other days are read on demand")
+            self.DataHandler.limit_dates(load_dates, lambda missing: self.DataHandler.load_data(self.s3ReadWriter, missing))
+
+        fetch_handler = rated_handler
+        if rated_handler and self.shards:
+            # this process is one of several workers splitting the entities, the load below sees all of them
+            from ShardedFetch import ShardedFetcher
+            with profiler.stage("fetch"):
+                ShardedFetcher(self.s3ReadWriter, rated_handler, self.shards, self.worker_id or None, partition_store=self.partition_store).run()
+            fetch_handler = None
+
+        # fetched histories are put on a pool of uploaders, fetching never waits on a PUT
+        writer = None
+        if fetch_handler and not self.partition_store:
+            from WriteBehind import WriteBehindWriter
+            writer = WriteBehindWriter(self.s3ReadWriter, workers=max(self.workers, 4))
+        try:
+            if self.workers > 1:
+                # fetch -> persist -> normalize overlap per entity
+                from Pipeline import Pipeline
+                Pipeline(writer or self.s3ReadWriter, stream_into, fetch_handler, workers=self.workers, partition_store=self.partition_store).run()
+            elif fetch_handler:
+                with profiler.stage("fetch"):
+                    fetch_handler.write_api_data(s3=writer or self.s3ReadWriter, partition_store=self.partition_store)
+        finally:
+            if writer:
+                with profiler.stage("fetch.flush"):
+                    results = writer.close()
+                logger.info(f"stored {sum(results.values())} of {len(results)} fetched histories")
+
+        if self.workers <= 1 and stream_into:
+            with profiler.stage("load"):
+                self.DataHandler.load_data(s3=self.s3ReadWriter, dates=load_dates)
+
+        if rated_handler:
+            rated_handler.registry.save()
+
+        if self.DataHandler and self.partition_store:
+            # the same days as an entity load, all of them unless --series-days narrows it
+            self.DataHandler.load_partitions(self.partition_store, load_dates)
+
+    def sketch_window_stage(self):
+        # population stats over the last sketch_days days from the daily sketches, no history is loaded
+        from QuantileSketch import window_statistics
+        from utils import MODULES, WINDOW_STATS_PREFIX
+        dates = last_days(max(self.window), self.sketch_days)
+        for module in MODULES:
+            stats, missing = window_statistics(self.s3ReadWriter, dates, module)
+            if missing:
+                logger.info(f"{module}: no sketches for {len(missing)} of {len(dates)} days")
+            self.s3ReadWriter.write_data(f"{WINDOW_STATS_PREFIX}{module}/{dates[0]}_{dates[-1]}", {"days": len(dates) - len(missing), "missing": missing, "stats": stats})
+
+    def alert_stage(self):
+        from AlertRules import AlertEngine, load_rules
+        from GaitKeeper import GaitKeeper
+        engine = AlertEngine(load_rules(self.alert_rules))
+        GaitKeeper(self.s3ReadWriter).check_alerts(engine, self.DataHandler, {"latest": max(self.window), "window": self.window_key})
+
+    def digest_stage(self):
+        # daily module summary for the rated_stats channel, from the stats analysis already computed
+        from DailyDigest import build_digest, format_digest, write_digest
+        from DiscordBot import DiscordBot
+        days = sorted(self.window)
+        digest = build_digest(self.DataHandler, days[-1], days[-2])
+        write_digest(self.s3ReadWriter, digest)
+        DiscordBot.send_msg(format_digest(digest), "rated_stats")
+
+    def publish_stage(self):
+        # the reports tree goes up as a new version of the window whenever its content changed
+        from ReportPublisher import ReportPublisher
+        ReportPublisher(self.s3ReadWriter).publish(self.window_key)
+
+    def import_stage(self):
+        # one-off migration, the per-entity histories are copied into day partitions and compacted
+        try:
+            segments = self.partition_store.import_entity_histories()
+            logger.info(f"imported entity histories into {len(segments)} segments")
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"An error occurred importing entity histories: {e}")
+
+    def export_stage(self):
+        # the archive is a copy, a failed export must not cost the run its reports
+        try:
+            self.archive.export_from_s3(self.s3ReadWriter)
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"An error occurred exporting the archive: {e}")
+
+    def compaction_stage(self):
+        try:
+            with profiler.stage("compaction"):
+                self.partition_store.compact()
+        except Exception as e:
+            traceback.print_exc()
+            logger.error(f"An error occurred in compaction: {e}")
+
+    def analysis_stage(self):
+        with profiler.stage("analysis.mva"):
+            self.DataHandler.get_mva(self.window, module="csm")
+            self.DataHandler.get_mva(self.window, module="sdvt")
+            self.DataHandler.get_mva(self.window, module="curated")
+
+        for module in ["csm", "sdvt", "curated"]:
+            with profiler.stage("analysis.stats"):
+                self.DataHandler.get_statistics(module=module)
+            with profiler.stage("analysis.zscores"):
+                self.DataHandler.get_zscores(module=module)
+
+        with profiler.stage("analysis.snapshots"):
+            self.DataHandler.write_module_snapshots(self.s3ReadWriter, dates=self.window + [self.window_key])
+        with profiler.stage("analysis.sketches"):
+            self.DataHandler.write_sketches(self.s3ReadWriter, dates=self.window)
+        self.analysed = True
+
+        if self.warm_start:
+            with profiler.stage("analysis.state"):
+                self.DataHandler.save_state(self.warm_start, meta={"window": self.window_key})
+
+        for date, operators in self.DataHandler.node_data.items():
+            for id, stats in operators.items():
+                if "107" in id:
+                    print(date)
+                    print(id)
+                    for metric, values in stats.items():
+                        if metric == "sumWrongHeadVotes":
+                            print(metric, values)
+
+    def render_stage(self):
+        from VisualHandler import VisualHandler
+        from ReportHandler import ReportHandler
+        from Pipeline import Channel
+
+        self.VisualHandler = VisualHandler(self.operator_ids, self.DataHandler)
+        self.ReportHandler = ReportHandler(self.operator_ids, self.DataHandler)
+
+        nos = self.DataHandler.node_data
+        agg_data = self.DataHandler.agg_data
+
+        # population stats are final here, so each operator's PDFs can be built
+        # while the next operator's charts render. pyplot is not thread safe,
+        # charts stay on this thread and only reportlab runs in the background.
+        reports = Channel(maxsize=2)
+
+        def build_reports():
+            for id in reports:
+                try:
+                    with profiler.stage("render.reports"):
+                        self.ReportHandler.generate_report(operator_ids=[id])
+                except Exception as e:
+                    traceback.print_exc()
+                    logger.error(f"An error occurred building reports for {id}: {e}")
+
+        report_thread = threading.Thread(target=build_reports, daemon=True)
+        report_thread.start()
+        try:
+            for id in self.operator_ids:
+                with profiler.stage("render.charts"):
+                    self.VisualHandler.generate_histograms(node_data=nos, date=self.window_key, sdvt_data=self.DataHandler.sdvt_data, curated_module_data=self.DataHandler.curated_module_data, operator_ids=[id])
+                    self.VisualHandler.generate_time_series(data=nos, agg_data=agg_data, operator_ids=[id], dates=self.series_dates, date=self.window_key)
+                reports.put(id)
+        finally:
+            reports.close()
+            report_thread.join()
 
     def check_s3(self, key, value, tag):
         result = self.s3ReadWriter.get_data(key, tag)
@@ -99,4 +362,4 @@ def decrypt_string(encrypted_base64, encryption_key):
         char_code = ord(encrypted[i]) ^ ord(encryption_key[i % len(encryption_key)])
         decrypted += chr(char_code)
 
-    return decrypted
\ No newline at end of file
+    return decrypted
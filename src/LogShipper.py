@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+import socket
+from datetime import datetime, timezone
+from logger_config import logger, log_file, rotating_handler
+from utils import LOG_PREFIX
+
+class LogShipper:
+    """
+    Uploads what was logged since the last run, gzipped, to
+    {LOG_PREFIX}YYYY/MM/DD/HHMMSS_<host>.log.gz.
+
+    The checkpoint next to the log ({log_file}.shipped) holds the inode and
+    byte offset shipped so far. RotatingFileHandler renames app.log to
+    app.log.1, app.log.1 to app.log.2 and so on, which keeps the inode, so
+    after a rotation the checkpointed file is found among the backups and
+    its tail plus every newer segment is shipped. Only complete lines are
+    shipped, and the checkpoint moves only after the upload succeeded.
+    """
+    def __init__(self, s3, path=log_file, backups=None):
+        self.s3 = s3
+        self.path = path
+        self.backups = rotating_handler.backupCount if backups is None else backups
+        self.checkpoint_file = f"{path}.shipped"
+
+    def segments(self):
+        # (path, inode) of the backups oldest first, then the live log
+        paths = [f"{self.path}.{n}" for n in range(self.backups, 0, -1)] + [self.path]
+        return [(path, os.stat(path).st_ino) for path in paths if os.path.exists(path)]
+
+    def read_checkpoint(self):
+        try:
+            with open(self.checkpoint_file) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"inode": None, "offset": 0}
+
+    def pending(self):
+        """
+        (chunks, checkpoint after shipping them): the unshipped bytes of every
+        segment, from the checkpointed segment on.
+        """
+        checkpoint = self.read_checkpoint()
+        segments = self.segments()
+        inodes = [inode for _, inode in segments]
+        if checkpoint["inode"] in inodes:
+            start = inodes.index(checkpoint["inode"])
+            offset = checkpoint["offset"]
+        else:
+            start, offset = 0, 0
+            if checkpoint["inode"] is not None:
+                logger.error(f"{self.path}: shipped segment rotated out of the last {self.backups} backups, older lines are lost")
+        chunks = []
+        shipped = dict(checkpoint)
+        for path, inode in segments[start:]:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size < offset:
+                    # truncated behind our back, ship it all
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+            if path == self.path:
+                # the live log may end in a half written line
+                data = data[:data.rfind(b"\n") + 1]
+            if data:
+                chunks.append(data)
+            shipped = {"inode": inode, "offset": offset + len(data)}
+            offset = 0
+        return chunks, shipped
+
+    def ship(self, now=None):
+        # returns the uploaded key, None when there was nothing new
+        chunks, shipped = self.pending()
+        if not chunks:
+            return None
+        now = now or datetime.now(timezone.utc)
+        key = f"{LOG_PREFIX}{now:%Y/%m/%d/%H%M%S}_{socket.gethostname()}.log.gz"
+        body = gzip.compress(b"".join(chunks))
+        if not self.s3.write_object(key, body, content_type="text/plain", content_encoding="gzip"):
+            return None
+        with open(self.checkpoint_file, "w") as f:
+            json.dump(shipped, f)
+        logger.info(f"Shipped {sum(len(chunk) for chunk in chunks)} log bytes ({len(body)} compressed) to {key}.")
+        return key
@@ -0,0 +1,197 @@
+import threading
+import time
+import uuid
+from logger_config import logger
+from profiler import profiler
+from utils import PARTITION_PREFIX, OPERATOR_DATA_PREFIX, MODULES, entity_module
+
+PARTITION_MODULES = MODULES + ["aggregate"]
+
+def new_run_id():
+    # sorts by time, suffix keeps concurrent writers apart
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:6]}"
+
+def build_segment(rows):
+    """
+    Columnar layout for a set of (entity, date) -> record rows: one array per
+    field, rows ordered by date then entity. Fields missing from a record
+    are stored as None.
+    """
+    keys = sorted(rows, key=lambda k: (k[1], k[0]))
+    entities = sorted({entity for entity, _ in keys})
+    index = {entity: i for i, entity in enumerate(entities)}
+    fields = sorted({field for record in rows.values() for field in record})
+    return {
+        "entities": entities,
+        "dates": [date for _, date in keys],
+        "entity": [index[entity] for entity, _ in keys],
+        "columns": {field: [rows[k].get(field) for k in keys] for field in fields},
+    }
+
+def iter_segment(segment, dates=None):
+    entities = segment["entities"]
+    columns = segment["columns"]
+    for row, date in enumerate(segment["dates"]):
+        if dates is None or date in dates:
+            yield entities[segment["entity"][row]], date, {field: column[row] for field, column in columns.items()}
+
+class PartitionStore:
+    """
+    Append-only history layout, partitioned by module and day:
+
+        {prefix}{module}/{YYYY-MM}/{YYYY-MM-DD}/part-{run_id}   {entity: record}
+        {prefix}{module}/{YYYY-MM}/segment-{run_id}             columnar month
+
+    Runs only ever add small day parts. compact() folds a month's parts into
+    one segment. Reads list a month once and decode only the requested dates;
+    when a date is written more than once, later writes win field by field.
+    """
+    def __init__(self, s3, prefix=PARTITION_PREFIX):
+        self.s3 = s3
+        self.prefix = prefix
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def month_prefix(self, module, month):
+        return f"{self.prefix}{module}/{month}/"
+
+    def part_key(self, module, date, run_id):
+        return f"{self.month_prefix(module, date[:7])}{date}/part-{run_id}"
+
+    def segment_key(self, module, month, run_id):
+        return f"{self.month_prefix(module, month)}segment-{run_id}"
+
+    def append(self, entity_id, history):
+        module = entity_module(entity_id)
+        with self._lock:
+            for date, record in history.items():
+                self._pending.setdefault((module, date), {})[entity_id] = record
+
+    def flush(self, run_id=None):
+        """
+        Write the appended records as day parts and return their keys.
+        Raises RuntimeError when a part could not be written, its records
+        go back to the pending ones for the next flush.
+        """
+        run_id = run_id or new_run_id()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        keys, failed = [], {}
+        for (module, date), records in sorted(pending.items()):
+            key = self.part_key(module, date, run_id)
+            if self.s3.write_data(key, records):
+                keys.append(key)
+            else:
+                failed[(module, date)] = records
+        logger.info(f"appended {len(keys)} day partitions")
+        if failed:
+            with self._lock:
+                for part, records in failed.items():
+                    # records appended since take precedence
+                    self._pending[part] = {**records, **self._pending.get(part, {})}
+            raise RuntimeError(f"could not write {len(failed)} day partitions")
+        return keys
+
+    def _list_month(self, module, month):
+        month_prefix = self.month_prefix(module, month)
+        segments, parts = [], {}
+        for key in self.s3.get_dir_files(month_prefix) or []:
+            name = key[len(month_prefix):]
+            if name.startswith("segment-"):
+                segments.append(key)
+            else:
+                parts.setdefault(name.split("/")[0], []).append(key)
+        return sorted(segments), {date: sorted(keys) for date, keys in parts.items()}
+
+    def _months(self, module):
+        module_prefix = f"{self.prefix}{module}/"
+        return sorted({key[len(module_prefix):].split("/")[0] for key in self.s3.get_dir_files(module_prefix) or []})
+
+    def _merge(self, history, entity, date, record):
+        history.setdefault(entity, {}).setdefault(date, {}).update(record)
+
+    def read(self, dates=None, modules=PARTITION_MODULES):
+        """
+        Histories for the requested dates only (every stored date when
+        dates is None), as {entity: {date: record}}, the same shape as the
+        lido_csm/operator_data objects.
+        """
+        dates = set(dates) if dates is not None else None
+        history = {}
+        for module in modules:
+            months = sorted({date[:7] for date in dates}) if dates is not None else self._months(module)
+            for month in months:
+                with profiler.stage("partitions.list"):
+                    segments, parts = self._list_month(module, month)
+                for key in segments:
+                    segment = self.s3.get_data(key)
+                    if segment:
+                        for entity, date, record in iter_segment(segment, dates):
+                            self._merge(history, entity, date, record)
+                for date in sorted(set(parts) if dates is None else dates & set(parts)):
+                    for key in parts[date]:
+                        for entity, record in (self.s3.get_data(key) or {}).items():
+                            self._merge(history, entity, date, record)
+        return history
+
+    def compact(self, months=None, modules=PARTITION_MODULES, min_parts=2):
+        """
+        Fold the day parts (and any earlier segment) of each month into a
+        single columnar segment, then delete what was folded in. Parts that
+        land while compacting are newer and stay on top of the new segment.
+        A month with an unreadable object, or whose segment could not be
+        written, is left as it is.
+        """
+        compacted = []
+        for module in modules:
+            for month in months or self._months(module):
+                segments, parts = self._list_month(module, month)
+                part_keys = [key for date in sorted(parts) for key in parts[date]]
+                # a month that is already a single segment is left alone
+                if not part_keys and len(segments) <= 1:
+                    continue
+                if len(segments) + len(part_keys) < min_parts:
+                    continue
+
+                rows = {}
+                unread = []
+                for key in segments:
+                    segment = self.s3.get_data(key)
+                    if segment is None:
+                        unread.append(key)
+                    elif segment:
+                        for entity, date, record in iter_segment(segment):
+                            rows.setdefault((entity, date), {}).update(record)
+                for key in part_keys:
+                    date = key[len(self.month_prefix(module, month)):].split("/")[0]
+                    part = self.s3.get_data(key)
+                    if part is None:
+                        unread.append(key)
+                        continue
+                    for entity, record in part.items():
+                        rows.setdefault((entity, date), {}).update(record)
+                if unread:
+                    # folding around it would reorder its writes against the rest
+                    logger.error(f"could not read {len(unread)} objects of {module} {month}, not compacting it")
+                    continue
+
+                segment_key = self.segment_key(module, month, new_run_id())
+                if not self.s3.write_data(segment_key, build_segment(rows)):
+                    logger.error(f"could not write {segment_key}, keeping the parts of {module} {month}")
+                    continue
+                self.s3.delete_data(segments + part_keys)
+                compacted.append(segment_key)
+                logger.info(f"compacted {len(part_keys)} parts into {segment_key}")
+        return compacted
+
+    def import_entity_histories(self, keys=None):
+        """
+        One-off migration from the per-entity lido_csm/operator_data objects.
+        """
+        keys = keys or self.s3.get_dir_files(OPERATOR_DATA_PREFIX) or []
+        for key in keys:
+            history = self.s3.get_data(key)
+            if history:
+                self.append(key[len(OPERATOR_DATA_PREFIX):], history)
+        self.flush()
+        return self.compact(min_parts=1)
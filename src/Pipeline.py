@@ -0,0 +1,193 @@
+import queue
+import threading
+import traceback
+from logger_config import logger
+from profiler import profiler
+from utils import OPERATOR_DATA_PREFIX
+
+_DONE = object()
+
+class Channel:
+    """
+    Bounded queue between two pipeline stages. Every producer calls close()
+    when it is done; once all of them have, consumers drain and stop.
+    """
+    def __init__(self, maxsize, producers=1):
+        self.queue = queue.Queue(maxsize)
+        self._producers = producers
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self.queue.put(item)
+
+    def close(self):
+        with self._lock:
+            self._producers -= 1
+            last = self._producers == 0
+        if last:
+            self.queue.put(_DONE)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _DONE:
+                # leave the marker for sibling consumers
+                self.queue.put(_DONE)
+                return
+            yield item
+
+class Pipeline:
+    """
+    Producer/consumer ingest: fetch -> persist -> normalize for entities pulled
+    from Rated, and S3 load -> normalize for everything else already in the
+    bucket. Stages are connected by bounded Channels so each entity moves on
+    as soon as the previous stage is done with it.
+    """
+    def __init__(self, s3, data_handler=None, rated_handler=None, workers=4, queue_size=32, partition_store=None):
+        self.s3 = s3
+        self.dh = data_handler
+        self.rated_handler = rated_handler
+        self.partition_store = partition_store
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.counts = {"fetched": 0, "persisted": 0, "loaded": 0, "normalized": 0, "errors": 0}
+        self._persisted_ids = set()
+        self._lock = threading.Lock()
+
+    def run(self):
+        threads = []
+        fetching = self.rated_handler is not None
+        loading = self.dh is not None
+
+        normalize_channel = None
+        if loading:
+            normalize_channel = Channel(self.queue_size, producers=int(fetching) + 1)
+            threads += self._spawn("normalize", self._normalize, normalize_channel, None, workers=1)
+
+        fetched_ids = set()
+        fetch_threads = []
+        if fetching:
+            fetched_ids = set(self.rated_handler.rated_ids)
+            fetch_channel = Channel(self.queue_size)
+            persist_channel = Channel(self.queue_size)
+            fetch_threads.append(self._source(self.rated_handler.rated_ids, fetch_channel))
+            fetch_threads += self._spawn("fetch", self._fetch, fetch_channel, persist_channel)
+            fetch_threads += self._spawn("persist", self._persist, persist_channel, normalize_channel)
+            threads += fetch_threads
+
+        if loading:
+            load_channel = Channel(self.queue_size)
+            threads.append(self._source(self._keys_to_load(fetched_ids, fetch_threads), load_channel))
+            threads += self._spawn("load", self._load, load_channel, normalize_channel)
+
+        for thread in threads:
+            thread.join()
+
+        if self.partition_store is not None and fetching:
+            try:
+                self.partition_store.flush()
+            except Exception as e:
+                logger.error(f"An error occurred flushing partitions: {e}")
+                self._count("errors")
+
+        logger.info(f"pipeline finished {self.counts}")
+        return self.counts
+
+    def _keys_to_load(self, fetched_ids, fetch_threads=()):
+        # entities refreshed from Rated flow in from the persist stage. Those
+        # whose fetch or persist failed are loaded once fetching is done, so
+        # their stored history is still analysed.
+        def keys():
+            stored = self.s3.get_dir_files(OPERATOR_DATA_PREFIX) or []
+            for key in stored:
+                if key[len(OPERATOR_DATA_PREFIX):] not in fetched_ids:
+                    yield key
+            for thread in fetch_threads:
+                thread.join()
+            for key in stored:
+                id = key[len(OPERATOR_DATA_PREFIX):]
+                if id in fetched_ids and id not in self._persisted_ids:
+                    yield key
+        return keys()
+
+    def _source(self, items, outbox):
+        def produce():
+            try:
+                for item in items:
+                    outbox.put(item)
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred in pipeline source: {e}")
+                self._count("errors")
+            finally:
+                outbox.close()
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        return thread
+
+    def _spawn(self, name, func, inbox, outbox, workers=None):
+        workers = workers or self.workers
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def work():
+            try:
+                for item in inbox:
+                    try:
+                        with profiler.stage(f"pipeline.{name}"):
+                            result = func(item)
+                        if result is not None and outbox is not None:
+                            outbox.put(result)
+                    except Exception as e:
+                        traceback.print_exc()
+                        logger.error(f"An error occurred in pipeline stage {name}: {e}")
+                        self._count("errors")
+            finally:
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    outbox.close()
+
+        threads = [threading.Thread(target=work, name=f"{name}-{n}", daemon=True) for n in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _fetch(self, id):
+        combined_data = self.rated_handler.fetch_entity(id)
+        if self.partition_store is None:
+            combined_data = self.rated_handler.merge_existing(id, combined_data, self.s3)
+        self._count("fetched")
+        if not combined_data:
+            # unknown to Rated and nothing stored, no empty object is written
+            return None
+        return (f"{OPERATOR_DATA_PREFIX}{id}", combined_data)
+
+    def _persist(self, item):
+        key, data = item
+        if self.partition_store is not None:
+            # append-only, day parts are written in one go by flush()
+            self.partition_store.append(key[len(OPERATOR_DATA_PREFIX):], data)
+        else:
+            self.s3.write_data(key, data)
+        self._count("persisted")
+        with self._lock:
+            self._persisted_ids.add(key[len(OPERATOR_DATA_PREFIX):])
+        return item
+
+    def _load(self, key):
+        data = self.s3.get_data(key)
+        self._count("loaded")
+        if data is None:
+            return None
+        return (key, data)
+
+    def _normalize(self, item):
+        key, data = item
+        self.dh.ingest(key, data)
+        self._count("normalized")
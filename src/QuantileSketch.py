@@ -0,0 +1,164 @@
+import math
+import random
+import numpy as np
+from utils import SKETCH_PREFIX
+
+# items kept by the top compactor, rank error is roughly 1.7 / SKETCH_K
+SKETCH_K = 200
+SKETCH_QUANTILES = {"p10": 0.1, "p25": 0.25, "median": 0.5, "p75": 0.75, "p90": 0.9}
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang, Liberty 2016) in
+    O(k) memory. Level h holds items that each stand for 2**h values. A
+    full level is sorted and every other item moves up one level, starting
+    at a random offset. Count, sum, sum of squares, min and max are exact,
+    so means and standard deviations of merged sketches are too; only
+    the quantiles are approximate.
+    """
+    def __init__(self, k=SKETCH_K, seed=0):
+        self.k = k
+        self.levels = [[]]
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._random = random.Random(seed)
+
+    def capacity(self, level):
+        # the top level keeps k items, each level below 2/3 of the one above
+        return int(math.ceil(self.k * (2 / 3) ** (len(self.levels) - level - 1))) + 1
+
+    def update(self, value):
+        self.update_many([value])
+
+    def update_many(self, values):
+        values = [float(v) for v in values]
+        if not values:
+            return
+        self.count += len(values)
+        self.total += math.fsum(values)
+        self.total_sq += math.fsum(v * v for v in values)
+        self.min = min(self.min, min(values))
+        self.max = max(self.max, max(values))
+        self.levels[0].extend(values)
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) >= self.capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                # an odd item out stays behind
+                keep = items[-1:] if len(items) % 2 else []
+                pairs = items[:len(items) - len(keep)]
+                self.levels[level + 1].extend(pairs[self._random.random() < 0.5::2])
+                self.levels[level] = keep
+            level += 1
+
+    def size(self):
+        return sum(len(items) for items in self.levels)
+
+    def _weighted(self):
+        values = np.array([v for items in self.levels for v in items], dtype=float)
+        weights = np.concatenate([np.full(len(items), 2 ** level, dtype=float) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def quantiles(self, qs):
+        """
+        Values at the given fractions (0..1). A sketch that never compacted
+        holds every value and gives exact order statistics.
+        """
+        if not self.count:
+            return [None] * len(qs)
+        values, cumulative = self._weighted()
+        # rescale, the item weights only add up to count approximately
+        cumulative = cumulative * (self.count / cumulative[-1])
+        positions = np.searchsorted(cumulative, np.array(qs, dtype=float) * self.count, "left")
+        return [float(values[min(p, len(values) - 1)]) for p in positions.tolist()]
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def rank(self, value):
+        # approximate share of values below value
+        if not self.count:
+            return None
+        values, cumulative = self._weighted()
+        position = np.searchsorted(values, value, "left")
+        return float(cumulative[position - 1] / cumulative[-1]) if position else 0.0
+
+    def summary(self):
+        # the get_statistics fields a sketch can give, plus the quantiles
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        summary = dict(zip(SKETCH_QUANTILES, self.quantiles(list(SKETCH_QUANTILES.values()))))
+        summary.update({
+            "mean": mean,
+            "std_dev": math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0)),
+            "min": self.min,
+            "max": self.max,
+            "count": self.count,
+        })
+        return summary
+
+    def to_dict(self):
+        # min/max are None until a value is seen, json has no infinities
+        return {"k": self.k, "levels": self.levels, "count": self.count, "total": self.total, "total_sq": self.total_sq, "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data, seed=0):
+        sketch = cls(data["k"], seed)
+        sketch.levels = [list(items) for items in data["levels"]]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        sketch.total_sq = data["total_sq"]
+        sketch.min = data["min"] if data["count"] else math.inf
+        sketch.max = data["max"] if data["count"] else -math.inf
+        return sketch
+
+def window_sketches(s3, dates, module):
+    """
+    The daily sketches of module merged over dates, read from
+    {SKETCH_PREFIX}{module}/{date}: ({metric: {variant: KLLSketch}}, missing
+    dates). No operator history is read.
+    """
+    merged = {}
+    missing = []
+    for date in sorted(dates):
+        daily = s3.get_data(f"{SKETCH_PREFIX}{module}/{date}")
+        if not isinstance(daily, dict):
+            missing.append(date)
+            continue
+        for metric, variants in daily.items():
+            for variant, data in variants.items():
+                sketch = KLLSketch.from_dict(data)
+                if variant in merged.setdefault(metric, {}):
+                    merged[metric][variant].merge(sketch)
+                else:
+                    merged[metric][variant] = sketch
+    return merged, missing
+
+def window_statistics(s3, dates, module):
+    # {metric: {variant: summary}} over every operator-day of the window, see KLLSketch.summary
+    merged, missing = window_sketches(s3, dates, module)
+    stats = {metric: {variant: sketch.summary() for variant, sketch in variants.items()} for metric, variants in merged.items()}
+    return stats, missing
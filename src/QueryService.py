@@ -0,0 +1,197 @@
+import argparse
+import json
+import math
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from logger_config import logger
+from utils import MODULES
+
+WINDOW_CACHE = 4096
+CSM_NUMBER = re.compile(r"Operator (\d+) -")
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def clean(value):
+    # json has no NaN, numpy scalars become plain numbers
+    if isinstance(value, dict):
+        return {key: clean(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [clean(v) for v in value]
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+class QueryService:
+    """
+    Read-only queries over a DataHandler's computed state (a warm start
+    snapshot, see DataHandler.save_state):
+
+        /dates?module=csm
+        /modules/<module>/stats?date=&metric=
+        /operators/<module>/<id>?date=            metrics, per_val, z-scores
+        /operators/<module>/<id>/rank?metric=&variant=&date=
+        /operators/<module>/<id>/window?metric=&variant=&start=&end=
+        /health
+
+    id is the CSM operator number or the full entity name. date defaults
+    to the newest MVA window. Operator names and day lists are indexed
+    once, ranks come from the RankIndex and windows over any day range are
+    kept in an LRU cache.
+    """
+    def __init__(self, data_handler, window_cache=WINDOW_CACHE):
+        self.dh = data_handler
+        self.ranks = data_handler.rank_index()
+        self.names = {}
+        self.days = {}
+        self.windows = {}
+        for module in MODULES:
+            data, _ = data_handler.module_state(module)
+            names = {}
+            for operators in data.values():
+                for name in operators:
+                    names[name] = name
+                    match = CSM_NUMBER.search(name) if module == "csm" else None
+                    if match:
+                        names[match.group(1)] = name
+            self.names[module] = names
+            self.days[module] = sorted(date for date in data if "_" not in date)
+            self.windows[module] = sorted(date for date in data if "_" in date)
+        self.window = lru_cache(maxsize=window_cache)(self._window)
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def query(self, url):
+        # (status, payload) for a request path with its query string
+        with self._lock:
+            self.requests += 1
+        parts = urlsplit(url)
+        path = [unquote(part) for part in parts.path.strip("/").split("/") if part]
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            return 200, clean(self.route(path, params))
+        except QueryError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            logger.error(f"An error occurred answering {url}: {e}")
+            return 500, {"error": "internal error"}
+
+    def route(self, path, params):
+        if path == ["health"]:
+            info = self.window.cache_info()
+            return {"requests": self.requests, "window_cache": {"hits": info.hits, "misses": info.misses, "size": info.currsize}}
+        if path == ["dates"]:
+            module = self.module(params.get("module", "csm"))
+            return {"days": self.days[module], "windows": self.windows[module]}
+        if len(path) == 3 and path[0] == "modules" and path[2] == "stats":
+            module = self.module(path[1])
+            _, stats = self.dh.module_state(module)
+            date = self.date(module, params)
+            stats = stats.get(date, {})
+            if "metric" in params:
+                stats = {params["metric"]: stats.get(params["metric"], {})}
+            return {"module": module, "date": date, "stats": stats}
+        if len(path) in (3, 4) and path[0] == "operators":
+            module = self.module(path[1])
+            operator = self.names[module].get(path[2])
+            if operator is None:
+                raise QueryError(404, f"no {module} operator {path[2]}")
+            if len(path) == 3:
+                data, _ = self.dh.module_state(module)
+                date = self.date(module, params)
+                return {"operator": operator, "date": date, "metrics": data.get(date, {}).get(operator, {})}
+            if path[3] == "rank":
+                date = self.date(module, params)
+                metric, variant = self.metric(params)
+                rank, percentile = self.ranks.ranks(date, module, metric, variant).get(operator, (None, None))
+                peers = len(self.ranks.sorted_values(date, module, metric, variant))
+                return {"operator": operator, "date": date, "metric": metric, "variant": variant, "rank": rank, "percentile": percentile, "peers": peers}
+            if path[3] == "window":
+                metric, variant = self.metric(params)
+                days = self.days[module]
+                start = params.get("start", days[0] if days else "")
+                end = params.get("end", days[-1] if days else "")
+                return {"operator": operator, "metric": metric, "variant": variant, "start": start, "end": end, **self.window(module, operator, metric, variant, start, end)}
+        raise QueryError(404, f"unknown path /{'/'.join(path)}")
+
+    def module(self, module):
+        if module not in MODULES:
+            raise QueryError(400, f"unknown module {module}, expected one of {MODULES}")
+        return module
+
+    def date(self, module, params):
+        if "date" in params:
+            return params["date"]
+        if self.windows[module]:
+            return self.windows[module][-1]
+        if self.days[module]:
+            return self.days[module][-1]
+        raise QueryError(404, f"no data for {module}")
+
+    def metric(self, params):
+        if "metric" not in params:
+            raise QueryError(400, "metric is required")
+        return params["metric"], params.get("variant", "metric")
+
+    def _window(self, module, operator, metric, variant, start, end):
+        # mean/min/max of a metric over the days in [start, end]
+        data, _ = self.dh.module_state(module)
+        days = self.days[module]
+        values = []
+        for day in days[bisect_left(days, start):bisect_right(days, end)]:
+            value = data[day].get(operator, {}).get(metric, {}).get(variant)
+            if isinstance(value, (int, float)) and not math.isnan(value):
+                values.append(value)
+        if not values:
+            return {"days": 0, "mean": None, "min": None, "max": None}
+        return {"days": len(values), "mean": sum(values) / len(values), "min": min(values), "max": max(values)}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    # keep-alive, clients reuse one connection for many queries
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes, Nagle would hold the body for the client's delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        status, payload = self.server.service.query(self.path)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(service, host="127.0.0.1", port=8080):
+    # the server is returned unstarted, call serve_forever (or run it on a thread)
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--state', action='store', type=str, required=True,
+                        help='state snapshot directory written by a run with --warm-start')
+    parser.add_argument('--host', action='store', type=str, default="127.0.0.1")
+    parser.add_argument('--port', action='store', type=int, default=8080)
+    args = parser.parse_args()
+
+    from DataHandler import DataHandler
+    dh = DataHandler()
+    if not dh.load_state(args.state):
+        raise SystemExit(f"no state snapshot in {args.state}")
+    server = serve(QueryService(dh), args.host, args.port)
+    logger.info(f"query service on http://{args.host}:{server.server_port}")
+    print(f"query service on http://{args.host}:{server.server_port}")
+    server.serve_forever()
@@ -0,0 +1,93 @@
+import math
+import threading
+import numpy as np
+from utils import ATTEST_METRICS, OTHER_METRICS, LOWER_IS_BETTER
+
+RANKED_METRICS = set(ATTEST_METRICS + OTHER_METRICS)
+RANKED_VARIANTS = ["metric", "per_val", "attest_pct"]
+
+def peer_ranks(sorted_values, values, lower_is_better, members=True):
+    """
+    Rank (1 is best, ties share the better rank) and percentile (share of
+    the other peers beaten, ties counting half) of values among sorted_values.
+    members says values are themselves in sorted_values, each is then not
+    counted as its own peer.
+    """
+    n = len(sorted_values)
+    others = n - members
+    left = np.searchsorted(sorted_values, values, "left")
+    right = np.searchsorted(sorted_values, values, "right")
+    if lower_is_better:
+        beaten, rank = n - right, left + 1
+    else:
+        beaten, rank = left, n - right + 1
+    if others < 1:
+        return rank, np.full(len(rank), np.nan)
+    return rank, 100 * (beaten + 0.5 * (right - left - members)) / others
+
+class RankIndex:
+    """
+    Sorted peer values per (date or MVA window, module, metric, variant),
+    taken from a DataHandler's module data. Same population as
+    get_statistics: numeric values, None and NaN left out.
+
+        rank(date, module, metric, variant, value) -> (rank, percentile, peers)
+        ranks(date, module, metric, variant) -> {operator: (rank, percentile)}
+
+    A (date, module) is indexed on first use; ranks of all its operators
+    are computed in one pass and kept.
+    """
+    def __init__(self, data_handler):
+        self.dh = data_handler
+        self._columns = {}
+        self._ranks = {}
+        self._lock = threading.Lock()
+
+    def columns(self, date, module):
+        # {(metric, variant): (operators, values, sorted values)}
+        key = (date, module)
+        with self._lock:
+            if key not in self._columns:
+                data, _ = self.dh.module_state(module)
+                raw = {}
+                for operator, metrics in data.get(date, {}).items():
+                    for metric, variants in metrics.items():
+                        if metric not in RANKED_METRICS:
+                            continue
+                        for variant in RANKED_VARIANTS:
+                            value = variants.get(variant)
+                            if isinstance(value, (int, float)) and not math.isnan(value):
+                                column = raw.setdefault((metric, variant), ([], []))
+                                column[0].append(operator)
+                                column[1].append(value)
+                columns = {}
+                for column, (operators, values) in raw.items():
+                    values = np.array(values, dtype=float)
+                    columns[column] = (operators, values, np.sort(values))
+                self._columns[key] = columns
+            return self._columns[key]
+
+    def sorted_values(self, date, module, metric, variant="metric"):
+        column = self.columns(date, module).get((metric, variant))
+        return column[2] if column else np.empty(0)
+
+    def rank(self, date, module, metric, variant, value):
+        peers = self.sorted_values(date, module, metric, variant)
+        if value is None or not isinstance(value, (int, float)) or math.isnan(value) or not len(peers):
+            return None, None, len(peers)
+        rank, percentile = peer_ranks(peers, np.array([value], dtype=float), metric in LOWER_IS_BETTER, members=False)
+        percentile = None if math.isnan(percentile[0]) else float(percentile[0])
+        return int(rank[0]), percentile, len(peers)
+
+    def ranks(self, date, module, metric, variant="metric"):
+        key = (date, module, metric, variant)
+        if key not in self._ranks:
+            column = self.columns(date, module).get((metric, variant))
+            ranked = {}
+            if column:
+                operators, values, peers = column
+                rank, percentile = peer_ranks(peers, values, metric in LOWER_IS_BETTER)
+                percentile = [None if math.isnan(p) else p for p in percentile.tolist()]
+                ranked = dict(zip(operators, zip(rank.tolist(), percentile)))
+            self._ranks[key] = ranked
+        return self._ranks[key]
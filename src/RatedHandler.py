@@ -1,15 +1,25 @@
 import requests
 from datetime import datetime, timedelta, timezone
 from logger_config import logger
-from GaitKeeper import GaitKeeper
+from profiler import profiler
 import traceback
 import time
-from utils import LIDO_CURATED, LIDO_SDVT
+from utils import LIDO_CURATED, LIDO_SDVT, READ_FAILED
+from urllib.parse import urljoin
+from EntityRegistry import ACTIVE, MISSING, EMPTY
+
+RATED_API = "https://api.rated.network"
+
+# per-row keys of the Rated results that are not stored, the day is the combined key
+DROPPED_KEYS = frozenset({"hour", "startDay", "endDay", "startDate", "endDate", "date", "day"})
 
 class RatedHandler:
-    def __init__(self, sk):
+    def __init__(self, sk, registry=None, rate_limiter=None, max_retries=3):
         self.sk = sk
         self.node_operator_ids = [37, 135]
+        self.registry = registry
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
         self.rated_ids = ["Lido", "Lido Community Staking Module"]
         for n in range(0, 400):
             self.rated_ids.append(f"CSM Operator {n} - Lido Community Staking Module")
@@ -17,66 +27,160 @@ class RatedHandler:
             self.rated_ids.append(f"{id} - Lido")  
         for id in LIDO_SDVT:
             self.rated_ids.append(f"{id} - Lido SimpleDVT Module")  
+        if registry is not None:
+            # the fixed list only seeds discovery, the registry drops dead ids and finds new ones
+            self.rated_ids = registry.candidates(self.rated_ids)
 
-    def write_api_data(self, s3):
+    def write_api_data(self, s3, partition_store=None):
         for id in self.rated_ids:
-            if id == "Lido": entity_type = "pool"
-            else: entity_type = "poolShare"
-
-            existing_data = s3.get_data(f"lido_csm/operator_data/{id}")
-
-            urls = {
-                "attest": f"https://api.rated.network/v1/eth/entities/{id}/attestations",
-                "effective": f"https://api.rated.network/v1/eth/entities/{id}/effectiveness",
-                "rewards": f"https://api.rated.network/v1/eth/entities/{id}/rewards",
-                "penalties": f"https://api.rated.network/v1/eth/entities/{id}/penalties",
-            }
-
-            #yest, today = self.get_last_days(days=4)
-            yest, today = "2025-01-12", "2025-01-16"
-            params = {
-                "fromDate": yest,
-                "entityType": entity_type,
-                "toDate": today,
-                "utc": "false",  # "false" for ETH chain days
-            }
-            
-            results = []
-            for key, base_url in urls.items():
-                # Headers
-                headers = {
-                    "Authorization": f"Bearer {self.sk}",  
-                    "Content-Type": "application/json",
-                }
-
-                # Make the GET request
+            combined_data = self.fetch_entity(id)
+            if not combined_data:
+                continue
+            if partition_store is not None:
+                partition_store.append(id, combined_data)
+                continue
+            with profiler.stage("fetch.merge"):
+                combined_data = self.merge_existing(id, combined_data, s3)
+            with profiler.stage("fetch.persist"):
+                s3.write_data(f"lido_csm/operator_data/{id}", combined_data)
+        if partition_store is not None:
+            with profiler.stage("fetch.persist"):
                 try:
-                    response = requests.get(base_url, headers=headers, params=params)
-                
-
-                    # Handle the response
-                    if response.status_code == 200:
-                        data = response.json()
-                        logger.info("Response Data:", data)
-                        results.append(data)
-                    else:
-                        logger.error(f"Request failed with status code {response.status_code}: {response.text}")
-                        print(f"Request failed with status code {response.status_code}: {response.text}")
-
+                    partition_store.flush()
                 except Exception as e:
-                    traceback.print_exc()
-                    logger.error(f"An error occurred in Rated.network API check: {e}")
-                    time.sleep(1)
-
-            combined_data = self.combine_jsons(results)
-            existing_data = s3.get_data(f"lido_csm/operator_data/{id}")
-            if existing_data:
-                for date, stats in list(existing_data.items()):
-                    if date not in combined_data:
-                        combined_data[date] = {}
-                    combined_data[date].update(stats)
-       
-            s3.write_data(f"lido_csm/operator_data/{id}", combined_data)
+                    logger.error(f"An error occurred flushing partitions: {e}")
+
+    def fetch_entity(self, id):
+        #yest, today = self.get_last_days(days=4)
+        yest, today = "2025-01-12", "2025-01-16"
+        combined_data, status = self.fetch_window(id, yest, today)
+        # errors and rate limits are not cached, the entity is retried next run
+        if self.registry is not None and status is not None:
+            self.registry.record(id, status)
+        return combined_data
+
+    def fetch_window(self, id, from_date, to_date):
+        """
+        Combined history of id between from_date and to_date (inclusive) and
+        what Rated said about it: ACTIVE, EMPTY, MISSING or None on errors.
+        """
+        if id == "Lido": entity_type = "pool"
+        else: entity_type = "poolShare"
+
+        urls = {
+            "attest": f"{RATED_API}/v1/eth/entities/{id}/attestations",
+            "effective": f"{RATED_API}/v1/eth/entities/{id}/effectiveness",
+            "rewards": f"{RATED_API}/v1/eth/entities/{id}/rewards",
+            "penalties": f"{RATED_API}/v1/eth/entities/{id}/penalties",
+        }
+
+        params = {
+            "fromDate": from_date,
+            "entityType": entity_type,
+            "toDate": to_date,
+            "utc": "false",  # "false" for ETH chain days
+        }
+        
+        results = []
+        status = None
+        # a page that could not be fetched leaves the window incomplete
+        incomplete = False
+        for key, base_url in urls.items():
+            # Make the GET request
+            try:
+                response = self.request(key, base_url, params)
+
+                # Handle the response
+                if response.status_code == 200:
+                    data = response.json()
+                    # long windows come back in pages, each naming the next
+                    while data.get("next"):
+                        page = self.request(key, urljoin(RATED_API, data["next"]))
+                        if page.status_code != 200:
+                            incomplete = True
+                            logger.error(f"Rated {key} page {data['next']} failed with status code {page.status_code}")
+                            break
+                        page = page.json()
+                        data["results"] = (data.get("results") or []) + (page.get("results") or [])
+                        data["next"] = page.get("next")
+                    logger.info("Rated %s response for %s: %d results", key, id, len(data.get("results") or []))
+                    results.append(data)
+                    if key == "attest" and not data.get("results"):
+                        # no validators in the window, the other endpoints have nothing either
+                        status = EMPTY
+                        break
+                    status = ACTIVE
+                elif response.status_code == 404 and key == "attest":
+                    # only the first probe decides that Rated does not know the entity
+                    status = MISSING
+                    break
+                else:
+                    logger.error(f"Request failed with status code {response.status_code}: {response.text}")
+                    print(f"Request failed with status code {response.status_code}: {response.text}")
+
+            except Exception as e:
+                profiler.count_io(f"rated.{key}", error=True)
+                traceback.print_exc()
+                logger.error(f"An error occurred in Rated.network API check: {e}")
+                time.sleep(1)
+
+        if incomplete:
+            # an error, so the window is not cached or checkpointed and is fetched again
+            status = None
+        return self.combine_jsons(results), status
+
+    def request(self, key, url, params=None):
+        # GET with the 429 back off, shared with every thread using the rate limiter
+        headers = {
+            "Authorization": f"Bearer {self.sk}",
+            "Content-Type": "application/json",
+        }
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            with profiler.stage("fetch.rated_request"):
+                response = requests.get(url, headers=headers, params=params)
+            if response.status_code != 429 or attempt == self.max_retries:
+                break
+            # rate limited, every thread sharing the limiter backs off
+            retry_after = float(response.headers.get("Retry-After", 1))
+            profiler.count_io(f"rated.{key}", error=True)
+            if self.rate_limiter is not None:
+                self.rate_limiter.pause(retry_after)
+            else:
+                time.sleep(retry_after)
+        profiler.count_io(f"rated.{key}", bytes_in=len(response.content), error=response.status_code != 200)
+        return response
+
+    def merge_existing(self, id, combined_data, s3):
+        existing_data = s3.get_data(f"lido_csm/operator_data/{id}")
+        return self.merge_histories(combined_data, existing_data)
+
+    def merge_write(self, s3, id, data, max_retries=5):
+        """
+        Read-merge-write of lido_csm/operator_data/{id} with If-Match on the
+        ETag that was read, retried when another writer got there first.
+        Returns (written, conflicts), an unreadable history is not written.
+        """
+        key = f"lido_csm/operator_data/{id}"
+        for conflicts in range(max_retries):
+            existing_data, etag = s3.get_data_versioned(key)
+            if etag == READ_FAILED:
+                logger.error(f"could not read {key}, not writing over it")
+                return False, conflicts
+            combined_data = self.merge_histories({date: dict(stats) for date, stats in data.items()}, existing_data)
+            if s3.write_data_conditional(key, combined_data, etag):
+                return True, conflicts
+        logger.error(f"gave up writing {key} after {max_retries} conflicts")
+        return False, max_retries
+
+    def merge_histories(self, combined_data, existing_data):
+        if existing_data:
+            for date, stats in list(existing_data.items()):
+                if date not in combined_data:
+                    combined_data[date] = {}
+                combined_data[date].update(stats)
+        return combined_data
 
     def get_last_days(self, days=1):
         now = datetime.now(timezone.utc)
@@ -92,17 +196,15 @@ class RatedHandler:
                 end_timestamp = result.get('endTimestamp')[:-9]
                 if not end_timestamp:
                     continue
-                
-                # Remove unwanted keys
-                filtered_result = {
-                    key: value
-                    for key, value in result.items()
-                    if key not in {"hour", "startDay", "endDay", "startDate", "endDate", "date", "day"}
-                }
-                
-                # Combine the filtered result under the endTimestamp key
+
+                # Combine the result under the endTimestamp key, merged in place rather than through a filtered copy
                 if end_timestamp not in combined_data:
                     combined_data[end_timestamp] = {}
-                combined_data[end_timestamp].update(filtered_result)
+                combined_data[end_timestamp].update(result)
+
+        # Remove unwanted keys, once per day instead of once per result
+        for stats in combined_data.values():
+            for key in DROPPED_KEYS.intersection(stats):
+                del stats[key]
 
         return combined_data
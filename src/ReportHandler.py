@@ -1,13 +1,8 @@
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Image, Spacer
-from reportlab.lib.units import inch
-import matplotlib.pyplot as plt
 import io
 from utils import create_output_file, format_op_ids, ATTEST_METRICS, DESCRIPTIONS
 import os
 from visualizations import create_metric_page
+from profiler import profiler
 
 class ReportHandler:
     def __init__(self, operator_ids, data_handler, module="CSM"):
@@ -16,16 +11,18 @@ class ReportHandler:
         self.dh = data_handler
         self.module = module
 
-    def generate_report(self):
+    def generate_report(self, operator_ids=None):
+        operator_ids = operator_ids or self.operator_ids
+        ranks = self.dh.rank_index()
 
         for date, operators in self.dh.node_data.items():
                 for id, metrics in operators.items():
-                    if any([f" {op_id} -" in id for op_id in self.operator_ids]):
+                    if any([f" {op_id} -" in id for op_id in operator_ids]):
                         for key, value in metrics.items():
                             if date == '2025-01-12_2025-01-16' and key in DESCRIPTIONS.keys():
                                 
                                 pdf_path = create_output_file(
-                                                id=format_op_ids(self.operator_ids), 
+                                                id=format_op_ids(operator_ids), 
                                                 variable=key, 
                                                 date=date, 
                                                 type_report="report", 
@@ -39,7 +36,7 @@ class ReportHandler:
                                 
                                 for dist_type in ["csm", "all", "sdvt", "cur"]:
                                     paths.append(create_output_file(
-                                                    id=format_op_ids(self.operator_ids), 
+                                                    id=format_op_ids(operator_ids), 
                                                     variable=key, 
                                                     date=date, 
                                                     type_report="histogram", 
@@ -49,7 +46,7 @@ class ReportHandler:
                                                 ))
                                 
                                 paths.append(create_output_file(
-                                                id=format_op_ids(self.operator_ids), 
+                                                id=format_op_ids(operator_ids), 
                                                 variable=key, 
                                                 date=date, 
                                                 type_report="voilin_box", 
@@ -59,7 +56,7 @@ class ReportHandler:
                                             ))
                                 
                                 paths.append(create_output_file(
-                                                id=format_op_ids(self.operator_ids), 
+                                                id=format_op_ids(operator_ids), 
                                                 variable=key, 
                                                 date=date, 
                                                 type_report="zscore_dist", 
@@ -69,7 +66,7 @@ class ReportHandler:
                                             ))
                                 
                                 paths.append(create_output_file(
-                                                id=format_op_ids(self.operator_ids), 
+                                                id=format_op_ids(operator_ids), 
                                                 variable=key, 
                                                 date=date, 
                                                 type_report="time_series", 
@@ -97,14 +94,20 @@ class ReportHandler:
                                 metric_data['totalUniqueAttestations'] = self.dh.node_data[date][id]['totalUniqueAttestations']['metric']
                                 if "sum" in self.dh.node_data[date][id][key]:
                                     metric_data['sum'] = self.dh.node_data[date][id][key]['sum']
+                                # ranks of every CSM operator are computed once per date and metric
+                                ranked = ranks.ranks(date, "csm", key, stat_type).get(id)
+                                if ranked:
+                                    metric_data['rank'] = f"{ranked[0]} / {len(ranks.sorted_values(date, 'csm', key, stat_type))}"
+                                    metric_data['percentile'] = ranked[1]
                                 metric_data = {k: f"{v:.{3}f}".rstrip('0').rstrip('.') if isinstance(v, float) else v for k, v in metric_data.items()}
 
-                                create_metric_page(
-                                    pdf_path=pdf_path, 
-                                    node_operator=id, 
-                                    metric_name=key, 
-                                    description=description, 
-                                    figure_buffers=buffers, 
-                                    metric_data=metric_data,
-                                    date=date
-                                )
+                                with profiler.stage("report.pdf"):
+                                    create_metric_page(
+                                        pdf_path=pdf_path, 
+                                        node_operator=id, 
+                                        metric_name=key, 
+                                        description=description, 
+                                        figure_buffers=buffers, 
+                                        metric_data=metric_data,
+                                        date=date
+                                    )
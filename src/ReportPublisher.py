@@ -0,0 +1,105 @@
+import hashlib
+import mimetypes
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import logger
+from profiler import profiler
+from utils import REPORTS_PREFIX
+
+CONTENT_TYPES = {".png": "image/png", ".pdf": "application/pdf", ".json": "application/json", ".csv": "text/csv"}
+# a version is named after the content it holds, so its objects are never
+# rewritten with other bytes, only the pointer to it moves
+IMMUTABLE = "public, max-age=31536000, immutable"
+POINTER_CACHE = "public, max-age=60"
+
+def content_type(path):
+    ext = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(ext) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def file_digest(path, chunk=1 << 20):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def tree_digest(files):
+    digest = hashlib.md5()
+    for name, _, md5, _ in files:
+        digest.update(f"{name}\0{md5}\n".encode())
+    return digest.hexdigest()[:12]
+
+class ReportPublisher:
+    """
+    Syncs the local reports tree to {REPORTS_PREFIX}{version}/ on a pool of
+    uploaders, where version is the window key plus a digest of the tree
+    ({window}-{digest}). Any change to a report publishes a new version, so
+    the objects under a version can be cached as immutable.
+    {REPORTS_PREFIX}{version}/manifest.json maps each published path to its
+    md5 and size, files already published are skipped, so an unchanged rerun
+    (or the retry of a failed one) only uploads what is missing.
+    {REPORTS_PREFIX}latest names the newest version.
+
+    Large files go up as multipart uploads (see S3ReadWrite.upload_path).
+    A failed upload stays out of the manifest and is retried next time.
+    """
+    def __init__(self, s3, root="reports", workers=16):
+        self.s3 = s3
+        self.root = root
+        self.workers = workers
+
+    def local_files(self):
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                files.append((os.path.relpath(path, self.root).replace(os.sep, "/"), path))
+        return sorted(files)
+
+    def publish(self, window):
+        started = time.perf_counter()
+
+        def digest(item):
+            name, path = item
+            return name, path, file_digest(path), os.path.getsize(path)
+
+        def upload(item):
+            name, path, md5, size = item
+            stored = self.s3.upload_path(f"{prefix}{name}", path, content_type=content_type(name), cache_control=IMMUTABLE, metadata={"md5": md5})
+            return name, md5, size, stored
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="publish") as pool:
+            with profiler.stage("publish.hash"):
+                files = list(pool.map(digest, self.local_files()))
+            version = f"{window}-{tree_digest(files)}"
+            prefix = f"{REPORTS_PREFIX}{version}/"
+            manifest_key = f"{prefix}manifest.json"
+            published = self.s3.get_data(manifest_key)
+            published = published.get("files", {}) if isinstance(published, dict) else {}
+            changed = [item for item in files if published.get(item[0], {}).get("md5") != item[2]]
+            with profiler.stage("publish.upload"):
+                results = list(pool.map(upload, changed))
+
+        manifest = {name: published[name] for name, _, _, _ in files if name in published}
+        failed = []
+        for name, md5, size, stored in results:
+            if stored:
+                manifest[name] = {"md5": md5, "size": size}
+            else:
+                failed.append(name)
+        self.s3.write_data(manifest_key, {"version": version, "window": window, "updated": int(time.time()), "files": manifest})
+        if not failed:
+            self.s3.write_object(f"{REPORTS_PREFIX}latest", version.encode(), content_type="text/plain", cache_control=POINTER_CACHE)
+
+        summary = {
+            "version": version,
+            "files": len(files),
+            "uploaded": len(results) - len(failed),
+            "skipped": len(files) - len(changed),
+            "failed": failed,
+            "bytes": sum(size for _, _, size, stored in results if stored),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        logger.info(f"Published reports to {prefix}: {summary['uploaded']} uploaded, {summary['skipped']} unchanged, {len(failed)} failed in {summary['seconds']}s")
+        return summary
@@ -1,6 +1,17 @@
 import boto3
 import json
-from logger_config import logger
+import os
+import threading
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from logger_config import logger, flush_logs
+from profiler import profiler
+from utils import READ_FAILED
+
+# files above the threshold are uploaded in parts, a few parts at a time
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+UPLOAD_CONFIG = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_THRESHOLD, max_concurrency=4)
 
 class S3ReadWrite:
     def __init__(self, aws_secret_access_key, aws_access_key_id):
@@ -8,9 +19,19 @@ class S3ReadWrite:
             's3',
             aws_access_key_id=aws_access_key_id,
             aws_secret_access_key=aws_secret_access_key, 
-            region_name="us-east-1"
+            region_name="us-east-1",
+            # write-behind and report publishing run many requests at once
+            config=Config(max_pool_connections=32)
         )
         self.bucket_name = 'justcausepools'
+        self._credentials = (aws_access_key_id, aws_secret_access_key)
+        # If-Match / If-None-Match for conditional puts, the pinned boto3 has no parameters for them
+        self._conditions = threading.local()
+        self.s3.meta.events.register('before-sign.s3.PutObject', self._add_conditions)
+
+    def _add_conditions(self, request, **kwargs):
+        for header, value in (getattr(self._conditions, "headers", None) or {}).items():
+            request.headers[header] = value
     
     def get_data(self, file_key, tag=""):
         try: 
@@ -18,7 +39,9 @@ class S3ReadWrite:
             response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key+tag)
 
             # Read the content of the file
-            file_content = response['Body'].read().decode('utf-8')
+            body = response['Body'].read()
+            profiler.count_io("s3.get", bytes_in=len(body))
+            file_content = body.decode('utf-8')
 
             # Parse the JSON content
             data = json.loads(file_content)
@@ -27,10 +50,12 @@ class S3ReadWrite:
             return data
         
         except self.s3.exceptions.NoSuchKey:  # Handle specific exception for missing file
+            profiler.count_io("s3.get")
             logger.info(f"File '{file_key+tag}' does not exist in the bucket.")
             return None
     
         except Exception as e: 
+            profiler.count_io("s3.get", error=True)
             logger.error(f"An error occurred: {e}")
             return None
         
@@ -44,34 +69,141 @@ class S3ReadWrite:
                 Key=file_key+tag,
                 CacheControl='max-age=600'
             )
+            profiler.count_io("s3.put", bytes_out=len(json_data))
             logger.info(f"Successfully uploaded {file_key+tag} to {self.bucket_name}.")
+            return True
         except Exception as e:
+            profiler.count_io("s3.put", error=True)
             logger.error(f"An error occurred: {e}")
+            return False
     
+    def get_data_versioned(self, file_key):
+        """
+        (data, etag) for optimistic updates with write_data_conditional,
+        (None, None) when the key does not exist and (None, READ_FAILED)
+        when the read errored, callers must not write on top of that.
+        """
+        try:
+            response = self.s3.get_object(Bucket=self.bucket_name, Key=file_key)
+            body = response['Body'].read()
+            profiler.count_io("s3.get", bytes_in=len(body))
+            return json.loads(body.decode('utf-8')), response['ETag']
+        except self.s3.exceptions.NoSuchKey:
+            profiler.count_io("s3.get")
+            return None, None
+        except Exception as e:
+            profiler.count_io("s3.get", error=True)
+            logger.error(f"An error occurred reading {file_key}: {e}")
+            return None, READ_FAILED
+
+    def write_data_conditional(self, file_key, data, etag=None):
+        """
+        Put data only if the object still has etag, or, with etag None, only
+        if it does not exist yet. Returns the new etag, None when the
+        condition failed or the put errored.
+        """
+        try:
+            json_data = json.dumps(data)
+            self._conditions.headers = {"If-Match": etag} if etag else {"If-None-Match": "*"}
+            response = self.s3.put_object(
+                Body=json_data,
+                Bucket=self.bucket_name,
+                Key=file_key,
+                CacheControl='max-age=600'
+            )
+            profiler.count_io("s3.put", bytes_out=len(json_data))
+            return response['ETag']
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                profiler.count_io("s3.put_conflict")
+                logger.info(f"Conditional write of {file_key} lost the race.")
+            else:
+                profiler.count_io("s3.put", error=True)
+                logger.error(f"An error occurred: {e}")
+            return None
+        finally:
+            self._conditions.headers = None
+
     def get_dir_files(self, path):
         try:
-            response = self.s3.list_objects_v2(Bucket=self.bucket_name, Prefix=path)
+            # list_objects_v2 returns at most 1000 keys per page
+            paginator = self.s3.get_paginator('list_objects_v2')
 
             keys = []
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    file_key = obj['Key']
-                    keys.append(file_key)
+            for response in paginator.paginate(Bucket=self.bucket_name, Prefix=path):
+                profiler.count_io("s3.list")
+                if 'Contents' in response:
+                    for obj in response['Contents']:
+                        file_key = obj['Key']
+                        keys.append(file_key)
             return keys
         except Exception as e:
+            profiler.count_io("s3.list", error=True)
             logger.error(f"An error occurred: {e}")
 
-    def write_logs(self):
+    def delete_data(self, file_keys):
         try:
-            self.s3.upload_file(
-                Filename='./app.log',
-                Bucket=self.bucket_name,
-                Key='lido_csm/app.log',
-            )
-            logger.info(f"Successfully uploaded app.log to {self.bucket_name}.")
+            # delete_objects accepts at most 1000 keys per request
+            for n in range(0, len(file_keys), 1000):
+                batch = file_keys[n:n + 1000]
+                self.s3.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+                profiler.count_io("s3.delete")
+            logger.info(f"Deleted {len(file_keys)} objects from {self.bucket_name}.")
         except Exception as e:
+            profiler.count_io("s3.delete", error=True)
             logger.error(f"An error occurred: {e}")
 
+    def arrow_filesystem(self):
+        # same bucket credentials for pyarrow readers (HistoryArchive)
+        from pyarrow import fs
+        access_key, secret_key = self._credentials
+        return fs.S3FileSystem(access_key=access_key, secret_key=secret_key, region="us-east-1")
 
+    def write_object(self, file_key, body, content_type="application/octet-stream", content_encoding=None, cache_control=None):
+        # raw bytes, True once stored
+        try:
+            extra = {"ContentEncoding": content_encoding} if content_encoding else {}
+            if cache_control:
+                extra["CacheControl"] = cache_control
+            self.s3.put_object(
+                Body=body,
+                Bucket=self.bucket_name,
+                Key=file_key,
+                ContentType=content_type,
+                **extra
+            )
+            profiler.count_io("s3.put", bytes_out=len(body))
+            return True
+        except Exception as e:
+            profiler.count_io("s3.put", error=True)
+            logger.error(f"An error occurred: {e}")
+            return False
 
+    def upload_path(self, file_key, path, content_type="application/octet-stream", cache_control=None, metadata=None):
+        # local file, multipart above MULTIPART_THRESHOLD; True once stored
+        try:
+            extra = {"ContentType": content_type}
+            if cache_control:
+                extra["CacheControl"] = cache_control
+            if metadata:
+                extra["Metadata"] = metadata
+            self.s3.upload_file(Filename=path, Bucket=self.bucket_name, Key=file_key, ExtraArgs=extra, Config=UPLOAD_CONFIG)
+            profiler.count_io("s3.upload", bytes_out=os.path.getsize(path))
+            return True
+        except Exception as e:
+            profiler.count_io("s3.upload", error=True)
+            logger.error(f"An error occurred uploading {path}: {e}")
+            return False
 
+    def write_logs(self):
+        # only what was logged since the last upload, see LogShipper
+        from LogShipper import LogShipper
+        try:
+            flush_logs()
+            LogShipper(self).ship()
+        except Exception as e:
+            profiler.count_io("s3.upload_logs", error=True)
+            logger.error(f"An error occurred: {e}")
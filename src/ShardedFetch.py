@@ -0,0 +1,140 @@
+import os
+import socket
+import time
+import traceback
+import zlib
+from logger_config import logger
+from profiler import profiler
+from utils import FETCH_LEASE_PREFIX, READ_FAILED
+
+def shard_of(id, shards):
+    # crc32 is stable across processes and hosts, unlike hash()
+    return zlib.crc32(id.encode()) % shards
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class ShardLease:
+    """
+    Lease object at lido_csm/fetch_leases/shard-{n}:
+
+        {"owner": worker_id, "expires": ts, "completed": ts}
+
+    Every change is a conditional put, If-None-Match for the first claim and
+    If-Match on the last seen ETag after that, so two workers can never both
+    believe they hold the shard.
+    """
+    def __init__(self, s3, shard, owner, ttl):
+        self.s3 = s3
+        self.key = f"{FETCH_LEASE_PREFIX}shard-{shard}"
+        self.owner = owner
+        self.ttl = ttl
+        self.etag = None
+        self.completed = None
+
+    def acquire(self, refresh_interval, now=None):
+        now = time.time() if now is None else now
+        lease, etag = self.s3.get_data_versioned(self.key)
+        if etag == READ_FAILED:
+            # the shard may well be held, only a successful read can claim it
+            return False
+        if lease:
+            if lease["expires"] > now and lease["owner"] != self.owner:
+                return False
+            # another worker refreshed this shard recently
+            if lease.get("completed") and now - lease["completed"] < refresh_interval:
+                return False
+            self.completed = lease.get("completed")
+        self.etag = self.s3.write_data_conditional(self.key, self._record(now + self.ttl), etag)
+        return self.etag is not None
+
+    def renew(self, now=None):
+        now = time.time() if now is None else now
+        self.etag = self.s3.write_data_conditional(self.key, self._record(now + self.ttl), self.etag)
+        return self.etag is not None
+
+    def release(self, completed=None):
+        if completed is not None:
+            self.completed = completed
+        self.etag = self.s3.write_data_conditional(self.key, self._record(0), self.etag)
+        return self.etag is not None
+
+    def _record(self, expires):
+        return {"owner": self.owner, "expires": expires, "completed": self.completed}
+
+class ShardedFetcher:
+    """
+    One of N fetch workers, on this host or others, refreshing Rated data.
+    Entities are split into shards by crc32 of their id. A worker claims
+    free shards through ShardLease and writes each entity with an optimistic
+    read-merge-write (If-Match on the ETag it read), retrying on conflict.
+    With a PartitionStore writes are append-only and need no condition.
+    """
+    def __init__(self, s3, rated_handler, shards, worker_id=None, lease_ttl=600, refresh_interval=3600, partition_store=None, max_retries=5):
+        self.s3 = s3
+        self.rated_handler = rated_handler
+        self.shards = shards
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_ttl = lease_ttl
+        self.refresh_interval = refresh_interval
+        self.partition_store = partition_store
+        self.max_retries = max_retries
+        self.counts = {"shards": 0, "fetched": 0, "persisted": 0, "conflicts": 0, "errors": 0}
+
+    def shard_ids(self, shard):
+        return [id for id in self.rated_handler.rated_ids if shard_of(id, self.shards) == shard]
+
+    def run(self):
+        # start at a worker specific shard so workers do not all race for shard 0
+        start = shard_of(self.worker_id, self.shards)
+        for n in range(self.shards):
+            shard = (start + n) % self.shards
+            lease = ShardLease(self.s3, shard, self.worker_id, self.lease_ttl)
+            # held, recently refreshed or unreadable, any of them leaves the shard to others
+            if not lease.acquire(self.refresh_interval):
+                continue
+            with profiler.stage("fetch.shard"):
+                finished = self.fetch_shard(shard, lease)
+            lease.release(completed=time.time() if finished else None)
+            self.counts["shards"] += 1
+        logger.info(f"sharded fetch worker {self.worker_id} finished {self.counts}")
+        return self.counts
+
+    def fetch_shard(self, shard, lease):
+        renew_at = time.time() + self.lease_ttl / 2
+        for id in self.shard_ids(shard):
+            if time.time() >= renew_at:
+                if not lease.renew():
+                    logger.error(f"lost lease on shard {shard}, leaving the rest to its new owner")
+                    return False
+                renew_at = time.time() + self.lease_ttl / 2
+            try:
+                data = self.rated_handler.fetch_entity(id)
+                self.counts["fetched"] += 1
+                if data and self.write_entity(id, data):
+                    self.counts["persisted"] += 1
+            except Exception as e:
+                traceback.print_exc()
+                logger.error(f"An error occurred fetching {id}: {e}")
+                self.counts["errors"] += 1
+
+        if self.partition_store is not None:
+            try:
+                self.partition_store.flush()
+            except Exception as e:
+                # the shard is not marked completed, the next worker refetches it
+                logger.error(f"An error occurred flushing shard {shard}: {e}")
+                self.counts["errors"] += 1
+                return False
+        return True
+
+    def write_entity(self, id, data):
+        if self.partition_store is not None:
+            self.partition_store.append(id, data)
+            return True
+
+        written, conflicts = self.rated_handler.merge_write(self.s3, id, data, self.max_retries)
+        self.counts["conflicts"] += conflicts
+        if not written:
+            self.counts["errors"] += 1
+        return written
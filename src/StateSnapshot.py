@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+from logger_config import logger
+from profiler import profiler
+
+FORMAT_VERSION = 2
+
+# every table is nested four levels deep:
+#   data:  date -> entity -> metric -> variant -> value
+#   stats: date -> metric -> variant -> stat   -> value
+STATE_TABLES = ["agg_data", "node_data", "curated_module_data", "sdvt_data", "node_stats", "sdvt_stats", "curated_stats"]
+DEPTH = 4
+
+# value kinds, numbers live in the float64 values array, for ints and strings
+# it holds the position in the int64 ints array or the strings list
+NUMBER, INT, NONE, STRING, EMPTY = range(5)
+ARRAYS = ["codes", "values", "kinds", "ints"]
+
+def _flatten(table):
+    """
+    Rows of (date, k1, k2, k3) codes, value and kind, grouped by date.
+    Empty dicts are kept as EMPTY rows with -1 codes below them.
+    """
+    keys = [{} for _ in range(DEPTH)]
+    strings = {}
+    columns = [[] for _ in range(DEPTH)]
+    values, kinds, ints = [], [], []
+    offsets = {}
+
+    def emit(path, value):
+        for level in range(DEPTH):
+            columns[level].append(path[level] if level < len(path) else -1)
+        if value is None:
+            values.append(0.0)
+            kinds.append(NONE)
+        elif isinstance(value, dict):
+            values.append(0.0)
+            kinds.append(EMPTY)
+        elif isinstance(value, str):
+            values.append(strings.setdefault(value, len(strings)))
+            kinds.append(STRING)
+        elif isinstance(value, (int, np.integer)):
+            values.append(len(ints))
+            ints.append(int(value))
+            kinds.append(INT)
+        else:
+            values.append(float(value))
+            kinds.append(NUMBER)
+
+    def walk(node, path):
+        if isinstance(node, dict) and node and len(path) < DEPTH:
+            level = keys[len(path)]
+            for key, child in node.items():
+                walk(child, path + (level.setdefault(key, len(level)),))
+        else:
+            emit(path, node)
+
+    level0, level1, level2, level3 = keys
+    for date, entries in table.items():
+        start = len(kinds)
+        d = level0.setdefault(date, len(level0))
+        # the common fully nested case without recursion, anything else goes through walk
+        if isinstance(entries, dict) and entries:
+            for k1, metrics in entries.items():
+                c1 = level1.setdefault(k1, len(level1))
+                if not (isinstance(metrics, dict) and metrics):
+                    emit((d, c1), metrics)
+                    continue
+                for k2, variants in metrics.items():
+                    c2 = level2.setdefault(k2, len(level2))
+                    if not (isinstance(variants, dict) and variants):
+                        emit((d, c1, c2), variants)
+                        continue
+                    for k3, value in variants.items():
+                        c3 = level3.setdefault(k3, len(level3))
+                        if isinstance(value, float):
+                            columns[0].append(d)
+                            columns[1].append(c1)
+                            columns[2].append(c2)
+                            columns[3].append(c3)
+                            values.append(value)
+                            kinds.append(NUMBER)
+                        else:
+                            emit((d, c1, c2, c3), value)
+        else:
+            walk(entries, (d,))
+        offsets[date] = [start, len(kinds)]
+
+    return {
+        "codes": np.array(columns, dtype=np.int32).reshape(DEPTH, -1),
+        "values": np.array(values, dtype=np.float64),
+        "kinds": np.array(kinds, dtype=np.uint8),
+        "ints": np.array(ints, dtype=np.int64),
+        "keys": [list(level) for level in keys],
+        "strings": list(strings),
+        "offsets": offsets,
+    }
+
+def _unflatten(codes, values, kinds, ints, keys, strings):
+    # ints are the int values of the INT rows, in row order
+    table = {}
+    key0, key1, key2, key3 = keys
+    ints = iter(ints)
+    rows = zip(*(column.tolist() for column in codes), values.tolist(), kinds.tolist())
+    for c0, c1, c2, c3, value, kind in rows:
+        if kind == NUMBER and c3 >= 0:
+            table.setdefault(key0[c0], {}).setdefault(key1[c1], {}).setdefault(key2[c2], {})[key3[c3]] = value
+            continue
+        path = [c for c in (c0, c1, c2, c3) if c >= 0]
+        node = table
+        for level, c in enumerate(path[:-1]):
+            node = node.setdefault(keys[level][c], {})
+        last = keys[len(path) - 1][path[-1]]
+        if kind == EMPTY:
+            node.setdefault(last, {})
+        elif kind == NONE:
+            node[last] = None
+        elif kind == STRING:
+            node[last] = strings[int(value)]
+        elif kind == INT:
+            node[last] = next(ints)
+        else:
+            node[last] = value
+    return table
+
+class _Pending(tuple):
+    # (start, end) row range of a date that is not decoded yet
+    pass
+
+class LazyTable(dict):
+    """
+    A state table whose dates are decoded from the mapped snapshot arrays
+    on first access, a run that only reads the window never builds the
+    nested dicts of the other days. Reads through [], get, items and
+    values decode, writes replace the pending rows.
+    """
+    def __init__(self, items, decode):
+        super().__init__(items)
+        self._decode = decode
+
+    def _load(self, date, value):
+        if type(value) is _Pending:
+            value = self._decode(*value).get(date, {})
+            dict.__setitem__(self, date, value)
+        return value
+
+    def __getitem__(self, date):
+        return self._load(date, dict.__getitem__(self, date))
+
+    # iterating keys stays lazy, overriding it makes dict(table) and {**table} go through __getitem__
+    def __iter__(self):
+        return dict.__iter__(self)
+
+    def get(self, date, default=None):
+        return self[date] if date in self else default
+
+    def setdefault(self, date, default=None):
+        if date not in self:
+            dict.__setitem__(self, date, default)
+        return self[date]
+
+    def pop(self, date, *default):
+        value = dict.pop(self, date, *default)
+        return self._decode(*value).get(date, {}) if type(value) is _Pending else value
+
+    def items(self):
+        return [(date, self[date]) for date in list(self)]
+
+    def values(self):
+        return [self[date] for date in list(self)]
+
+    def copy(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return repr(self.copy())
+
+class StateSnapshot:
+    """
+    Computed DataHandler state (normalized data, MVA windows, stats and
+    z-scores) stored as flat .npy arrays plus an index.json:
+
+        {root}/CURRENT                  name of the latest complete snapshot
+        {root}/{snapshot}/index.json    keys, strings and per-date row ranges
+        {root}/{snapshot}/{table}.{codes,values,kinds,ints}.npy
+
+    codes is stored level-major (4 x rows) so each level is one contiguous
+    array.
+
+    Arrays are opened memory-mapped and each table is a LazyTable, a date's
+    rows are only decoded when it is first read, so a warm start that
+    reports on the window touches those rows alone and concurrent readers
+    share the page cache.
+    Snapshots are written to a temp dir and published by renaming, readers
+    never see a partial one.
+    """
+    def __init__(self, root, keep=2):
+        self.root = root
+        self.keep = keep
+
+    def current(self):
+        try:
+            with open(os.path.join(self.root, "CURRENT")) as f:
+                return os.path.join(self.root, f.read().strip())
+        except FileNotFoundError:
+            return None
+
+    def index(self):
+        path = self.current()
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, "index.json")) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return None
+        if index.get("format") != FORMAT_VERSION:
+            logger.info(f"state snapshot format {index.get('format')} is not {FORMAT_VERSION}, ignoring it")
+            return None
+        return index
+
+    def write(self, dh, meta=None):
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{uuid.uuid4().hex[:6]}"
+        tmp = os.path.join(self.root, f".tmp-{name}")
+        os.makedirs(tmp)
+        index = {"format": FORMAT_VERSION, "created": time.time(), "meta": meta or {}, "tables": {}}
+        with profiler.stage("state.write"):
+            for table in STATE_TABLES:
+                flat = _flatten(getattr(dh, table))
+                for array in ARRAYS:
+                    np.save(os.path.join(tmp, f"{table}.{array}.npy"), flat.pop(array))
+                index["tables"][table] = flat
+            with open(os.path.join(tmp, "index.json"), "w") as f:
+                json.dump(index, f)
+
+            os.replace(tmp, os.path.join(self.root, name))
+            with open(os.path.join(self.root, ".CURRENT"), "w") as f:
+                f.write(name)
+            os.replace(os.path.join(self.root, ".CURRENT"), os.path.join(self.root, "CURRENT"))
+        self._prune(name)
+        logger.info(f"wrote state snapshot {name}")
+        return name
+
+    def _prune(self, current):
+        names = [n for n in os.listdir(self.root) if not n.startswith(".") and n != "CURRENT"]
+        snapshots = sorted(names, key=lambda n: os.path.getmtime(os.path.join(self.root, n)))
+        # old snapshots may still be mapped by a reader, unlinking is safe on posix
+        for name in snapshots[:-self.keep] if self.keep else []:
+            if name != current:
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    def read(self, dh, dates=None, meta=None, max_age=None):
+        """
+        Fill dh from the current snapshot, only the given dates when set.
+        Dates are decoded lazily, see LazyTable.
+        meta must match what the snapshot was written with and it must be
+        younger than max_age seconds. Returns False when there is no usable
+        snapshot.
+        """
+        index = self.index()
+        if index is None:
+            return False
+        if max_age is not None and time.time() - index["created"] > max_age:
+            logger.info("state snapshot is older than max_age")
+            return False
+        if meta is not None and index["meta"] != meta:
+            logger.info(f"state snapshot is for {index['meta']}, not {meta}")
+            return False
+
+        path = self.current()
+        with profiler.stage("state.read"):
+            for table, flat in index["tables"].items():
+                arrays = [np.load(os.path.join(path, f"{table}.{array}.npy"), mmap_mode="r") for array in ARRAYS]
+
+                def decode(start, end, arrays=arrays, flat=flat):
+                    codes, values, kinds, ints = arrays
+                    values, kinds = values[start:end], kinds[start:end]
+                    # gathers only this date's ints from the mapped column
+                    ints = ints[values[kinds == INT].astype(np.int64)].tolist()
+                    return _unflatten(codes[:, start:end], values, kinds, ints, flat["keys"], flat["strings"])
+
+                state = LazyTable(getattr(dh, table), decode)
+                for date in dates if dates is not None else flat["offsets"]:
+                    if date in flat["offsets"]:
+                        dict.__setitem__(state, date, _Pending(flat["offsets"][date]))
+                setattr(dh, table, state)
+        return True
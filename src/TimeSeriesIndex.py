@@ -0,0 +1,68 @@
+from datetime import date as Date
+import numpy as np
+
+# entities drawn on every operator's line charts
+AGGREGATES = ["Lido", "Lido Community Staking Module"]
+
+def series_entities(names, operator_ids):
+    # same selection plot_line always made, done once per entity name
+    wanted = [f"Operator {node_id} -" for node_id in operator_ids]
+    return [name for name in names if name in AGGREGATES or any(w in name for w in wanted)]
+
+class TimeSeriesIndex:
+    """
+    Day-sorted series of node data for the given operators and the Lido /
+    CSM aggregates, built once so line charts are array lookups:
+
+        series(entity, metric, variant) -> (day ordinals, values)
+
+    MVA windows (compound dates) and None values are left out. agg_data
+    entries win over node data entries of the same name, as they did when
+    plot_line merged them into node data; neither input is modified.
+    """
+    def __init__(self, data, agg_data=None, operator_ids=()):
+        agg_data = agg_data or {}
+        days = sorted(date for date in data if "_" not in date)
+        names = {}
+        for day in days:
+            names.update(dict.fromkeys(data[day]))
+            names.update(dict.fromkeys(agg_data.get(day, ())))
+        self.entities = series_entities(names, operator_ids)
+
+        self.first = Date.fromisoformat(days[0]).toordinal() if days else 0
+        ordinals = [Date.fromisoformat(day).toordinal() for day in days]
+        # dense calendar from the first day, ordinal - first is the position of a day's label
+        self.labels = np.full(ordinals[-1] - self.first + 1 if days else 0, "", dtype=object)
+        self.labels[np.array(ordinals, dtype=np.int64) - self.first] = days
+
+        columns = {}
+        for day, ordinal in zip(days, ordinals):
+            node_entries = data[day]
+            agg_entries = agg_data.get(day, {})
+            for entity in self.entities:
+                metrics = agg_entries[entity] if entity in agg_entries else node_entries.get(entity)
+                if not metrics:
+                    continue
+                for metric, variants in metrics.items():
+                    for variant, value in variants.items():
+                        if value is not None and isinstance(value, (int, float, np.number)):
+                            column = columns.setdefault((entity, metric, variant), ([], []))
+                            column[0].append(ordinal)
+                            column[1].append(value)
+        self.columns = {
+            key: (np.array(ordinals, dtype=np.int32), np.array(values, dtype=float))
+            for key, (ordinals, values) in columns.items()
+        }
+
+    def series(self, entity, metric, variant="metric"):
+        column = self.columns.get((entity, metric, variant))
+        if column is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=float)
+        return column
+
+    def day_labels(self, ordinals):
+        return self.labels[ordinals - self.first].tolist()
+
+    def operators(self, operator_ids):
+        # the indexed entities plot_line draws for operator_ids, in index order
+        return series_entities(self.entities, operator_ids)
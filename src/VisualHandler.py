@@ -1,31 +1,53 @@
 from visualizations import plot_histogram, plot_line, plot_zscores, comparison_plot
 from utils import DESCRIPTIONS
+from profiler import profiler
+from TimeSeriesIndex import TimeSeriesIndex
+
+# (variable, variant) of the time series charts
+TIME_SERIES = [
+    ("avgValidatorEffectiveness", "metric"),
+    ("avgInclusionDelay", "metric"),
+    ("avgCorrectness", "metric"),
+    ("avgAttesterEffectiveness", "metric"),
+    ("sumMissedAttestations", "per_val"),
+    ("sumWrongHeadVotes", "per_val"),
+    ("sumWrongTargetVotes", "per_val"),
+    ("avgProposerEffectiveness", "metric"),
+]
 
 class VisualHandler:
     def __init__(self, operator_ids, data_handler):
             self.operator_ids = operator_ids
             self.dh = data_handler
+            self.series_index = None
 
-    def generate_histograms(self, node_data, date=None, sdvt_data={}, curated_module_data={}):
-        for id in self.operator_ids:
+    def generate_histograms(self, node_data, date=None, sdvt_data={}, curated_module_data={}, operator_ids=None):
+        for id in operator_ids or self.operator_ids:
             for variable, meta_data in DESCRIPTIONS.items():
                 variant = meta_data['variant']
                 avg = self.dh.node_stats[date][variable][variant]["mean"]
                 median = self.dh.node_stats[date][variable][variant]["median"]
 
-                comparison_plot(node_data=node_data, avg=avg, median=median, variable=variable, operator_ids=[id], variant=variant, date=date)  
-                plot_zscores(node_data=node_data, variable=variable, operator_ids=[id], variant=variant, date=date)        
+                with profiler.stage("render.violin_box"):
+                    comparison_plot(node_data=node_data, avg=avg, median=median, variable=variable, operator_ids=[id], variant=variant, date=date)  
+                with profiler.stage("render.zscore_dist"):
+                    plot_zscores(node_data=node_data, variable=variable, operator_ids=[id], variant=variant, date=date)        
                 for dist_type in ["all", "csm", "sdvt", "cur"]:
-                    plot_histogram(node_data=node_data, variable=variable, operator_ids=[id], variant=variant, date=date, sdvt_data=sdvt_data, curated_module_data=curated_module_data, dist_type=dist_type)
+                    with profiler.stage("render.histogram"):
+                        plot_histogram(node_data=node_data, variable=variable, operator_ids=[id], variant=variant, date=date, sdvt_data=sdvt_data, curated_module_data=curated_module_data, dist_type=dist_type)
 
-    def generate_time_series(self, data, agg_data=None):
-        for id in self.operator_ids:
-            plot_line(data=data, variable="avgValidatorEffectiveness", operator_ids=[id], variant="metric", agg_data=agg_data)
-            plot_line(data=data, variable="avgInclusionDelay", operator_ids=[id], variant="metric", agg_data=agg_data)
-            plot_line(data=data, variable="avgCorrectness", operator_ids=[id], variant="metric", agg_data=agg_data)
-            plot_line(data=data, variable="avgAttesterEffectiveness", operator_ids=[id], variant="metric", agg_data=agg_data)
-            plot_line(data=data, variable="sumMissedAttestations", operator_ids=[id], variant="per_val", agg_data=agg_data)
-            plot_line(data=data, variable="sumWrongHeadVotes", operator_ids=[id], variant="per_val", agg_data=agg_data)
-            plot_line(data=data, variable="sumWrongTargetVotes", operator_ids=[id], variant="per_val", agg_data=agg_data)
-            plot_line(data=data, variable="avgProposerEffectiveness", operator_ids=[id], variant="metric", agg_data=agg_data)
-             
\ No newline at end of file
+    def generate_time_series(self, data, agg_data=None, operator_ids=None, dates=None, date=None):
+        if dates and self.dh is not None:
+            # days a windowed load skipped are read now
+            if self.dh.require_dates(dates):
+                self.series_index = None
+        if self.series_index is None:
+            # one pass over data for every operator of the run, the charts below only slice it
+            with profiler.stage("render.time_series_index"):
+                self.series_index = TimeSeriesIndex(data, agg_data, self.operator_ids or operator_ids)
+        if date is None:
+            date = next(reversed(data), None)
+        for id in operator_ids or self.operator_ids:
+            with profiler.stage("render.time_series"):
+                for variable, variant in TIME_SERIES:
+                    plot_line(data=data, variable=variable, operator_ids=[id], variant=variant, index=self.series_index, date=date)
@@ -0,0 +1,83 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logger_config import logger
+
+class WriteBehindWriter:
+    """
+    write_data that returns once the payload is serialized. The PUTs run on
+    a pool of workers; a writer blocks only while max_pending objects are
+    waiting. A second write to a key that has not gone out yet replaces the
+    queued payload, and writes to one key never overlap, so the last write
+    wins like it does synchronously. get_data sees queued payloads.
+
+    flush() waits until everything written so far is stored and returns
+    {key: stored} for the writes since the previous flush; close() flushes
+    and stops the workers. Other calls go straight to the wrapped client.
+    """
+    def __init__(self, s3, workers=8, max_pending=256):
+        self.s3 = s3
+        self.max_pending = max_pending
+        self.failed = []
+        self._results = {}
+        self._pending = {}
+        self._inflight = {}
+        self._condition = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="write-behind")
+
+    def __getattr__(self, name):
+        return getattr(self.s3, name)
+
+    def write_data(self, file_key, data, tag=""):
+        key = file_key + tag
+        body = json.dumps(data)
+        with self._condition:
+            while key not in self._pending and len(self._pending) >= self.max_pending:
+                self._condition.wait()
+            queued = key in self._pending
+            self._pending[key] = body
+            if not queued and key not in self._inflight:
+                self._pool.submit(self._upload, key)
+
+    def get_data(self, file_key, tag=""):
+        with self._condition:
+            key = file_key + tag
+            body = self._pending.get(key, self._inflight.get(key))
+        if body is not None:
+            return json.loads(body)
+        return self.s3.get_data(file_key, tag)
+
+    def _upload(self, key):
+        with self._condition:
+            body = self._pending.pop(key)
+            self._inflight[key] = body
+            self._condition.notify_all()
+        stored = False
+        try:
+            stored = self.s3.write_object(key, body.encode(), content_type="application/json", cache_control="max-age=600")
+        except Exception as e:
+            logger.error(f"An error occurred writing {key}: {e}")
+        with self._condition:
+            del self._inflight[key]
+            self._results[key] = stored
+            if not stored:
+                self.failed.append(key)
+            if key in self._pending:
+                # written again while this upload was running
+                self._pool.submit(self._upload, key)
+            self._condition.notify_all()
+
+    def flush(self):
+        with self._condition:
+            while self._pending or self._inflight:
+                self._condition.wait()
+            results, self._results = self._results, {}
+        failed = [key for key, stored in results.items() if not stored]
+        if failed:
+            logger.error(f"{len(failed)} of {len(results)} writes failed, e.g. {failed[:5]}")
+        return results
+
+    def close(self):
+        results = self.flush()
+        self._pool.shutdown()
+        return results
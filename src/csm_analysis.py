@@ -3,18 +3,39 @@ import argparse
 from dotenv import load_dotenv
 import os
 from logger_config import logger
+from profiler import profiler
 
 load_dotenv()  # take environment variables from .env.
 
 class ProcessEvents:
-    def __init__(self, operator_ids, rated_api_call):
+    def __init__(self, operator_ids, rated_api_call, render=True, workers=4, from_snapshots=False, storage="entity", compact=False, archive="", export_archive=False, warm_start="", warm_start_ttl=3600, shards=0, worker_id="", backfill="", backfill_window=30, rate_limit=0, series_days=0, sketch_days=0, alert_rules="", digest=False, publish=False, import_histories=False):
         if operator_ids:
             self.operator_ids = [int(x) for x in operator_ids.split(",")]
         else: self.operator_ids = None
         self.rated_api_call = rated_api_call
+        self.render = render
+        self.workers = workers
+        self.from_snapshots = from_snapshots
+        self.storage = storage
+        self.compact = compact
+        self.import_histories = import_histories
+        self.archive = archive
+        self.export_archive = export_archive
+        self.warm_start = warm_start
+        self.warm_start_ttl = warm_start_ttl
+        self.shards = shards
+        self.worker_id = worker_id
+        self.backfill = backfill
+        self.backfill_window = backfill_window
+        self.rate_limit = rate_limit
+        self.series_days = series_days
+        self.sketch_days = sketch_days
+        self.alert_rules = alert_rules
+        self.digest = digest
+        self.publish = publish
 
     def run_job(self):
-        job_runner = JobRunner(self.operator_ids, self.rated_api_call)
+        job_runner = JobRunner(self.operator_ids, self.rated_api_call, self.render, self.workers, self.from_snapshots, self.storage, self.compact, self.archive, self.export_archive, self.warm_start, self.warm_start_ttl, self.shards, self.worker_id, self.backfill, self.backfill_window, self.rate_limit, self.series_days, self.sketch_days, self.alert_rules, self.digest, self.publish, self.import_histories)
         job_runner.run()
 
 if __name__ == "__main__":
@@ -24,6 +45,55 @@ if __name__ == "__main__":
                         help='how often run loop is called, default is 2 hr')
     parser.add_argument('--rated-api-call', action='store_true',
                         help='use this flag to enable rated API call logic')
+    parser.add_argument('--analysis-only', action='store_true',
+                        help='use this flag to compute stats without rendering charts or reports')
+    parser.add_argument('--profile-stages', action='store', type=str, default="",
+                        help='comma separated stages to run under a profiler (e.g. load.normalize,render), "all" for every stage')
+    parser.add_argument('--profiler', action='store', type=str, default="cprofile", choices=["cprofile", "pyinstrument"],
+                        help='profiler used by --profile-stages, output goes to ./profiles')
+    parser.add_argument('--workers', action='store', type=int, default=4,
+                        help='threads per fetch/load stage, 1 runs the stages sequentially')
+    parser.add_argument('--from-snapshots', action='store_true',
+                        help='use this flag to build reports from module snapshots instead of loading every operator')
+    parser.add_argument('--storage', action='store', type=str, default="entity", choices=["entity", "partitioned"],
+                        help='history layout, one object per entity or append-only day partitions')
+    parser.add_argument('--compact', action='store_true',
+                        help='use this flag to compact day partitions into monthly segments in the background')
+    parser.add_argument('--import-histories', action='store_true',
+                        help='use this flag once with --storage partitioned to copy the per-entity histories into day partitions')
+    parser.add_argument('--archive', action='store', type=str, default="",
+                        help='Parquet history archive, a local directory or s3://bucket/prefix (needs pyarrow)')
+    parser.add_argument('--export-archive', action='store_true',
+                        help='use this flag to rewrite the --archive from lido_csm/operator_data after ingest')
+    parser.add_argument('--warm-start', action='store', type=str, default="",
+                        help='directory for a memory-mapped snapshot of the computed analysis state, reused by the next run')
+    parser.add_argument('--warm-start-ttl', action='store', type=int, default=3600,
+                        help='seconds a --warm-start snapshot stays usable, default is 1 hr')
+    parser.add_argument('--shards', action='store', type=int, default=0,
+                        help='split the Rated fetch into this many shards claimed through S3 leases, run one process per worker')
+    parser.add_argument('--worker-id', action='store', type=str, default="",
+                        help='lease owner name for --shards, default is hostname-pid')
+    parser.add_argument('--backfill', action='store', type=str, default="",
+                        help='fetch history for a date range START:END (e.g. 2024-01-01:2024-12-31), rerun the same command to resume')
+    parser.add_argument('--backfill-window', action='store', type=int, default=30,
+                        help='days per Rated request in --backfill')
+    parser.add_argument('--rate-limit', action='store', type=float, default=0,
+                        help='max Rated requests per second across all fetch threads, 0 is unlimited')
+    parser.add_argument('--series-days', action='store', type=int, default=0,
+                        help='only load the MVA window and the last N days for the time series, older days are read on demand; 0 loads the whole history')
+    parser.add_argument('--sketch-days', action='store', type=int, default=0,
+                        help='write population medians/percentiles over the last N days, merged from the daily quantile sketches without loading history')
+    parser.add_argument('--alert-rules', action='store', default="",
+                        help='send Discord alerts for operators breaking threshold rules after analysis: "default" or a json rules file')
+    parser.add_argument('--digest', action='store_true',
+                        help='use this flag to post the daily module summary and leaderboard to the rated_stats channel')
+    parser.add_argument('--publish-reports', action='store_true',
+                        help='use this flag to upload the rendered reports tree to the bucket as a content versioned release of the window')
     args = parser.parse_args()
+    if args.backfill_window < 1:
+        parser.error("--backfill-window must be at least 1 day")
 
-    ProcessEvents(args.operator_ids, args.rated_api_call).run_job()
\ No newline at end of file
+    if args.profile_stages:
+        profiler.enable_stage_profiling(args.profile_stages, backend=args.profiler)
+
+    ProcessEvents(args.operator_ids, args.rated_api_call, render=not args.analysis_only, workers=args.workers, from_snapshots=args.from_snapshots, storage=args.storage, compact=args.compact, archive=args.archive, export_archive=args.export_archive, warm_start=args.warm_start, warm_start_ttl=args.warm_start_ttl, shards=args.shards, worker_id=args.worker_id, backfill=args.backfill, backfill_window=args.backfill_window, rate_limit=args.rate_limit, series_days=args.series_days, sketch_days=args.sketch_days, alert_rules=args.alert_rules, digest=args.digest, publish=args.publish_reports, import_histories=args.import_histories).run_job()
\ No newline at end of file
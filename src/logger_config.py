@@ -1,13 +1,99 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# INFO records per call site written in full each run, after that 1 in SAMPLE_EVERY
+SAMPLE_FIRST = 50
+SAMPLE_EVERY = 100
+# longer messages (API payloads, ...) are cut
+MAX_MESSAGE_CHARS = 2000
+
+class JsonFormatter(logging.Formatter):
+    # one json object per line: time, level, call site and the capped message
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > MAX_MESSAGE_CHARS:
+            message = f"{message[:MAX_MESSAGE_CHARS]}... ({len(message) - MAX_MESSAGE_CHARS} more chars)"
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "site": f"{record.module}:{record.lineno}",
+            "thread": record.threadName,
+            "message": message,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class SiteSampler(logging.Filter):
+    """
+    Bounds the records a single log call can write per run: the first
+    SAMPLE_FIRST INFO/DEBUG records of a call site pass, then one in
+    SAMPLE_EVERY. Warnings and errors always pass. Skipped counts are kept
+    for the run summary, reset() starts a new run.
+    """
+    def __init__(self, first=SAMPLE_FIRST, every=SAMPLE_EVERY):
+        super().__init__()
+        self.first = first
+        self.every = every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seen = {}
+            self.skipped = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            n = self.seen.get(site, 0)
+            self.seen[site] = n + 1
+            if n < self.first or (n - self.first) % self.every == self.every - 1:
+                return True
+            self.skipped[site] = self.skipped.get(site, 0) + 1
+        return False
+
+    def summary(self):
+        with self._lock:
+            return {f"{path.rsplit('/', 1)[-1]}:{line}": n for (path, line), n in sorted(self.skipped.items(), key=lambda item: -item[1])}
+
+class DeferredQueueHandler(QueueHandler):
+    # hands the record over as is, formatting happens on the listener thread
+    def prepare(self, record):
+        return record
 
 # Define the logger name
 logger = logging.getLogger('my_app')
 logger.setLevel(logging.INFO)
 
-# Set up the RotatingFileHandler
+# Set up the RotatingFileHandler, written by a background listener so logging
+# never blocks fetch or render threads on file I/O
 log_file = 'app.log'
 rotating_handler = RotatingFileHandler(log_file, maxBytes=1e6, backupCount=5)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-rotating_handler.setFormatter(formatter)
-logger.addHandler(rotating_handler)
\ No newline at end of file
+rotating_handler.setFormatter(JsonFormatter())
+log_queue = queue.SimpleQueue()
+log_sampler = SiteSampler()
+queue_handler = DeferredQueueHandler(log_queue)
+queue_handler.addFilter(log_sampler)
+logger.addHandler(queue_handler)
+listener = QueueListener(log_queue, rotating_handler, respect_handler_level=True)
+listener.start()
+
+def flush_logs():
+    # write out everything queued so far, e.g. before shipping app.log
+    global listener
+    skipped = log_sampler.summary()
+    if skipped:
+        logger.info(f"Sampled out log records by call site: {skipped}")
+    log_sampler.reset()
+    listener.stop()
+    listener = QueueListener(log_queue, rotating_handler, respect_handler_level=True)
+    listener.start()
+
+atexit.register(lambda: listener.stop())
@@ -0,0 +1,140 @@
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from logger_config import logger, log_file
+
+# Machine-readable run profile, written next to app.log
+profile_file = os.path.join(os.path.dirname(log_file), "run_profile.json")
+
+class RunProfile:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.stages = {}
+        self.io = {}
+        self.profile_stages = set()
+        self.profile_dir = None
+        self.profile_backend = "cprofile"
+        self._active_profiler = None
+        self._profilers = {}
+
+    def enable_stage_profiling(self, stages, output_dir="profiles", backend="cprofile"):
+        """
+        Run the given stages (or "all") under cProfile, or pyinstrument when
+        backend="pyinstrument" and it is installed. Output is written per stage
+        to output_dir when the run profile is written. Nested stages are covered
+        by the outermost profiled one.
+        """
+        if isinstance(stages, str):
+            stages = [s.strip() for s in stages.split(",") if s.strip()]
+        self.profile_stages = set(stages)
+        self.profile_dir = output_dir
+        self.profile_backend = backend
+        if backend == "pyinstrument":
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                logger.warning("pyinstrument not installed, falling back to cProfile")
+                self.profile_backend = "cprofile"
+
+    def _should_profile(self, name):
+        if not self.profile_stages or self._active_profiler is not None:
+            return False
+        return "all" in self.profile_stages or name in self.profile_stages
+
+    @contextmanager
+    def stage(self, name):
+        profiler = None
+        if self._should_profile(name):
+            profiler = self._start_profiler(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                self._stop_profiler(profiler)
+            with self._lock:
+                entry = self.stages.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+                entry["calls"] += 1
+                entry["total_s"] += elapsed
+                entry["max_s"] = max(entry["max_s"], elapsed)
+
+    def count_io(self, path, bytes_in=0, bytes_out=0, requests=1, error=False):
+        with self._lock:
+            entry = self.io.setdefault(path, {"requests": 0, "bytes_in": 0, "bytes_out": 0, "errors": 0})
+            entry["requests"] += requests
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+            if error:
+                entry["errors"] += 1
+
+    def summary(self):
+        return {
+            "started": self.started,
+            "wall_s": time.time() - self.started,
+            "stages": self.stages,
+            "io": self.io,
+        }
+
+    def write(self, path=None):
+        path = path or profile_file
+        try:
+            with open(path, "w") as f:
+                json.dump(self.summary(), f, indent=2)
+            logger.info(f"Run profile written to {path}")
+            self.dump_stage_profiles()
+        except Exception as e:
+            logger.error(f"An error occurred writing run profile: {e}")
+        return path
+
+    def _start_profiler(self, name):
+        # one profiler per stage name, resumed on every call so repeated
+        # stages (e.g. normalize per entity) accumulate into one profile
+        profiler = self._profilers.get(name)
+        if profiler is None:
+            if self.profile_backend == "pyinstrument":
+                from pyinstrument import Profiler
+                profiler = Profiler()
+            else:
+                profiler = cProfile.Profile()
+            self._profilers[name] = profiler
+        if self.profile_backend == "pyinstrument":
+            profiler.start()
+        else:
+            profiler.enable()
+        self._active_profiler = profiler
+        return profiler
+
+    def _stop_profiler(self, profiler):
+        self._active_profiler = None
+        if self.profile_backend == "pyinstrument":
+            profiler.stop()
+        else:
+            profiler.disable()
+
+    def dump_stage_profiles(self):
+        if not self._profilers:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for name, profiler in self._profilers.items():
+            file_name = name.replace(".", "_").replace("/", "_")
+            if self.profile_backend == "pyinstrument":
+                path = os.path.join(self.profile_dir, f"{file_name}.html")
+                with open(path, "w") as f:
+                    f.write(profiler.output_html())
+            else:
+                path = os.path.join(self.profile_dir, f"{file_name}.prof")
+                profiler.dump_stats(path)
+            paths.append(path)
+            logger.info(f"Stage profile for {name} saved to {path}")
+        return paths
+
+profiler = RunProfile()
@@ -46,6 +46,16 @@ def create_output_file(id, variable, date="", type_report="histogram", module="C
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
     return output_file
 
+def entity_module(id):
+    # same classification DataHandler.ingest uses for the operator_data keys
+    if "CSM Operator" in id:
+        return "csm"
+    elif "- Lido SimpleDVT Module" in id:
+        return "sdvt"
+    elif "- Lido" in id:
+        return "curated"
+    return "aggregate"
+
 def format_op_ids(operator_ids):
     if len(operator_ids) == 1:
         return str(operator_ids[0])
@@ -112,6 +122,11 @@ def find_date_groups(dates_dict):
     
     return result
 
+def last_days(end, days):
+    # the days dates ending at end, oldest first
+    last = datetime.strptime(end, "%Y-%m-%d")
+    return [(last - timedelta(days=n)).strftime("%Y-%m-%d") for n in range(days - 1, -1, -1)]
+
 def get_average_ratings_for_dates(data, variable, operator_ids, variant="per_val", date=None):
     highlighted_ratings = []
     other_ratings = []
@@ -177,6 +192,24 @@ def format_label(metric):
 def generate_spaces(s):
     return re.sub(r'(?<!^)(?=[A-Z])', ' ', s).replace("avg", "").replace("sum", "")
 
+OPERATOR_DATA_PREFIX = "lido_csm/operator_data/"
+MODULE_SNAPSHOT_PREFIX = "lido_csm/module_snapshots/"
+
+PARTITION_PREFIX = "lido_csm/partitions/"
+ENTITY_REGISTRY_KEY = "lido_csm/entity_registry"
+FETCH_LEASE_PREFIX = "lido_csm/fetch_leases/"
+BACKFILL_PREFIX = "lido_csm/backfill/"
+SKETCH_PREFIX = "lido_csm/sketches/"
+WINDOW_STATS_PREFIX = "lido_csm/window_stats/"
+ALERT_STATE_KEY = "lido_csm/alert_state"
+DIGEST_PREFIX = "lido_csm/digests/"
+LOG_PREFIX = "lido_csm/logs/"
+REPORTS_PREFIX = "lido_csm/reports/"
+# etag get_data_versioned returns when the read errored, a missing key is (None, None)
+READ_FAILED = "read-failed"
+
+MODULES = ["csm", "sdvt", "curated"]
+
 ATTEST_METRICS = ["sumMissedAttestations", 
                  "sumCorrectHead",
                  "sumCorrectTarget",
@@ -198,6 +231,16 @@ OTHER_METRICS = ["validatorCount",
                 "avgProposerEffectiveness",
                 "avgValidatorEffectiveness"]
 
+# metrics where a smaller value is the better result, see RankIndex
+LOWER_IS_BETTER = {"sumMissedAttestations",
+                   "sumWrongHeadVotes",
+                   "sumWrongTargetVotes",
+                   "sumLateTargetVotes",
+                   "sumLateSourceVotes",
+                   "sumInclusionDelay",
+                   "sumMissedSyncSignatures",
+                   "avgInclusionDelay"}
+
 DESCRIPTIONS = {
     "sumWrongHeadVotes": {"variant": "per_val", "desc" : "A wrong head vote in Ethereum consensus refers to a validator incorrectly voting for a block that is not the canonical head of the chain according to the LMD-GHOST fork-choice rule. Validators are expected to vote for the block with the highest accumulated attestations as the chain’s head. Wrong head votes can result from network delays, client issues, or outdated views of the chain. Frequent wrong head votes reduce validator rewards and can degrade network performance by delaying finality."},
     "avgValidatorEffectiveness": {"variant": "metric","desc" : "A measure of the average performance of a validator across key consensus duties, such as proposing blocks and attesting correctly. A higher rating indicates that the validator consistently participates in securing the network and follows the protocol rules effectively. This metric helps assess the reliability and efficiency of a validator, with poor effectiveness typically resulting in lower rewards and a negative impact on the network’s overall health."},
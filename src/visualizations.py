@@ -3,13 +3,13 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import BaseDocTemplate, PageBreak, Frame, PageTemplate, Paragraph, Table, TableStyle, Image, Spacer, HRFlowable
 from reportlab.lib.units import inch
-from datetime import datetime
 import io
 import matplotlib.pyplot as plt
 import seaborn as sns
 import re
 import os
 from logger_config import logger
+from TimeSeriesIndex import TimeSeriesIndex
 from utils import create_output_file, format_op_ids, ATTEST_METRICS, format_label, generate_spaces, get_average_ratings_for_dates, format_title
 import numpy as np
 import pandas
@@ -29,7 +29,9 @@ def create_metric_page(pdf_path, node_operator, metric_name, description, figure
         rightMargin=MARGIN,
         leftMargin=MARGIN,
         topMargin=0.5 * inch,
-        bottomMargin=0.5 * inch
+        bottomMargin=0.5 * inch,
+        # no creation date or random document id, the same report gives the same bytes and is skipped on publish
+        invariant=1
     )
 
     # Define frames for the top and bottom halves of the page
@@ -104,6 +106,8 @@ def create_metric_page(pdf_path, node_operator, metric_name, description, figure
     table_data = [
         ['Metric', 'Value', 'Z-Score', 'Description'],
         ['# Validators', metric_data['validatorCount'], '-', ''],
+        ['CSM Rank', metric_data.get('rank', '-'), '-', ''],
+        ['CSM Percentile', f"{metric_data['percentile']}%" if metric_data.get('percentile') is not None else '-', '-', ''],
         ['CSM Operators Avg', metric_data['mean'], '-',''],
         ['CSM Operators Median', metric_data['median'], '-', ''],
         ['CSM Standard Deviation', metric_data['std_dev'], '-', ''],
@@ -316,42 +320,26 @@ def plot_histogram(node_data, variable, operator_ids, variant="per_val", date=No
         plt.close()
         logger.info(f"Plot saved to {output_file}")
 
-def plot_line(data, variable, operator_ids, variant="per_val", agg_data=None):
-    if agg_data:
-        for date in data:
-            # exclude compound dates e.g. 2024-12-25_2024-12-27
-            if date in agg_data and "_" not in date: 
-                data[date].update(agg_data[date])
+def plot_line(data, variable, operator_ids, variant="per_val", agg_data=None, index=None, date=None):
+    # index is a TimeSeriesIndex built once per run, data is only read when there isn't one
+    if index is None:
+        index = TimeSeriesIndex(data, agg_data, operator_ids)
+    if date is None:
+        # named after the last date in data, as the report expects
+        date = next(reversed(data), None)
 
-    operator_names = {}
-    
-    for date, operators in data.items():
-        for operator, metrics in operators.items():
-            if(
-                any(f"Operator {node_id} -" in operator for node_id in operator_ids) or 
-                operator in ["Lido", "Lido Community Staking Module"]
-            ):
-                if variable in metrics and metrics[variable][variant] is not None and "_" not in date:
-                    if operator not in operator_names:
-                        operator_names[operator] = {"dates": [], "values": []}
-                    operator_names[operator]["dates"].append(date)
-                    operator_names[operator]["values"].append(metrics[variable][variant])
-    
     plt.figure(figsize=(10, 6))
     
     # Plot each operator's data
-    for operator, values in operator_names.items():
-        # Convert dates to datetime objects for sorting
-        sorted_dates_values = sorted(
-            zip(values["dates"], values["values"]),
-            key=lambda x: datetime.strptime(x[0], "%Y-%m-%d")  # Adjust date format as needed
-        )
-        sorted_dates, sorted_values = zip(*sorted_dates_values)
+    for operator in index.operators(operator_ids):
+        ordinals, values = index.series(operator, variable, variant)
+        if not len(ordinals):
+            continue
 
         name = operator.replace("- Lido Community Staking Module", "")
         if name == "Lido Community Staking Module": name = "CSM Operators"
         elif name == "Lido": name = "Lido (All)"
-        plt.plot(sorted_dates, sorted_values, label=name)
+        plt.plot(index.day_labels(ordinals), values, label=name)
     
     title = format_title(metric=variable, date=None, graph_type="Time Series")
     label = generate_spaces(variable)
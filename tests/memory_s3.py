@@ -0,0 +1,66 @@
+import hashlib
+import json
+import threading
+
+def etag(body):
+    return f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+class MemoryS3:
+    """
+    Dict backed stand-in for S3ReadWrite. Objects go through json like the
+    real client so tests never share mutable state with the store.
+    """
+    def __init__(self, objects=None):
+        self.objects = {}
+        self.gets = []
+        self.lock = threading.Lock()
+        for key, value in (objects or {}).items():
+            self.objects[key] = json.dumps(value)
+
+    def get_dir_files(self, path):
+        with self.lock:
+            return sorted(key for key in self.objects if key.startswith(path))
+
+    def get_data(self, key, tag=""):
+        with self.lock:
+            self.gets.append(key + tag)
+            body = self.objects.get(key + tag)
+        return None if body is None else json.loads(body)
+
+    def write_data(self, key, data, tag=""):
+        body = json.dumps(data)
+        with self.lock:
+            self.objects[key + tag] = body
+        return True
+
+    def write_object(self, key, body, content_type="application/octet-stream", content_encoding=None, cache_control=None):
+        with self.lock:
+            self.objects[key] = body
+        return True
+
+    def upload_path(self, key, path, content_type="application/octet-stream", cache_control=None, metadata=None):
+        with open(path, "rb") as f:
+            body = f.read()
+        with self.lock:
+            self.objects[key] = body
+        return True
+
+    def get_data_versioned(self, key):
+        with self.lock:
+            self.gets.append(key)
+            body = self.objects.get(key)
+        return (None, None) if body is None else (json.loads(body), etag(body))
+
+    def write_data_conditional(self, key, data, expected=None):
+        body = json.dumps(data)
+        with self.lock:
+            current = self.objects.get(key)
+            if (current is None) if expected is None else (current is not None and etag(current) == expected):
+                self.objects[key] = body
+                return etag(body)
+        return None
+
+    def delete_data(self, keys):
+        with self.lock:
+            for key in keys:
+                self.objects.pop(key, None)
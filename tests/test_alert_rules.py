@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import Mock, patch
+from tests.memory_s3 import MemoryS3
+from AlertRules import AlertEngine, load_rules
+from DataHandler import DataHandler
+from GaitKeeper import GaitKeeper
+from utils import READ_FAILED
+
+CSM = "CSM Operator {} - Lido Community Staking Module"
+DATES = {"latest": "2025-01-16", "window": "2025-01-12_2025-01-16"}
+RULES = [{"name": "low_effectiveness", "metric": "avgValidatorEffectiveness", "op": "<", "threshold": 90}]
+
+def handler_with(effectiveness):
+    handler = DataHandler()
+    handler.node_data = {"2025-01-16": {CSM.format(n): {"avgValidatorEffectiveness": {"metric": value}} for n, value in enumerate(effectiveness)}}
+    return handler
+
+class TestAlertEngine(unittest.TestCase):
+    def test_rules_fire_per_operator(self):
+        engine = AlertEngine(RULES + [{"name": "very_low", "metric": "avgValidatorEffectiveness", "op": "<=", "threshold": 50}])
+        fired = engine.evaluate(handler_with([95, 80, None, 50, "n/a", float("nan")]), DATES)
+
+        self.assertEqual(fired["low_effectiveness"], [("csm", CSM.format(1), 80.0), ("csm", CSM.format(3), 50.0)])
+        self.assertEqual(fired["very_low"], [("csm", CSM.format(3), 50.0)])
+        self.assertEqual(engine.evaluate(handler_with([]), DATES), {})
+
+    def test_bad_rules(self):
+        self.assertEqual(len(load_rules("default")), 2)
+        with self.assertRaises(ValueError):
+            AlertEngine([{"name": "x", "metric": "avgCorrectness", "op": "!=", "threshold": 1}])
+        with self.assertRaises(ValueError):
+            AlertEngine([{"name": "x", "metric": "avgCorrectness", "op": "<"}])
+
+class TestGaitKeeper(unittest.TestCase):
+    @patch("GaitKeeper.DiscordBot.send_msg")
+    def test_alerts_once_until_cleared(self, send_msg):
+        s3 = MemoryS3()
+        engine = AlertEngine(RULES)
+
+        self.assertEqual(GaitKeeper(s3).check_alerts(engine, handler_with([80, 95]), DATES), {"low_effectiveness": [("csm", CSM.format(0), 80.0)]})
+        self.assertEqual(send_msg.call_count, 1)
+        self.assertEqual(send_msg.call_args[0][1], "low_eff")
+
+        # still firing on the next run, a new process reads the state back
+        self.assertEqual(GaitKeeper(s3).check_alerts(engine, handler_with([85, 95]), DATES), {})
+        self.assertEqual(send_msg.call_count, 1)
+
+        GaitKeeper(s3).check_alerts(engine, handler_with([95, 95]), DATES)
+        GaitKeeper(s3).check_alerts(engine, handler_with([80, 95]), DATES)
+        self.assertEqual(send_msg.call_count, 2)
+
+    @patch("GaitKeeper.DiscordBot.send_msg")
+    def test_rules_not_evaluated_keep_firing(self, send_msg):
+        s3 = MemoryS3()
+        GaitKeeper(s3).check_alerts(AlertEngine(RULES + [{"name": "very_low", "metric": "avgValidatorEffectiveness", "op": "<", "threshold": 85}]), handler_with([80, 95]), DATES)
+
+        # a run with only low_effectiveness neither clears nor re-sends very_low
+        GaitKeeper(s3).check_alerts(AlertEngine(RULES), handler_with([95, 95]), DATES)
+        self.assertEqual(list(s3.get_data("lido_csm/alert_state")), [f"very_low|csm|{CSM.format(0)}"])
+        GaitKeeper(s3).check_alerts(AlertEngine(RULES + [{"name": "very_low", "metric": "avgValidatorEffectiveness", "op": "<", "threshold": 85}]), handler_with([80, 95]), DATES)
+        self.assertEqual([call.args[0].split("\n")[0] for call in send_msg.call_args_list], ["low_effectiveness", "very_low", "low_effectiveness"])
+
+    @patch("GaitKeeper.DiscordBot.send_msg")
+    def test_unreadable_state_sends_nothing(self, send_msg):
+        s3 = MemoryS3({"lido_csm/alert_state": {f"low_effectiveness|csm|{CSM.format(0)}": {"since": "2025-01-15T00:00:00", "value": 80.0}}})
+        s3.get_data_versioned = Mock(return_value=(None, READ_FAILED))
+
+        self.assertEqual(GaitKeeper(s3).check_alerts(AlertEngine(RULES), handler_with([80, 95]), DATES), {})
+        send_msg.assert_not_called()
+        self.assertIn(f"low_effectiveness|csm|{CSM.format(0)}", s3.get_data("lido_csm/alert_state"))
+
+if __name__ == '__main__':
+    unittest.main()
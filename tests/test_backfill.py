@@ -0,0 +1,138 @@
+import time
+import unittest
+from unittest.mock import Mock, patch
+from tests.memory_s3 import MemoryS3
+from Backfill import Backfill, date_windows
+from EntityRegistry import ACTIVE, EMPTY, MISSING
+from PartitionStore import PartitionStore
+from RatedHandler import RatedHandler
+from rate_limit import RateLimiter
+
+KEY = "lido_csm/backfill/2024-01-01_2024-01-10_4"
+
+def fake_rated(ids, fail=None, missing=()):
+    rated = RatedHandler("sk")
+    rated.rated_ids = ids
+
+    def fetch_window(id, from_date, to_date):
+        if fail and fail(id, from_date):
+            return {}, None
+        if id in missing:
+            return {}, MISSING
+        return {from_date: {"validatorCount": 1}}, ACTIVE
+    rated.fetch_window = Mock(side_effect=fetch_window)
+    return rated
+
+class TestBackfill(unittest.TestCase):
+    def test_date_windows(self):
+        self.assertEqual(date_windows("2024-01-01", "2024-01-10", 4), [
+            ("2024-01-01", "2024-01-04"), ("2024-01-05", "2024-01-08"), ("2024-01-09", "2024-01-10"),
+        ])
+        self.assertEqual(date_windows("2024-01-01", "2024-01-01", 30), [("2024-01-01", "2024-01-01")])
+        with self.assertRaises(ValueError):
+            date_windows("2024-01-01", "2024-01-10", 0)
+
+    def test_fills_every_window(self):
+        s3 = MemoryS3()
+        Backfill(s3, fake_rated(["Lido", "Galaxy - Lido"]), "2024-01-01", "2024-01-10", 4, workers=2).run()
+
+        self.assertEqual(set(s3.get_data("lido_csm/operator_data/Galaxy - Lido")), {"2024-01-01", "2024-01-05", "2024-01-09"})
+        self.assertEqual(s3.get_data(KEY)["done"], {"Lido": 3, "Galaxy - Lido": 3})
+
+    def test_resumes_after_failure(self):
+        s3 = MemoryS3()
+        first = fake_rated(["Lido"], fail=lambda id, from_date: from_date == "2024-01-05")
+        self.assertEqual(Backfill(s3, first, "2024-01-01", "2024-01-10", 4).run()["errors"], 1)
+        self.assertEqual(s3.get_data(KEY)["done"], {"Lido": 1})
+
+        second = fake_rated(["Lido"])
+        Backfill(s3, second, "2024-01-01", "2024-01-10", 4).run()
+
+        self.assertEqual([call.args[1] for call in second.fetch_window.call_args_list], ["2024-01-05", "2024-01-09"])
+        self.assertEqual(s3.get_data(KEY)["done"], {"Lido": 3})
+        self.assertEqual(Backfill(s3, fake_rated(["Lido"]), "2024-01-01", "2024-01-10", 4).remaining(), [])
+
+    def test_missing_entity_is_skipped(self):
+        s3 = MemoryS3()
+        rated = fake_rated(["Lido", "Gone - Lido"], missing={"Gone - Lido"})
+        Backfill(s3, rated, "2024-01-01", "2024-01-10", 4).run()
+
+        self.assertEqual(sum(call.args[0] == "Gone - Lido" for call in rated.fetch_window.call_args_list), 1)
+        self.assertEqual(s3.get_data(KEY)["finished"], ["Gone - Lido"])
+
+    def test_partitioned_windows_count_after_flush(self):
+        s3 = MemoryS3()
+        store = PartitionStore(s3)
+        Backfill(s3, fake_rated(["Lido"]), "2024-01-01", "2024-01-10", 4, partition_store=store).run()
+
+        self.assertEqual(s3.get_data(KEY)["done"], {"Lido": 3})
+        self.assertEqual(set(store.read(["2024-01-01", "2024-01-09"])["Lido"]), {"2024-01-01", "2024-01-09"})
+
+    def test_unflushed_windows_are_not_counted(self):
+        s3 = MemoryS3()
+        write = s3.write_data
+        s3.write_data = lambda key, data, tag="": False if key.startswith("lido_csm/partitions/") else write(key, data, tag)
+        counts = Backfill(s3, fake_rated(["Lido"]), "2024-01-01", "2024-01-10", 4, partition_store=PartitionStore(s3), checkpoint_interval=0).run()
+
+        self.assertEqual(counts["errors"], 1)
+        self.assertEqual(s3.get_data(KEY)["done"], {})
+        self.assertEqual(s3.get_dir_files("lido_csm/partitions/"), [])
+
+def page(results, next=None, status=200):
+    r = Mock(status_code=status, content=b"{}", text="", headers={})
+    r.json.return_value = {"results": [{"endTimestamp": f"{day}T00:00:00", "validatorCount": 1} for day in results], "next": next}
+    return r
+
+class TestRatedPages(unittest.TestCase):
+    @patch("RatedHandler.requests.get")
+    def test_follows_next_until_it_runs_out(self, get):
+        get.side_effect = [page(["2024-01-01"], "/v1/eth/entities/Lido/attestations?from=1"), page(["2024-01-02"])] + [page([])] * 3
+        data, status = RatedHandler("sk").fetch_window("Lido", "2024-01-01", "2024-01-30")
+
+        self.assertEqual(get.call_args_list[1].args[0], "https://api.rated.network/v1/eth/entities/Lido/attestations?from=1")
+        self.assertEqual(set(data), {"2024-01-01", "2024-01-02"})
+        self.assertEqual(status, ACTIVE)
+
+    @patch("RatedHandler.requests.get")
+    def test_failed_page_fails_the_window(self, get):
+        get.side_effect = [page(["2024-01-01"], "/v1/eth/entities/Lido/attestations?from=1"), page([], status=500)] + [page([])] * 3
+        s3 = MemoryS3()
+        rated = RatedHandler("sk")
+        rated.rated_ids = ["Lido"]
+        counts = Backfill(s3, rated, "2024-01-01", "2024-01-30", 30).run()
+
+        self.assertEqual(counts["errors"], 1)
+        self.assertEqual(s3.get_data("lido_csm/backfill/2024-01-01_2024-01-30_30")["done"], {})
+
+class TestRateLimit(unittest.TestCase):
+    def test_limits_rate(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.045)
+
+    def test_pause_blocks(self):
+        limiter = RateLimiter(rate=1000)
+        limiter.pause(0.05)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+
+    @patch("RatedHandler.requests.get")
+    def test_retry_after_on_429(self, get):
+        limited = Mock(status_code=429, content=b"", text="", headers={"Retry-After": "0.01"})
+        ok = Mock(status_code=200, content=b"{}", headers={})
+        ok.json.return_value = {"results": []}
+        get.side_effect = [limited, ok]
+
+        limiter = RateLimiter(rate=1000)
+        limiter.pause = Mock(wraps=limiter.pause)
+        data, status = RatedHandler("sk", rate_limiter=limiter).fetch_window("Lido", "2024-01-01", "2024-01-10")
+
+        self.assertEqual(get.call_count, 2)
+        limiter.pause.assert_called_once_with(0.01)
+        self.assertEqual(status, EMPTY)
+
+if __name__ == '__main__':
+    unittest.main()
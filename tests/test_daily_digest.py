@@ -0,0 +1,60 @@
+import random
+import unittest
+import numpy as np
+from tests.memory_s3 import MemoryS3
+from DailyDigest import build_digest, format_digest, leaders, write_digest
+from DataHandler import DataHandler
+
+CSM = "CSM Operator {} - Lido Community Staking Module"
+
+class TestDailyDigest(unittest.TestCase):
+    def test_leaders_match_full_sort(self):
+        rng = random.Random(2)
+        values = np.array([rng.choice([90.0, 95.0, 99.5]) + rng.random() for _ in range(500)])
+        self.assertEqual(values[leaders(values, 7)].tolist(), sorted(values, reverse=True)[:7])
+        self.assertEqual(values[leaders(values, 7, lower_is_better=True)].tolist(), sorted(values)[:7])
+        self.assertEqual(len(leaders(values[:3], 7)), 3)
+        self.assertEqual(len(leaders(np.empty(0), 7)), 0)
+
+    def test_digest_from_module_stats(self):
+        handler = DataHandler()
+        today = [99.0, 80.0, 95.0, None, 70.0]
+        yesterday = [99.0, 95.0, 95.0, 90.0]
+        handler.node_data = {
+            date: {CSM.format(n): {"avgValidatorEffectiveness": {"metric": value}} for n, value in enumerate(values)}
+            for date, values in [("2025-01-15", yesterday), ("2025-01-16", today)]
+        }
+        handler.get_statistics(module="csm")
+
+        digest = build_digest(handler, "2025-01-16", "2025-01-15", top=2)
+        csm = digest["modules"]["csm"]
+
+        self.assertEqual(list(digest["modules"]), ["csm"])
+        self.assertEqual(csm["operators"], 4)
+        self.assertEqual(csm["median"], 87.5)
+        self.assertEqual(csm["past_threshold"], 2)
+        self.assertEqual(csm["top"], [(CSM.format(0), 99.0), (CSM.format(2), 95.0)])
+        self.assertEqual(csm["bottom"], [(CSM.format(4), 70.0), (CSM.format(1), 80.0)])
+        # operator 4 has no previous day, unchanged operators are not movers
+        self.assertEqual(csm["movers"], [(CSM.format(1), -15.0)])
+        self.assertIn("CSM Operator 1 -15.00", format_digest(digest))
+        self.assertIn("CSM: 4 operators, mean 86.00, median 87.50, 2 below 90", format_digest(digest))
+
+        s3 = MemoryS3()
+        write_digest(s3, digest)
+        self.assertEqual(s3.get_data("lido_csm/digests/2025-01-16")["modules"]["csm"]["operators"], 4)
+
+    def test_lower_is_better_counts_operators_above_threshold(self):
+        handler = DataHandler()
+        handler.node_data = {"2025-01-16": {CSM.format(n): {"sumMissedAttestations": {"metric": value}} for n, value in enumerate([0, 3, 12, 40])}}
+        handler.get_statistics(module="csm")
+
+        digest = build_digest(handler, "2025-01-16", metric="sumMissedAttestations", threshold=10, top=1)
+        csm = digest["modules"]["csm"]
+
+        self.assertEqual(csm["past_threshold"], 2)
+        self.assertEqual(csm["top"], [(CSM.format(0), 0.0)])
+        self.assertIn("2 above 10", format_digest(digest))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 from unittest.mock import Mock, patch
 import json
+import math
 from DataHandler import DataHandler
 
 class TestDataHandler(unittest.TestCase):
@@ -168,5 +169,110 @@ class TestDataHandler(unittest.TestCase):
         
         self.assertNotIn("metric1_zscore", self.handler.node_data["2024-12-24"]["operator1"])
 
+    def test_module_snapshot_round_trip(self):
+        stored = {}
+        self.mock_s3.write_data.side_effect = lambda key, data, tag="": stored.__setitem__(key, json.loads(json.dumps(data)))
+        self.mock_s3.get_data.side_effect = lambda key, tag="": stored.get(key)
+
+        csm = "CSM Operator {} - Lido Community Staking Module"
+        for n, (missed, vals) in enumerate([(10, 5), (30, 10), (0, 4)]):
+            stored[f"lido_csm/operator_data/{csm.format(n)}"] = {
+                "2025-01-13": {"validatorCount": vals, "totalUniqueAttestations": 1000, "sumMissedAttestations": missed, "avgInclusionDelay": 1.0 + n / 100}
+            }
+        stored["lido_csm/operator_data/Lido"] = {"2025-01-13": {"validatorCount": 100, "avgInclusionDelay": 1.01}}
+
+        self.handler.load_data(Mock(get_dir_files=lambda path: list(stored), get_data=self.mock_s3.get_data))
+        self.handler.get_statistics()
+        self.handler.get_zscores()
+        self.assertEqual(self.handler.write_module_snapshots(self.mock_s3, dates=["2025-01-13"], modules=["csm"]), 1)
+
+        snapshot = stored["lido_csm/module_snapshots/csm/2025-01-13"]
+        self.assertEqual(snapshot["operators"], sorted(csm.format(n) for n in range(3)))
+        self.assertEqual(snapshot["values"]["sumMissedAttestations"]["per_val"], [2.0, 3.0, 0.0])
+
+        loaded = DataHandler()
+        missing = loaded.load_from_snapshots(self.mock_s3, [1], ["2025-01-13"], modules=["csm"])
+        self.assertEqual(missing, [])
+        self.assertEqual(loaded.node_data["2025-01-13"], self.handler.node_data["2025-01-13"])
+        self.assertEqual(
+            loaded.node_stats["2025-01-13"]["avgInclusionDelay"]["metric"]["median"],
+            self.handler.node_stats["2025-01-13"]["avgInclusionDelay"]["metric"]["median"]
+        )
+        self.assertIn("Lido", loaded.agg_data["2025-01-13"])
+
+    def test_load_from_snapshots_reports_missing(self):
+        self.mock_s3.get_data.return_value = None
+        missing = self.handler.load_from_snapshots(self.mock_s3, [1], ["2025-01-13"], modules=["sdvt"])
+        self.assertEqual(missing, ["lido_csm/module_snapshots/sdvt/2025-01-13"])
+
+    def test_normalize_histories_matches_normalize_data(self):
+        histories = [
+            {
+                "2025-01-13": {"validatorCount": 4, "totalUniqueAttestations": 800, "startSlot": 1, "sumMissedAttestations": 10, "sumInclusionDelay": 0, "avgInclusionDelay": 1.02},
+                "2025-01-14": {"validatorCount": 4, "totalUniqueAttestations": 0, "sumMissedAttestations": 3, "sumInclusionDelay": None},
+                "2024-12-27": {"validatorCount": 5, "totalUniqueAttestations": 500, "sumMissedAttestations": 5},
+                "2024-12-25": {"validatorCount": 5, "sumMissedAttestations": 1},
+            },
+            {"2025-01-13": {"validatorCount": 2, "totalUniqueAttestations": 300, "sumMissedAttestations": None, "sumWrongHeadVotes": 6}},
+        ]
+        batched = self.handler.normalize_histories(histories)
+        self.assertEqual(batched[1], self.handler.normalize_data(histories[1]))
+        expected = self.handler.normalize_data(histories[0])
+        self.assertEqual(list(batched[0]), list(expected))
+        self.assertTrue(math.isnan(batched[0]["2025-01-14"]["sumMissedAttestations"].pop("attest_pct")))
+        self.assertTrue(math.isnan(expected["2025-01-14"]["sumMissedAttestations"].pop("attest_pct")))
+        self.assertEqual(batched[0], expected)
+        self.assertEqual(batched[0]["2025-01-13"]["sumMissedAttestations"], {"metric": 10, "per_val": 2.5, "attest_pct": 1.25})
+
+    def test_both_normalizers_follow_the_shared_date_lists(self):
+        history = {date: {"validatorCount": 2, "totalUniqueAttestations": 100, "sumMissedAttestations": 1, "endSlot": 9} for date in ["2025-01-12", "2025-01-13", "2025-01-14"]}
+        with patch("DataHandler.DROPPED_DATES", ["2025-01-12"]), patch.dict("DataHandler.DATE_ALIASES", {"2025-01-14": "2025-01-15"}, clear=True):
+            expected = self.handler.normalize_data(history)
+            self.assertEqual(list(expected), ["2025-01-13", "2025-01-15"])
+            self.assertNotIn("endSlot", expected["2025-01-13"])
+            self.assertEqual(self.handler.normalize_histories([history])[0], expected)
+
+    def test_normalize_histories_raises_like_normalize_data(self):
+        for history in [
+            {"2025-01-13": {"validatorCount": 0, "sumMissedAttestations": 3}},
+            {"2025-01-13": {"sumMissedAttestations": 3}},
+            {"2025-01-13": {"validatorCount": None, "sumMissedAttestations": 3}},
+            {"2025-01-13": {"validatorCount": 2, "totalUniqueAttestations": None, "sumMissedAttestations": 3}},
+        ]:
+            with self.assertRaises((ZeroDivisionError, TypeError)) as expected:
+                self.handler.normalize_data(history)
+            with self.assertRaises(type(expected.exception)):
+                self.handler.normalize_histories([history])
+
+    def test_load_data_drops_only_broken_histories(self):
+        stored = {
+            "lido_csm/operator_data/CSM Operator 1 - Lido Community Staking Module": {"2025-01-13": {"validatorCount": 2, "sumMissedAttestations": 4, "totalUniqueAttestations": 100}},
+            "lido_csm/operator_data/CSM Operator 2 - Lido Community Staking Module": {"2025-01-13": {"validatorCount": 0, "sumMissedAttestations": 4}},
+        }
+        self.handler.load_data(Mock(get_dir_files=lambda path: list(stored), get_data=stored.get))
+        self.assertEqual(list(self.handler.node_data["2025-01-13"]), ["CSM Operator 1 - Lido Community Staking Module"])
+        self.assertEqual(self.handler.node_data["2025-01-13"]["CSM Operator 1 - Lido Community Staking Module"]["sumMissedAttestations"]["attest_pct"], 4.0)
+
+    def test_windowed_load_faults_in_other_dates(self):
+        csm = "lido_csm/operator_data/CSM Operator 1 - Lido Community Staking Module"
+        days = {f"2025-01-{day:02d}": {"validatorCount": 2, "sumMissedAttestations": day, "totalUniqueAttestations": 100} for day in range(1, 17)}
+        stored = {csm: days, "lido_csm/operator_data/Lido": {"2025-01-11": {"validatorCount": 90}}}
+        s3 = Mock(get_dir_files=Mock(side_effect=lambda path: list(stored)), get_data=stored.get)
+
+        self.handler.load_data(s3, dates=["2025-01-15", "2025-01-16"])
+        self.assertEqual(sorted(self.handler.node_data), ["2025-01-15", "2025-01-16"])
+        # the demo copy of the aggregates' 2025-01-11 needs its source day
+        self.assertNotIn("2025-01-12", self.handler.agg_data)
+
+        self.assertEqual(self.handler.require_dates(["2025-01-12", "2025-01-15"]), ["2025-01-12"])
+        self.assertEqual(sorted(self.handler.node_data), ["2025-01-12", "2025-01-15", "2025-01-16"])
+        self.assertEqual(self.handler.node_data["2025-01-12"]["CSM Operator 1 - Lido Community Staking Module"]["sumMissedAttestations"]["per_val"], 6.0)
+        self.assertIn("2025-01-12", self.handler.agg_data)
+        self.assertEqual(self.handler.require_dates(["2025-01-12"]), [])
+        self.assertEqual(s3.get_dir_files.call_count, 2)
+
+    def test_full_load_needs_no_fault_in(self):
+        self.assertEqual(self.handler.require_dates(["2025-01-12"]), [])
+
 if __name__ == '__main__':
     unittest.main()
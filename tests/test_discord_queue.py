@@ -0,0 +1,78 @@
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from DiscordBot import DISCORD_LIMIT, DiscordQueue, batch_messages
+
+class FakeWebhook(BaseHTTPRequestHandler):
+    # records posted contents, answers the first `limited` posts with 429
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            server.attempts += 1
+            limited = server.attempts <= server.limited
+            if not limited:
+                server.posts.append((time.monotonic(), body["content"]))
+        if limited:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.2")
+            self.send_header("Content-Length", "0")
+        else:
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestDiscordQueue(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), FakeWebhook)
+        self.server.lock = threading.Lock()
+        self.server.attempts = 0
+        self.server.limited = 0
+        self.server.posts = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/webhook"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_batches_within_limit(self):
+        messages = [f"operator {n}: effectiveness {n}" for n in range(300)] + ["x" * 4500]
+        posts = batch_messages(messages)
+
+        self.assertTrue(all(len(post) <= DISCORD_LIMIT for post in posts))
+        self.assertEqual(len(posts), 8)
+        self.assertEqual("".join(posts).count("operator"), 300)
+        self.assertEqual(posts[-1], "x" * 500)
+
+    def test_storm_is_coalesced_and_retried(self):
+        self.server.limited = 1
+        queue = DiscordQueue(rate=50, burst=50)
+        started = time.monotonic()
+        for n in range(200):
+            queue.put(self.url, f"operator {n} below threshold")
+        # put never waits for the webhook
+        self.assertLess(time.monotonic() - started, 0.2)
+
+        self.assertTrue(queue.flush(timeout=10))
+        contents = [content for _, content in self.server.posts]
+        self.assertLess(len(contents), 10)
+        self.assertEqual(sum(content.count("below threshold") for content in contents), 200)
+        self.assertEqual((queue.sent, queue.dropped), (len(contents), 0))
+        # the 429 held the retry back for Retry-After
+        self.assertGreaterEqual(self.server.posts[0][0] - started, 0.2)
+
+    def test_gives_up_after_retries(self):
+        self.server.limited = 100
+        queue = DiscordQueue(rate=50, burst=50, max_retries=1)
+        queue.put(self.url.replace(str(self.server.server_port), "1"), "nobody listens")
+        queue.put(self.url, "always limited")
+        self.assertTrue(queue.flush(timeout=10))
+        self.assertEqual(queue.dropped, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest.mock import Mock, patch
+from tests.memory_s3 import MemoryS3
+from EntityRegistry import EntityRegistry, ACTIVE, MISSING, EMPTY, csm_operator
+from RatedHandler import RatedHandler
+from utils import READ_FAILED
+
+HOUR = 3600
+
+def response(status, results=None):
+    r = Mock()
+    r.status_code = status
+    r.content = b"{}"
+    r.text = ""
+    r.json.return_value = {"results": results or []}
+    return r
+
+class TestEntityRegistry(unittest.TestCase):
+    def test_negative_results_are_cached_with_backoff(self):
+        registry = EntityRegistry(ttl=HOUR)
+        registry.record(csm_operator(5), MISSING, now=0)
+
+        self.assertEqual(registry.candidates([csm_operator(5)], now=HOUR - 1), [])
+        self.assertEqual(registry.candidates([csm_operator(5)], now=HOUR + 1), [csm_operator(5)])
+
+        # second miss doubles the ttl
+        registry.record(csm_operator(5), MISSING, now=HOUR + 1)
+        self.assertEqual(registry.candidates([csm_operator(5)], now=3 * HOUR), [])
+        self.assertEqual(registry.candidates([csm_operator(5)], now=3 * HOUR + 2), [csm_operator(5)])
+
+    def test_active_again_resets_misses(self):
+        registry = EntityRegistry(ttl=HOUR)
+        registry.record("Lido", EMPTY, now=0)
+        registry.record("Lido", ACTIVE, now=10)
+        self.assertEqual(registry.entities["Lido"]["misses"], 0)
+        self.assertEqual(registry.candidates(["Lido"], now=11), ["Lido"])
+
+    def test_probes_past_highest_active_operator(self):
+        registry = EntityRegistry(probe_ahead=3)
+        for n in [0, 1, 450]:
+            registry.record(csm_operator(n), ACTIVE, now=0)
+        registry.record(csm_operator(452), MISSING, now=0)
+
+        ids = registry.candidates(["Lido"], now=1)
+
+        self.assertEqual(ids, ["Lido", csm_operator(0), csm_operator(1), csm_operator(450), csm_operator(451), csm_operator(453)])
+
+    def test_round_trips_through_s3(self):
+        s3 = MemoryS3()
+        registry = EntityRegistry(s3)
+        registry.record("Lido", ACTIVE, now=5)
+        registry.save()
+        self.assertEqual(EntityRegistry.load(s3).entities, {"Lido": {"status": ACTIVE, "checked": 5, "misses": 0}})
+
+    def test_unreadable_registry_is_not_saved_over(self):
+        s3 = MemoryS3({"lido_csm/entity_registry": {"entities": {"Lido": {"status": ACTIVE, "checked": 5, "misses": 0}}}})
+        s3.get_data_versioned = Mock(return_value=(None, READ_FAILED))
+        registry = EntityRegistry(s3)
+        registry.record("Obol", MISSING, now=9)
+
+        self.assertFalse(registry.save())
+        self.assertEqual(list(s3.get_data("lido_csm/entity_registry")["entities"]), ["Lido"])
+
+class TestRatedDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.registry = EntityRegistry(ttl=HOUR)
+
+    @patch("RatedHandler.requests.get")
+    def test_not_found_costs_one_request_and_is_cached(self, get):
+        get.return_value = response(404)
+        rated = RatedHandler("sk", self.registry)
+
+        self.assertEqual(rated.fetch_entity(csm_operator(399)), {})
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.registry.status(csm_operator(399)), MISSING)
+        self.assertNotIn(csm_operator(399), RatedHandler("sk", self.registry).rated_ids)
+
+    @patch("RatedHandler.requests.get")
+    def test_no_validators_is_cached_as_empty(self, get):
+        get.return_value = response(200, [])
+        RatedHandler("sk", self.registry).fetch_entity(csm_operator(7))
+
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(self.registry.status(csm_operator(7)), EMPTY)
+
+    @patch("RatedHandler.requests.get")
+    def test_active_entity_uses_every_endpoint(self, get):
+        get.return_value = response(200, [{"endTimestamp": "2025-01-14T12:00:11", "validatorCount": 3}])
+        data = RatedHandler("sk", self.registry).fetch_entity(csm_operator(7))
+
+        self.assertEqual(get.call_count, 4)
+        self.assertEqual(data["2025-01-14"]["validatorCount"], 3)
+        self.assertEqual(self.registry.status(csm_operator(7)), ACTIVE)
+
+    @patch("RatedHandler.requests.get")
+    def test_not_found_on_a_later_endpoint_keeps_the_entity(self, get):
+        found = response(200, [{"endTimestamp": "2025-01-14T12:00:11", "validatorCount": 3}])
+        get.side_effect = [found, found, response(404), found]
+        data = RatedHandler("sk", self.registry).fetch_entity(csm_operator(7))
+
+        self.assertEqual(get.call_count, 4)
+        self.assertEqual(data["2025-01-14"]["validatorCount"], 3)
+        self.assertEqual(self.registry.status(csm_operator(7)), ACTIVE)
+
+    @patch("RatedHandler.requests.get")
+    def test_server_errors_are_not_cached(self, get):
+        get.return_value = response(500)
+        with patch("RatedHandler.time.sleep"):
+            RatedHandler("sk", self.registry).fetch_entity(csm_operator(7))
+        self.assertIsNone(self.registry.status(csm_operator(7)))
+
+    @patch("RatedHandler.requests.get")
+    def test_write_api_data_skips_empty_entities(self, get):
+        get.return_value = response(404)
+        s3 = MemoryS3()
+        rated = RatedHandler("sk", self.registry)
+        rated.rated_ids = [csm_operator(1)]
+        rated.write_api_data(s3)
+        self.assertEqual(s3.objects, {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import importlib.util
+import shutil
+import tempfile
+import unittest
+from DataHandler import DataHandler
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+CSM_1 = "CSM Operator 1 - Lido Community Staking Module"
+CSM_2 = "CSM Operator 2 - Lido Community Staking Module"
+SDVT = "Obol - Divine Dragon - Lido SimpleDVT Module"
+
+def record(validators, missed, effectiveness=97.5):
+    return {
+        "startSlot": 10890000,
+        "startTimestamp": "2025-01-13T12:00:23",
+        "validatorCount": validators,
+        "totalUniqueAttestations": 1000,
+        "sumMissedAttestations": missed,
+        "avgValidatorEffectiveness": effectiveness,
+    }
+
+HISTORIES = {
+    CSM_1: {"2025-01-13": record(10, 5), "2025-01-14": record(10, None)},
+    CSM_2: {"2025-01-13": record(4, 0, None)},
+    SDVT: {"2025-01-13": record(100, 1), "2025-02-01": record(100, 2)},
+}
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow not installed")
+class TestHistoryArchive(unittest.TestCase):
+    def setUp(self):
+        from HistoryArchive import HistoryArchive
+        self.root = tempfile.mkdtemp()
+        self.archive = HistoryArchive(self.root)
+        self.archive.export(HISTORIES)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_export_partitions_by_module_and_day(self):
+        self.assertEqual(len(self.archive._files(["2025-01-13"], ["csm", "sdvt", "curated"])), 2)
+        self.assertEqual(self.archive._files(["2025-01-15"], ["csm"]), [])
+
+    def test_read_round_trips_records(self):
+        history = self.archive.read(["2025-01-13", "2025-01-14"])
+
+        self.assertEqual(set(history), {CSM_1, CSM_2, SDVT})
+        self.assertEqual(history[CSM_1]["2025-01-13"]["sumMissedAttestations"], 5)
+        self.assertEqual(history[CSM_1]["2025-01-13"]["startTimestamp"], "2025-01-13T12:00:23")
+        self.assertIsNone(history[CSM_1]["2025-01-14"]["sumMissedAttestations"])
+        self.assertIsNone(history[CSM_2]["2025-01-13"]["avgValidatorEffectiveness"])
+        self.assertNotIn("2025-02-01", history[SDVT])
+
+    def test_read_projects_columns_and_modules(self):
+        history = self.archive.read(["2025-01-13"], metrics=["validatorCount"], modules=["csm"])
+
+        self.assertEqual(history, {CSM_1: {"2025-01-13": {"validatorCount": 10}}, CSM_2: {"2025-01-13": {"validatorCount": 4}}})
+
+    def test_export_rewrites_day(self):
+        self.archive.export({CSM_1: {"2025-01-13": record(12, 3)}})
+
+        history = self.archive.read(["2025-01-13"], modules=["csm"])
+        self.assertEqual(list(history), [CSM_1])
+        self.assertEqual(history[CSM_1]["2025-01-13"]["validatorCount"], 12)
+
+    def test_fractional_value_in_integer_column_skips_that_entity(self):
+        written = self.archive.export({CSM_1: {"2025-01-15": record(10, 1.5)}, CSM_2: {"2025-01-15": record(4, 2)}, SDVT: "not a history"})
+
+        self.assertEqual(len(written), 1)
+        # the value is not truncated into the archive
+        self.assertEqual(self.archive.read(["2025-01-15"]), {CSM_2: {"2025-01-15": {**dict.fromkeys(self.archive.schema.names[1:]), **record(4, 2)}}})
+
+    def test_arrow_ipc_format(self):
+        from HistoryArchive import HistoryArchive
+        archive = HistoryArchive(self.root + "/ipc", format="arrow")
+        archive.export(HISTORIES)
+        self.assertEqual(archive.read(["2025-01-13"]), self.archive.read(["2025-01-13"]))
+
+    def test_data_handler_load_archive_matches_json(self):
+        from HistoryArchive import archive_fields
+        from_archive = DataHandler()
+        loaded = from_archive.load_archive(self.archive, ["2025-01-13"])
+        from_json = DataHandler()
+        for id, history in HISTORIES.items():
+            # Rated returns every field, null when it has no value
+            full = {field: history["2025-01-13"].get(field) for field in archive_fields()}
+            from_json.ingest(f"lido_csm/operator_data/{id}", {"2025-01-13": full})
+
+        self.assertEqual(loaded, 3)
+        self.assertEqual(from_archive.node_data, from_json.node_data)
+        self.assertEqual(from_archive.sdvt_data, from_json.sdvt_data)
+
+if __name__ == '__main__':
+    unittest.main()
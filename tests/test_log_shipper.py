@@ -0,0 +1,69 @@
+import gzip
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from tests.memory_s3 import MemoryS3
+from LogShipper import LogShipper
+
+class TestLogShipper(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "app.log")
+        self.handler = RotatingFileHandler(self.path, maxBytes=200, backupCount=3)
+        self.log = logging.getLogger(f"shipper_test_{id(self)}")
+        self.log.propagate = False
+        self.log.addHandler(self.handler)
+        self.s3 = MemoryS3()
+        self.shipper = LogShipper(self.s3, self.path, backups=3)
+        self.runs = 0
+
+    def tearDown(self):
+        self.handler.close()
+        shutil.rmtree(self.dir)
+
+    def write(self, first, last):
+        for n in range(first, last):
+            self.log.warning(f"line {n:04d}")
+
+    def ship(self):
+        self.runs += 1
+        key = self.shipper.ship(now=datetime(2025, 1, 16, 0, 0, self.runs))
+        if key is None:
+            return []
+        return gzip.decompress(self.s3.objects[key]).decode().splitlines()
+
+    def test_ships_each_line_once_across_rotations(self):
+        self.write(0, 5)
+        self.assertEqual(self.ship(), [f"line {n:04d}" for n in range(5)])
+        self.assertEqual(self.ship(), [])
+
+        # 10 byte lines, 200 byte segments: three rotations since the last run
+        self.write(5, 60)
+        self.assertEqual(self.ship(), [f"line {n:04d}" for n in range(5, 60)])
+        self.write(60, 61)
+        self.assertEqual(self.ship(), ["line 0060"])
+        self.assertEqual(sorted(self.s3.objects)[0], f"lido_csm/logs/2025/01/16/000001_{socket.gethostname()}.log.gz")
+
+    def test_partial_line_waits(self):
+        self.write(0, 2)
+        with open(self.path, "a") as f:
+            f.write("half")
+        self.assertEqual(self.ship(), ["line 0000", "line 0001"])
+        with open(self.path, "a") as f:
+            f.write(" done\n")
+        self.assertEqual(self.ship(), ["half done"])
+
+    def test_failed_upload_is_retried(self):
+        self.write(0, 3)
+        self.s3.write_object = lambda *args, **kwargs: False
+        self.assertIsNone(self.shipper.ship())
+        del self.s3.write_object
+        self.assertEqual(len(self.ship()), 3)
+
+if __name__ == '__main__':
+    unittest.main()
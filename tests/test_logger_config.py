@@ -0,0 +1,32 @@
+import json
+import logging
+import unittest
+from logger_config import JsonFormatter, SiteSampler, MAX_MESSAGE_CHARS
+
+def record(message, level=logging.INFO, lineno=10, args=None):
+    return logging.LogRecord("my_app", level, "/src/RatedHandler.py", lineno, message, args, None)
+
+class TestLogging(unittest.TestCase):
+    def test_sampler_bounds_each_call_site(self):
+        sampler = SiteSampler(first=5, every=10)
+        passed = sum(sampler.filter(record("fetched")) for _ in range(105))
+        self.assertEqual(passed, 5 + 10)
+        # another call site and warnings have their own budget
+        self.assertTrue(sampler.filter(record("fetched", lineno=11)))
+        self.assertTrue(all(sampler.filter(record("failed", logging.WARNING)) for _ in range(20)))
+        self.assertEqual(sampler.summary(), {"RatedHandler.py:10": 90})
+
+        sampler.reset()
+        self.assertTrue(sampler.filter(record("fetched")))
+
+    def test_json_lines_with_capped_messages(self):
+        line = JsonFormatter().format(record("Rated %s response: %s", args=("attest", "x" * 5000)))
+        entry = json.loads(line)
+        self.assertEqual(entry["site"], "RatedHandler:10")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertTrue(entry["message"].startswith("Rated attest response: xxx"))
+        self.assertLess(len(entry["message"]), MAX_MESSAGE_CHARS + 50)
+        self.assertNotIn("\n", line)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from tests.memory_s3 import MemoryS3
+from DataHandler import DataHandler
+from PartitionStore import PartitionStore, build_segment, iter_segment
+
+CSM_1 = "CSM Operator 1 - Lido Community Staking Module"
+CSM_2 = "CSM Operator 2 - Lido Community Staking Module"
+SDVT = "Obol - Divine Dragon - Lido SimpleDVT Module"
+
+def record(validators, missed):
+    return {"validatorCount": validators, "totalUniqueAttestations": 1000, "sumMissedAttestations": missed}
+
+class TestPartitionStore(unittest.TestCase):
+    def setUp(self):
+        self.s3 = MemoryS3()
+        self.store = PartitionStore(self.s3)
+
+    def append_run(self, run_id, entities):
+        for entity, history in entities.items():
+            self.store.append(entity, history)
+        return self.store.flush(run_id=run_id)
+
+    def test_flush_writes_one_part_per_module_and_day(self):
+        keys = self.append_run("20250114T000000-aaaaaa", {
+            CSM_1: {"2025-01-13": record(10, 5), "2025-01-14": record(10, 6)},
+            CSM_2: {"2025-01-13": record(4, 0)},
+            SDVT: {"2025-01-13": record(100, 1)},
+        })
+        self.assertEqual(keys, [
+            "lido_csm/partitions/csm/2025-01/2025-01-13/part-20250114T000000-aaaaaa",
+            "lido_csm/partitions/csm/2025-01/2025-01-14/part-20250114T000000-aaaaaa",
+            "lido_csm/partitions/sdvt/2025-01/2025-01-13/part-20250114T000000-aaaaaa",
+        ])
+        self.assertEqual(set(self.s3.get_data(keys[0])), {CSM_1, CSM_2})
+
+    def test_read_only_touches_requested_days(self):
+        self.append_run("20250114T000000-aaaaaa", {
+            CSM_1: {"2025-01-13": record(10, 5), "2025-01-14": record(10, 6)},
+            SDVT: {"2025-02-01": record(100, 1)},
+        })
+        self.s3.gets.clear()
+
+        history = self.store.read(["2025-01-14"])
+
+        self.assertEqual(history, {CSM_1: {"2025-01-14": record(10, 6)}})
+        self.assertEqual(self.s3.gets, ["lido_csm/partitions/csm/2025-01/2025-01-14/part-20250114T000000-aaaaaa"])
+
+    def test_later_parts_win(self):
+        self.append_run("20250114T000000-aaaaaa", {CSM_1: {"2025-01-13": record(10, 5)}})
+        self.append_run("20250115T000000-bbbbbb", {CSM_1: {"2025-01-13": {"sumMissedAttestations": 7}}})
+
+        history = self.store.read(["2025-01-13"])
+
+        self.assertEqual(history[CSM_1]["2025-01-13"], record(10, 7))
+
+    def test_compact_preserves_reads(self):
+        self.append_run("20250114T000000-aaaaaa", {
+            CSM_1: {"2025-01-13": record(10, 5), "2025-01-14": record(10, 6)},
+            CSM_2: {"2025-01-14": record(4, 0)},
+        })
+        self.append_run("20250115T000000-bbbbbb", {CSM_1: {"2025-01-14": {"sumMissedAttestations": 9}}})
+        before = self.store.read(["2025-01-13", "2025-01-14"], modules=["csm"])
+
+        compacted = self.store.compact()
+
+        self.assertEqual(len(compacted), 1)
+        self.assertEqual(self.s3.get_dir_files("lido_csm/partitions/csm/2025-01/"), compacted)
+        self.assertEqual(self.store.read(["2025-01-13", "2025-01-14"], modules=["csm"]), before)
+        # a single segment is not rewritten
+        self.assertEqual(self.store.compact(), [])
+
+    def test_parts_after_compaction_stay_on_top(self):
+        self.append_run("20250114T000000-aaaaaa", {CSM_1: {"2025-01-13": record(10, 5)}})
+        self.append_run("20250114T010000-aaaaaa", {CSM_2: {"2025-01-13": record(4, 1)}})
+        self.store.compact()
+        self.append_run("20990101T000000-cccccc", {CSM_1: {"2025-01-13": {"sumMissedAttestations": 8}}})
+
+        history = self.store.read(["2025-01-13"])
+
+        self.assertEqual(history[CSM_1]["2025-01-13"]["sumMissedAttestations"], 8)
+        self.assertEqual(history[CSM_2]["2025-01-13"], record(4, 1))
+
+    def test_segment_round_trip(self):
+        rows = {(CSM_2, "2025-01-14"): record(4, 0), (CSM_1, "2025-01-13"): record(10, 5)}
+        segment = build_segment(rows)
+        self.assertEqual(segment["dates"], ["2025-01-13", "2025-01-14"])
+        self.assertEqual({(e, d): r for e, d, r in iter_segment(segment)}, rows)
+
+    def test_data_handler_load_partitions(self):
+        self.append_run("20250114T000000-aaaaaa", {
+            CSM_1: {"2025-01-13": record(10, 5), "2025-01-14": record(10, 6)},
+            "Lido": {"2025-01-13": record(1000, 50)},
+        })
+        dh = DataHandler()
+        dh.load_partitions(self.store, ["2025-01-13"])
+
+        self.assertEqual(list(dh.node_data), ["2025-01-13"])
+        self.assertEqual(dh.node_data["2025-01-13"][CSM_1]["sumMissedAttestations"]["per_val"], 0.5)
+        self.assertIn("Lido", dh.agg_data["2025-01-13"])
+
+    def test_compaction_keeps_parts_it_could_not_fold(self):
+        self.append_run("20250113T000000-aaaaaa", {CSM_1: {"2025-01-13": record(10, 5)}})
+        self.append_run("20250114T000000-bbbbbb", {CSM_1: {"2025-01-14": record(10, 6)}})
+        before = self.store.read(["2025-01-13", "2025-01-14"])
+        write, get = self.s3.write_data, self.s3.get_data
+
+        # the segment PUT fails
+        self.s3.write_data = lambda key, data, tag="": False
+        self.assertEqual(self.store.compact(), [])
+        self.s3.write_data = write
+        # a part cannot be read
+        self.s3.get_data = lambda key, tag="": None if key.endswith("aaaaaa") else get(key, tag)
+        self.assertEqual(self.store.compact(), [])
+        self.s3.get_data = get
+
+        self.assertEqual(len(self.s3.get_dir_files("lido_csm/partitions/")), 2)
+        self.assertEqual(self.store.read(["2025-01-13", "2025-01-14"]), before)
+
+    def test_failed_flush_raises_and_keeps_the_records(self):
+        self.store.append(CSM_1, {"2025-01-13": record(10, 5)})
+        write = self.s3.write_data
+        self.s3.write_data = lambda key, data, tag="": False
+        with self.assertRaises(RuntimeError):
+            self.store.flush()
+
+        self.s3.write_data = write
+        self.assertEqual(len(self.store.flush()), 1)
+        self.assertEqual(self.store.read(["2025-01-13"]), {CSM_1: {"2025-01-13": record(10, 5)}})
+
+    def test_imported_histories_load_every_day(self):
+        self.s3.write_data(f"lido_csm/operator_data/{CSM_1}", {"2024-12-30": record(10, 1), "2025-01-14": record(10, 6)})
+        self.s3.write_data(f"lido_csm/operator_data/{SDVT}", {"2025-01-13": record(100, 1)})
+        self.store.import_entity_histories()
+        self.append_run("20250114T000000-aaaaaa", {CSM_1: {"2025-01-15": record(10, 2)}})
+
+        dh = DataHandler()
+        dh.load_partitions(self.store)
+        self.assertEqual(sorted(dh.node_data), ["2024-12-30", "2025-01-14", "2025-01-15"])
+        self.assertIn(SDVT, dh.sdvt_data["2025-01-13"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import Mock
+from tests.memory_s3 import MemoryS3
+from DataHandler import DataHandler
+from Pipeline import Pipeline, Channel
+
+def day(validators=10):
+    return {
+        "validatorCount": validators,
+        "totalUniqueAttestations": 1000,
+        "sumMissedAttestations": 50,
+        "avgInclusionDelay": 1.02,
+    }
+
+class TestPipeline(unittest.TestCase):
+    def setUp(self):
+        self.s3 = MemoryS3({
+            f"lido_csm/operator_data/CSM Operator {n} - Lido Community Staking Module": {"2025-01-13": day(n + 1)}
+            for n in range(20)
+        })
+
+    def test_load_only(self):
+        dh = DataHandler()
+        counts = Pipeline(self.s3, dh, workers=4, queue_size=2).run()
+
+        self.assertEqual(counts["loaded"], 20)
+        self.assertEqual(counts["normalized"], 20)
+        self.assertEqual(len(dh.node_data["2025-01-13"]), 20)
+        self.assertEqual(
+            dh.node_data["2025-01-13"]["CSM Operator 3 - Lido Community Staking Module"]["sumMissedAttestations"]["per_val"],
+            50 / 4
+        )
+
+    def test_fetch_persist_normalize(self):
+        rated = Mock()
+        rated.rated_ids = ["CSM Operator 0 - Lido Community Staking Module", "CSM Operator 99 - Lido Community Staking Module"]
+        rated.fetch_entity.side_effect = lambda id: {"2025-01-14": day(5)}
+        rated.merge_existing.side_effect = lambda id, data, s3: {**(s3.get_data(f"lido_csm/operator_data/{id}") or {}), **data}
+
+        dh = DataHandler()
+        counts = Pipeline(self.s3, dh, rated, workers=3, queue_size=1).run()
+
+        self.assertEqual(counts["fetched"], 2)
+        self.assertEqual(counts["persisted"], 2)
+        # fetched entities are not loaded a second time
+        self.assertEqual(counts["loaded"], 19)
+        self.assertEqual(counts["normalized"], 21)
+        self.assertIn("2025-01-14", self.s3.get_data("lido_csm/operator_data/CSM Operator 99 - Lido Community Staking Module"))
+        self.assertIn("CSM Operator 0 - Lido Community Staking Module", dh.node_data["2025-01-13"])
+        self.assertEqual(len(dh.node_data["2025-01-14"]), 2)
+
+    def test_fetch_only_without_data_handler(self):
+        rated = Mock()
+        rated.rated_ids = ["Lido"]
+        rated.fetch_entity.return_value = {"2025-01-14": day()}
+        rated.merge_existing.side_effect = lambda id, data, s3: data
+
+        counts = Pipeline(self.s3, None, rated, workers=2).run()
+
+        self.assertEqual(counts["persisted"], 1)
+        self.assertEqual(counts["normalized"], 0)
+        self.assertIn("lido_csm/operator_data/Lido", self.s3.objects)
+
+    def test_stage_errors_do_not_stall(self):
+        rated = Mock()
+        rated.rated_ids = [f"CSM Operator {n} - Lido Community Staking Module" for n in range(5)]
+        rated.fetch_entity.side_effect = RuntimeError("rated down")
+
+        counts = Pipeline(self.s3, DataHandler(), rated, workers=2, queue_size=1).run()
+
+        self.assertEqual(counts["errors"], 5)
+        # the failed entities are analysed from their stored history
+        self.assertEqual(counts["normalized"], 20)
+
+    def test_channel_multiple_producers(self):
+        channel = Channel(maxsize=10, producers=2)
+        channel.put(1)
+        channel.close()
+        channel.put(2)
+        channel.close()
+        self.assertEqual(list(channel), [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+import json
+import os
+import tempfile
+from profiler import RunProfile
+
+class TestRunProfile(unittest.TestCase):
+    def setUp(self):
+        self.profile = RunProfile()
+
+    def test_stage_accumulates_calls(self):
+        for _ in range(3):
+            with self.profile.stage("analysis.stats"):
+                pass
+        stage = self.profile.stages["analysis.stats"]
+        self.assertEqual(stage["calls"], 3)
+        self.assertGreaterEqual(stage["total_s"], stage["max_s"])
+
+    def test_stage_recorded_on_error(self):
+        with self.assertRaises(ValueError):
+            with self.profile.stage("load.normalize"):
+                raise ValueError("bad data")
+        self.assertEqual(self.profile.stages["load.normalize"]["calls"], 1)
+
+    def test_count_io(self):
+        self.profile.count_io("s3.get", bytes_in=100)
+        self.profile.count_io("s3.get", bytes_in=50)
+        self.profile.count_io("s3.get", error=True)
+        self.assertEqual(self.profile.io["s3.get"], {"requests": 3, "bytes_in": 150, "bytes_out": 0, "errors": 1})
+
+    def test_write_and_stage_profiles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.profile.enable_stage_profiling("render", output_dir=os.path.join(tmp, "profiles"))
+            with self.profile.stage("render"):
+                with self.profile.stage("render.histogram"):
+                    sum(range(1000))
+            with self.profile.stage("load"):
+                pass
+
+            path = self.profile.write(os.path.join(tmp, "run_profile.json"))
+            with open(path) as f:
+                summary = json.load(f)
+
+            self.assertIn("render.histogram", summary["stages"])
+            self.assertEqual(os.listdir(os.path.join(tmp, "profiles")), ["render.prof"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import random
+import unittest
+import numpy as np
+from tests.memory_s3 import MemoryS3
+from QuantileSketch import KLLSketch, window_statistics
+from DataHandler import DataHandler
+
+CSM = "CSM Operator {} - Lido Community Staking Module"
+
+def rank_error(values, q, estimate):
+    return abs((np.asarray(values) < estimate).mean() - q)
+
+class TestKLLSketch(unittest.TestCase):
+    def test_small_populations_are_exact(self):
+        sketch = KLLSketch()
+        sketch.update_many([5, 1, 4, 2, 3])
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [1.0, 3.0, 5.0])
+        self.assertEqual(sketch.summary()["mean"], 3.0)
+
+    def test_merged_daily_sketches_stay_small_and_close(self):
+        rng = random.Random(3)
+        days = [[rng.expovariate(1.0) for _ in range(400)] for _ in range(90)]
+        merged = KLLSketch()
+        for day in days:
+            daily = KLLSketch()
+            daily.update_many(day)
+            merged.merge(KLLSketch.from_dict(json.loads(json.dumps(daily.to_dict()))))
+
+        values = [v for day in days for v in day]
+        self.assertEqual(merged.count, len(values))
+        self.assertLess(merged.size(), 3 * merged.k)
+        for q in [0.1, 0.5, 0.9]:
+            self.assertLess(rank_error(values, q, merged.quantile(q)), 0.02)
+        self.assertAlmostEqual(merged.summary()["mean"], float(np.mean(values)))
+        self.assertAlmostEqual(merged.summary()["std_dev"], float(np.std(values)))
+        self.assertEqual(merged.summary()["max"], max(values))
+
+    def test_empty_sketch(self):
+        sketch = KLLSketch.from_dict(json.loads(json.dumps(KLLSketch().to_dict())))
+        self.assertIsNone(sketch.summary())
+        self.assertEqual(sketch.quantiles([0.5]), [None])
+
+class TestWindowStatistics(unittest.TestCase):
+    def test_window_from_daily_sketches(self):
+        handler = DataHandler()
+        dates = ["2025-01-13", "2025-01-14"]
+        handler.node_data = {
+            date: {CSM.format(n): {"avgCorrectness": {"metric": n + day}, "sumMissedAttestations": {"metric": n, "per_val": None}} for n in range(10)}
+            for day, date in enumerate(dates)
+        }
+        handler.node_data["2025-01-13_2025-01-14"] = {CSM.format(0): {"avgCorrectness": {"metric": 0.5}}}
+        s3 = MemoryS3()
+
+        self.assertEqual(handler.write_sketches(s3, modules=["csm"]), 2)
+        stats, missing = window_statistics(s3, dates + ["2025-01-15"], "csm")
+
+        self.assertEqual(missing, ["2025-01-15"])
+        correctness = stats["avgCorrectness"]["metric"]
+        self.assertEqual(correctness["count"], 20)
+        self.assertEqual(correctness["mean"], 5.0)
+        self.assertEqual(correctness["min"], 0.0)
+        self.assertEqual(correctness["max"], 10.0)
+        self.assertNotIn("per_val", stats["sumMissedAttestations"])
+
+if __name__ == '__main__':
+    unittest.main()
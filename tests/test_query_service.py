@@ -0,0 +1,82 @@
+import json
+import threading
+import unittest
+from http.client import HTTPConnection
+from DataHandler import DataHandler
+from QueryService import QueryService, serve
+
+CSM = "CSM Operator {} - Lido Community Staking Module"
+DAYS = ["2025-01-14", "2025-01-15", "2025-01-16"]
+
+def analysed_handler():
+    handler = DataHandler()
+    handler.node_data = {
+        day: {
+            CSM.format(n): {
+                "avgValidatorEffectiveness": {"metric": 90.0 + n + d},
+                "sumMissedAttestations": {"metric": n, "per_val": float("nan") if n == 2 else n / 2},
+                "validatorCount": {"metric": 2},
+            }
+            for n in range(4)
+        }
+        for d, day in enumerate(DAYS)
+    }
+    handler.get_mva(DAYS, module="csm")
+    handler.get_statistics(module="csm")
+    handler.get_zscores(module="csm")
+    return handler
+
+class TestQueryService(unittest.TestCase):
+    def setUp(self):
+        self.service = QueryService(analysed_handler())
+
+    def test_operator_metrics_default_to_the_window(self):
+        status, payload = self.service.query("/operators/csm/3")
+        self.assertEqual(status, 200)
+        self.assertEqual(payload["date"], "2025-01-14_2025-01-16")
+        self.assertEqual(payload["metrics"]["avgValidatorEffectiveness"]["metric"], 94.0)
+        self.assertIn("zscore_metric", payload["metrics"]["avgValidatorEffectiveness"])
+
+        _, payload = self.service.query("/operators/csm/2?date=2025-01-15")
+        self.assertIsNone(payload["metrics"]["sumMissedAttestations"]["per_val"])
+        _, payload = self.service.query(f"/operators/csm/{CSM.format(1).replace(' ', '%20')}?date=2025-01-14")
+        self.assertEqual(payload["metrics"]["avgValidatorEffectiveness"]["metric"], 91.0)
+
+    def test_rank_window_and_stats(self):
+        _, rank = self.service.query("/operators/csm/3/rank?metric=avgValidatorEffectiveness&date=2025-01-16")
+        self.assertEqual((rank["rank"], rank["percentile"], rank["peers"]), (1, 100.0, 4))
+
+        _, window = self.service.query("/operators/csm/0/window?metric=avgValidatorEffectiveness&start=2025-01-15&end=2025-01-16")
+        self.assertEqual((window["days"], window["mean"], window["min"], window["max"]), (2, 91.5, 91.0, 92.0))
+        self.service.query("/operators/csm/0/window?metric=avgValidatorEffectiveness&start=2025-01-15&end=2025-01-16")
+        self.assertEqual(self.service.window.cache_info().hits, 1)
+
+        _, stats = self.service.query("/modules/csm/stats?date=2025-01-16&metric=avgValidatorEffectiveness")
+        self.assertEqual(stats["stats"]["avgValidatorEffectiveness"]["metric"]["median"], 93.5)
+        _, dates = self.service.query("/dates")
+        self.assertEqual(dates, {"days": DAYS, "windows": ["2025-01-14_2025-01-16"]})
+
+    def test_errors(self):
+        self.assertEqual(self.service.query("/operators/csm/99")[0], 404)
+        self.assertEqual(self.service.query("/operators/lido/1")[0], 400)
+        self.assertEqual(self.service.query("/operators/csm/1/rank")[0], 400)
+        self.assertEqual(self.service.query("/nothing")[0], 404)
+
+    def test_http(self):
+        server = serve(self.service, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            connection = HTTPConnection("127.0.0.1", server.server_port)
+            for _ in range(2):
+                connection.request("GET", "/operators/csm/1?date=2025-01-14")
+                response = connection.getresponse()
+                self.assertEqual(response.status, 200)
+                self.assertEqual(response.getheader("Content-Type"), "application/json")
+                self.assertEqual(json.loads(response.read())["metrics"]["validatorCount"]["metric"], 2)
+            connection.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
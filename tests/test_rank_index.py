@@ -0,0 +1,59 @@
+import random
+import unittest
+from DataHandler import DataHandler
+
+CSM = "CSM Operator {} - Lido Community Staking Module"
+
+class TestRankIndex(unittest.TestCase):
+    def setUp(self):
+        self.handler = DataHandler()
+        values = [3.0, 1.0, 2.0, 2.0, None, float("nan")]
+        self.handler.node_data = {
+            "2025-01-13": {
+                CSM.format(n): {
+                    "sumMissedAttestations": {"metric": value, "per_val": value},
+                    "avgCorrectness": {"metric": value},
+                    "startTimestamp": {"metric": "2025-01-13T00:00:00"},
+                }
+                for n, value in enumerate(values)
+            }
+        }
+        self.ranks = self.handler.rank_index()
+
+    def test_lower_is_better_for_missed_attestations(self):
+        ranked = self.ranks.ranks("2025-01-13", "csm", "sumMissedAttestations", "per_val")
+        self.assertEqual(ranked[CSM.format(1)], (1, 100.0))
+        self.assertEqual(ranked[CSM.format(2)], (2, 50.0))
+        self.assertEqual(ranked[CSM.format(3)], (2, 50.0))
+        self.assertEqual(ranked[CSM.format(0)], (4, 0.0))
+        # None and NaN are not ranked, as get_statistics leaves them out
+        self.assertNotIn(CSM.format(4), ranked)
+        self.assertNotIn(CSM.format(5), ranked)
+
+    def test_higher_is_better_for_correctness(self):
+        ranked = self.ranks.ranks("2025-01-13", "csm", "avgCorrectness")
+        self.assertEqual(ranked[CSM.format(0)], (1, 100.0))
+        self.assertEqual(ranked[CSM.format(1)], (4, 0.0))
+
+    def test_rank_of_any_value(self):
+        self.assertEqual(self.ranks.rank("2025-01-13", "csm", "avgCorrectness", "metric", 2.5), (2, 75.0, 4))
+        self.assertEqual(self.ranks.rank("2025-01-13", "csm", "avgCorrectness", "metric", None), (None, None, 4))
+        self.assertEqual(self.ranks.rank("2025-01-14", "csm", "avgCorrectness", "metric", 1.0), (None, None, 0))
+        self.assertEqual(self.ranks.sorted_values("2025-01-13", "csm", "startTimestamp").tolist(), [])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(1)
+        values = [rng.choice([0, 0, 1, 2, 5]) + rng.random() * rng.choice([0, 1]) for _ in range(200)]
+        self.handler.sdvt_data = {"2025-01-12_2025-01-16": {f"op{n}": {"avgInclusionDelay": {"metric": v}} for n, v in enumerate(values)}}
+        ranked = self.handler.rank_index().ranks("2025-01-12_2025-01-16", "sdvt", "avgInclusionDelay")
+
+        for n, value in enumerate(values):
+            better = sum(other < value for other in values)
+            worse = sum(other > value for other in values)
+            ties = len(values) - better - worse - 1
+            rank, percentile = ranked[f"op{n}"]
+            self.assertEqual(rank, better + 1)
+            self.assertAlmostEqual(percentile, 100 * (worse + ties / 2) / (len(values) - 1))
+
+if __name__ == '__main__':
+    unittest.main()
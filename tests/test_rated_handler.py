@@ -0,0 +1,19 @@
+import unittest
+from RatedHandler import RatedHandler
+
+class TestCombineJsons(unittest.TestCase):
+    def test_combine_jsons_merges_endpoints_per_day(self):
+        pages = [
+            {"results": [{"endTimestamp": "2025-01-14T12:00:11", "day": 1, "date": "2025-01-14", "validatorCount": 3}]},
+            {"results": [{"endTimestamp": "2025-01-14T12:00:11", "startDate": "2025-01-13", "avgUptime": 0.99}, {"endTimestamp": "2025-01-15T12:00:11", "hour": 0, "sumMissedSlots": 1}]},
+        ]
+        combined = RatedHandler("sk").combine_jsons(pages)
+
+        self.assertEqual(combined, {
+            "2025-01-14": {"endTimestamp": "2025-01-14T12:00:11", "validatorCount": 3, "avgUptime": 0.99},
+            "2025-01-15": {"endTimestamp": "2025-01-15T12:00:11", "sumMissedSlots": 1},
+        })
+        self.assertIn("day", pages[0]["results"][0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import unittest
+from tests.memory_s3 import MemoryS3
+from ReportPublisher import IMMUTABLE, ReportPublisher, content_type
+
+class RecordingS3(MemoryS3):
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.uploads = {}
+
+    def upload_path(self, key, path, content_type="application/octet-stream", cache_control=None, metadata=None):
+        if any(key.endswith(name) for name in self.failing):
+            return False
+        self.uploads[key] = (content_type, cache_control)
+        return super().upload_path(key, path, content_type, cache_control, metadata)
+
+class TestReportPublisher(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for name, body in [("CSM/107/report/a.pdf", b"%PDF a"), ("CSM/107/histogram/b.png", b"png b"), ("CSM/12/report/c.pdf", b"%PDF c")]:
+            path = os.path.join(self.root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(body)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_unchanged_files_are_skipped(self):
+        s3 = RecordingS3()
+        publisher = ReportPublisher(s3, self.root, workers=4)
+
+        summary = publisher.publish("2025-01-12_2025-01-16")
+        version = summary["version"]
+        prefix = f"lido_csm/reports/{version}/"
+        self.assertTrue(version.startswith("2025-01-12_2025-01-16-"))
+        self.assertEqual((summary["uploaded"], summary["skipped"], summary["failed"]), (3, 0, []))
+        self.assertEqual(s3.objects[f"{prefix}CSM/107/report/a.pdf"], b"%PDF a")
+        self.assertEqual(s3.uploads[f"{prefix}CSM/107/histogram/b.png"], ("image/png", IMMUTABLE))
+        self.assertEqual(s3.objects["lido_csm/reports/latest"], version.encode())
+
+        s3.uploads.clear()
+        summary = publisher.publish("2025-01-12_2025-01-16")
+        self.assertEqual((summary["version"], summary["uploaded"], summary["skipped"]), (version, 0, 3))
+        self.assertEqual(s3.uploads, {})
+
+    def test_changed_reports_publish_a_new_version(self):
+        s3 = RecordingS3()
+        publisher = ReportPublisher(s3, self.root)
+        first = publisher.publish("2025-01-12_2025-01-16")["version"]
+
+        with open(os.path.join(self.root, "CSM/12/report/c.pdf"), "wb") as f:
+            f.write(b"%PDF c2")
+        summary = publisher.publish("2025-01-12_2025-01-16")
+        self.assertNotEqual(summary["version"], first)
+        self.assertEqual(summary["uploaded"], 3)
+        # the objects an immutable cache may hold for the old version are untouched
+        self.assertEqual(s3.objects[f"lido_csm/reports/{first}/CSM/12/report/c.pdf"], b"%PDF c")
+        self.assertEqual(s3.objects[f"lido_csm/reports/{summary['version']}/CSM/12/report/c.pdf"], b"%PDF c2")
+        self.assertEqual(s3.objects["lido_csm/reports/latest"], summary["version"].encode())
+
+    def test_failed_uploads_are_retried(self):
+        s3 = RecordingS3(failing={"/CSM/12/report/c.pdf"})
+        summary = ReportPublisher(s3, self.root).publish("v1")
+        self.assertEqual(summary["failed"], ["CSM/12/report/c.pdf"])
+        self.assertNotIn("lido_csm/reports/latest", s3.objects)
+
+        s3.failing.clear()
+        summary = ReportPublisher(s3, self.root).publish("v1")
+        self.assertEqual((summary["uploaded"], summary["skipped"]), (1, 2))
+
+    def test_content_types(self):
+        self.assertEqual(content_type("a/b.PDF"), "application/pdf")
+        self.assertEqual(content_type("a/b.unknownext"), "application/octet-stream")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import threading
+import unittest
+from unittest.mock import Mock
+from botocore.stub import Stubber
+from tests.memory_s3 import MemoryS3
+from RatedHandler import RatedHandler
+from S3ReadWrite import S3ReadWrite
+from ShardedFetch import ShardedFetcher, ShardLease, shard_of
+from utils import READ_FAILED
+
+def rated_handler(ids):
+    rated = RatedHandler.__new__(RatedHandler)
+    rated.rated_ids = ids
+    rated.fetch_entity = Mock(side_effect=lambda id: {"2025-01-14": {"validatorCount": 1, "id": id}})
+    return rated
+
+class TestShardLease(unittest.TestCase):
+    def setUp(self):
+        self.s3 = MemoryS3()
+
+    def test_only_one_owner(self):
+        a = ShardLease(self.s3, 0, "a", ttl=60)
+        b = ShardLease(self.s3, 0, "b", ttl=60)
+
+        self.assertTrue(a.acquire(refresh_interval=0, now=100))
+        self.assertFalse(b.acquire(refresh_interval=0, now=110))
+        # expired, b takes over and a can no longer renew
+        self.assertTrue(b.acquire(refresh_interval=0, now=161))
+        self.assertFalse(a.renew(now=162))
+
+    def test_recently_completed_shard_is_skipped(self):
+        a = ShardLease(self.s3, 3, "a", ttl=60)
+        a.acquire(refresh_interval=3600, now=100)
+        a.release(completed=100)
+
+        self.assertFalse(ShardLease(self.s3, 3, "b", ttl=60).acquire(refresh_interval=3600, now=200))
+        self.assertTrue(ShardLease(self.s3, 3, "b", ttl=60).acquire(refresh_interval=3600, now=3701))
+
+    def test_failed_read_is_a_lost_claim(self):
+        self.s3.get_data_versioned = Mock(return_value=(None, READ_FAILED))
+        self.assertFalse(ShardLease(self.s3, 0, "a", ttl=60).acquire(refresh_interval=0, now=100))
+        self.assertEqual(self.s3.objects, {})
+
+class TestShardedFetcher(unittest.TestCase):
+    def test_workers_split_entities(self):
+        s3 = MemoryS3({"lido_csm/operator_data/Lido": {"2025-01-13": {"validatorCount": 9}}})
+        ids = ["Lido"] + [f"CSM Operator {n} - Lido Community Staking Module" for n in range(40)]
+        handlers = [rated_handler(ids) for _ in range(3)]
+        fetchers = [ShardedFetcher(s3, handler, shards=8, worker_id=f"w{n}") for n, handler in enumerate(handlers)]
+
+        threads = [threading.Thread(target=fetcher.run) for fetcher in fetchers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        fetched = [call.args[0] for handler in handlers for call in handler.fetch_entity.call_args_list]
+        self.assertEqual(sorted(fetched), sorted(ids))
+        self.assertEqual(sum(f.counts["shards"] for f in fetchers), 8)
+        self.assertEqual(s3.get_data("lido_csm/operator_data/Lido"), {
+            "2025-01-13": {"validatorCount": 9},
+            "2025-01-14": {"validatorCount": 1, "id": "Lido"},
+        })
+
+    def test_conflicting_write_is_retried_on_top(self):
+        s3 = MemoryS3()
+        fetcher = ShardedFetcher(s3, rated_handler(["Lido"]), shards=1, worker_id="a")
+        write = s3.write_data_conditional
+        def racing_write(key, data, etag=None):
+            # another writer lands between our read and our put, once
+            s3.write_data_conditional = write
+            s3.write_data(key, {"2025-01-12": {"validatorCount": 7}})
+            return write(key, data, etag)
+        s3.write_data_conditional = racing_write
+
+        self.assertTrue(fetcher.write_entity("Lido", {"2025-01-14": {"validatorCount": 1}}))
+        self.assertEqual(fetcher.counts["conflicts"], 1)
+        self.assertEqual(set(s3.get_data("lido_csm/operator_data/Lido")), {"2025-01-12", "2025-01-14"})
+
+    def test_unreadable_history_is_not_overwritten(self):
+        s3 = MemoryS3({"lido_csm/operator_data/Lido": {"2025-01-12": {"validatorCount": 7}}})
+        s3.get_data_versioned = Mock(return_value=(None, READ_FAILED))
+        fetcher = ShardedFetcher(s3, rated_handler(["Lido"]), shards=1, worker_id="a")
+
+        self.assertFalse(fetcher.write_entity("Lido", {"2025-01-14": {"validatorCount": 1}}))
+        self.assertEqual(fetcher.counts["errors"], 1)
+        self.assertEqual(s3.get_data("lido_csm/operator_data/Lido"), {"2025-01-12": {"validatorCount": 7}})
+
+    def test_shard_of_is_stable(self):
+        self.assertEqual(shard_of("Lido", 16), shard_of("Lido", 16))
+        self.assertTrue(all(0 <= shard_of(f"CSM Operator {n}", 4) < 4 for n in range(100)))
+
+class TestConditionalPut(unittest.TestCase):
+    def setUp(self):
+        self.rw = S3ReadWrite("secret", "access")
+        self.stubber = Stubber(self.rw.s3)
+        self.stubber.activate()
+
+    def tearDown(self):
+        self.stubber.deactivate()
+
+    def test_precondition_failed_returns_none(self):
+        self.stubber.add_client_error("put_object", service_error_code="PreconditionFailed", http_status_code=412)
+        self.assertIsNone(self.rw.write_data_conditional("k", {"a": 1}, '"etag"'))
+
+    def test_success_returns_new_etag(self):
+        self.stubber.add_response("put_object", {"ETag": '"new"'})
+        self.assertEqual(self.rw.write_data_conditional("k", {"a": 1}), '"new"')
+
+    def test_versioned_read_errors_are_told_apart_from_missing_keys(self):
+        self.stubber.add_client_error("get_object", service_error_code="NoSuchKey", http_status_code=404)
+        self.stubber.add_client_error("get_object", service_error_code="InternalError", http_status_code=500)
+        self.assertEqual(self.rw.get_data_versioned("k"), (None, None))
+        self.assertEqual(self.rw.get_data_versioned("k"), (None, READ_FAILED))
+
+    def test_write_data_reports_failures(self):
+        self.stubber.add_response("put_object", {"ETag": '"new"'})
+        self.stubber.add_client_error("put_object", service_error_code="InternalError", http_status_code=500)
+        self.assertTrue(self.rw.write_data("k", {"a": 1}))
+        self.assertFalse(self.rw.write_data("k", {"a": 1}))
+
+    def test_condition_headers(self):
+        request = Mock(headers={})
+        self.rw._conditions.headers = {"If-Match": '"etag"'}
+        self.rw._add_conditions(request)
+        self.assertEqual(request.headers, {"If-Match": '"etag"'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+def loaded_modules(code):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    result = subprocess.run(
+        [sys.executable, "-c", f"{code}\nimport sys\nprint(','.join(sys.modules))"],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise unittest.SkipTest(f"import failed: {result.stderr.splitlines()[-1:]}")
+    return set(result.stdout.strip().split(","))
+
+class TestStartup(unittest.TestCase):
+    def test_cli_import_is_light(self):
+        modules = loaded_modules("import csm_analysis")
+        for heavy in ["pandas", "matplotlib", "seaborn", "reportlab", "requests"]:
+            self.assertNotIn(heavy, modules)
+
+    def test_fetch_stage_skips_render_modules(self):
+        modules = loaded_modules("import JobRunner, RatedHandler")
+        self.assertIn("requests", modules)
+        for heavy in ["pandas", "matplotlib", "reportlab"]:
+            self.assertNotIn(heavy, modules)
+
+    def test_analysis_stage_skips_render_modules(self):
+        modules = loaded_modules("import JobRunner, DataHandler")
+        for heavy in ["pandas", "matplotlib", "reportlab"]:
+            self.assertNotIn(heavy, modules)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from DataHandler import DataHandler
+from StateSnapshot import LazyTable, StateSnapshot, STATE_TABLES
+
+WINDOW = ["2025-01-13", "2025-01-14"]
+
+def day(validators, missed, total=1000):
+    return {
+        "startTimestamp": "2025-01-13T12:00:23",
+        "validatorCount": validators,
+        "totalUniqueAttestations": total,
+        "sumMissedAttestations": missed,
+        "avgInclusionDelay": 1.02,
+    }
+
+def analysed():
+    dh = DataHandler()
+    for n in range(5):
+        dh.ingest(f"lido_csm/operator_data/CSM Operator {n} - Lido Community Staking Module", {
+            "2025-01-13": day(n + 1, n * 3),
+            # no attestations -> nan attest_pct, None -> None per_val
+            "2025-01-14": day(n + 1, None if n == 2 else n, total=0 if n == 1 else 1000),
+        })
+    dh.ingest("lido_csm/operator_data/Obol - Lido SimpleDVT Module", {"2025-01-13": day(100, 7)})
+    dh.ingest("lido_csm/operator_data/Lido", {"2025-01-13": day(1000, 70)})
+    for module in ["csm", "sdvt", "curated"]:
+        dh.get_mva(WINDOW, module=module)
+        dh.get_statistics(module=module)
+        dh.get_zscores(module=module)
+    return dh
+
+def dump(dh, table):
+    return json.dumps(getattr(dh, table), sort_keys=True)
+
+class TestStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.dh = analysed()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_round_trip(self):
+        self.dh.save_state(self.root, meta={"window": "2025-01-13_2025-01-14"})
+        restored = DataHandler()
+
+        self.assertTrue(restored.load_state(self.root, meta={"window": "2025-01-13_2025-01-14"}))
+        for table in STATE_TABLES:
+            self.assertEqual(dump(restored, table), dump(self.dh, table), table)
+        self.assertIsInstance(restored.node_data["2025-01-13"]["CSM Operator 1 - Lido Community Staking Module"]["validatorCount"]["metric"], int)
+
+    def test_load_selected_dates(self):
+        self.dh.save_state(self.root)
+        restored = DataHandler()
+        restored.load_state(self.root, dates=["2025-01-13_2025-01-14"])
+
+        self.assertEqual(list(restored.node_data), ["2025-01-13_2025-01-14"])
+        self.assertEqual(json.dumps(restored.node_stats, sort_keys=True), json.dumps({"2025-01-13_2025-01-14": self.dh.node_stats["2025-01-13_2025-01-14"]}, sort_keys=True))
+
+    def test_dates_are_decoded_on_first_read(self):
+        self.dh.save_state(self.root)
+        restored = DataHandler()
+        restored.load_state(self.root)
+
+        self.assertEqual(sorted(restored.node_data), sorted(self.dh.node_data))
+        self.assertIsInstance(restored.node_data, LazyTable)
+        self.assertFalse(any(isinstance(dict.get(restored.node_data, date), dict) for date in restored.node_data))
+        window = restored.node_data["2025-01-13_2025-01-14"]
+        self.assertEqual(window, self.dh.node_data["2025-01-13_2025-01-14"])
+        self.assertIs(dict.get(restored.node_data, "2025-01-13_2025-01-14"), window)
+        self.assertNotIsInstance(dict.get(restored.node_data, "2025-01-13"), dict)
+        self.assertEqual(json.dumps({**restored.node_data}, sort_keys=True), dump(self.dh, "node_data"))
+
+    def test_large_ints_keep_their_precision(self):
+        big = 2 ** 60 + 1
+        self.dh.node_data["2025-01-13"]["CSM Operator 0 - Lido Community Staking Module"]["sumMissedAttestations"]["metric"] = big
+        self.dh.save_state(self.root)
+        restored = DataHandler()
+        restored.load_state(self.root)
+        self.assertEqual(restored.node_data["2025-01-13"]["CSM Operator 0 - Lido Community Staking Module"]["sumMissedAttestations"]["metric"], big)
+
+    def test_unusable_snapshots(self):
+        restored = DataHandler()
+        self.assertFalse(restored.load_state(self.root))
+
+        self.dh.save_state(self.root, meta={"window": "2025-01-13_2025-01-14"})
+        self.assertFalse(restored.load_state(self.root, meta={"window": "2025-01-12_2025-01-16"}))
+        self.assertFalse(restored.load_state(self.root, max_age=-1))
+        self.assertEqual(restored.node_data, {})
+
+    def test_new_snapshot_replaces_current(self):
+        first = self.dh.save_state(self.root)
+        self.dh.node_data["2025-01-15"] = {}
+        StateSnapshot(self.root, keep=1).write(self.dh)
+
+        self.assertFalse(os.path.exists(os.path.join(self.root, first)))
+        restored = DataHandler()
+        restored.load_state(self.root)
+        self.assertIn("2025-01-15", restored.node_data)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import unittest
+from unittest.mock import patch
+from TimeSeriesIndex import TimeSeriesIndex
+from visualizations import plot_line
+
+CSM_1 = "CSM Operator 1 - Lido Community Staking Module"
+CSM_2 = "CSM Operator 2 - Lido Community Staking Module"
+CSM_12 = "CSM Operator 12 - Lido Community Staking Module"
+
+class TestTimeSeriesIndex(unittest.TestCase):
+    def setUp(self):
+        # dates out of order, an MVA window and a None value, as node_data has them
+        self.data = {
+            "2025-01-14": {CSM_1: {"sumMissedAttestations": {"metric": 4, "per_val": 2.0}}, CSM_2: {"sumMissedAttestations": {"metric": 1, "per_val": 1.0}}},
+            "2025-01-12": {CSM_1: {"sumMissedAttestations": {"metric": 2, "per_val": 1.0}}, CSM_12: {"sumMissedAttestations": {"metric": 9, "per_val": 9.0}}},
+            "2025-01-13": {CSM_1: {"sumMissedAttestations": {"metric": None, "per_val": None}}, "Lido": {"sumMissedAttestations": {"per_val": 7.0}}},
+            "2025-01-12_2025-01-14": {CSM_1: {"sumMissedAttestations": {"per_val": 1.5}}},
+        }
+        self.agg_data = {
+            "2025-01-13": {"Lido": {"sumMissedAttestations": {"per_val": 0.5}}},
+            "2025-01-14": {"Lido Community Staking Module": {"sumMissedAttestations": {"per_val": 0.7}}},
+            "2025-01-20": {"Lido": {"sumMissedAttestations": {"per_val": 0.1}}},
+        }
+
+    def test_series_are_sorted_by_day(self):
+        index = TimeSeriesIndex(self.data, self.agg_data, [1])
+        ordinals, values = index.series(CSM_1, "sumMissedAttestations", "per_val")
+
+        self.assertEqual(index.day_labels(ordinals), ["2025-01-12", "2025-01-14"])
+        self.assertEqual(values.tolist(), [1.0, 2.0])
+        self.assertEqual(len(index.series(CSM_1, "avgCorrectness")[0]), 0)
+
+    def test_aggregates_win_and_only_cover_data_dates(self):
+        index = TimeSeriesIndex(self.data, self.agg_data, [1])
+        ordinals, values = index.series("Lido", "sumMissedAttestations", "per_val")
+
+        self.assertEqual(index.day_labels(ordinals), ["2025-01-13"])
+        self.assertEqual(values.tolist(), [0.5])
+        self.assertEqual(index.operators([1]), [CSM_1, "Lido", "Lido Community Staking Module"])
+
+    def test_operator_match_is_exact(self):
+        index = TimeSeriesIndex(self.data, self.agg_data, [1, 2])
+        self.assertEqual(index.operators([1]), [CSM_1, "Lido", "Lido Community Staking Module"])
+        self.assertNotIn(CSM_12, index.entities)
+
+    @patch("visualizations.plt")
+    @patch("visualizations.create_output_file", return_value="test_output.png")
+    def test_plot_line_leaves_data_alone(self, create_output_file, plt):
+        data, agg_data = copy.deepcopy(self.data), copy.deepcopy(self.agg_data)
+        plot_line(data, "sumMissedAttestations", [1], "per_val", agg_data)
+
+        self.assertEqual(data, self.data)
+        self.assertEqual(agg_data, self.agg_data)
+        labels = [call.kwargs["label"] for call in plt.plot.call_args_list]
+        self.assertEqual(labels, ["CSM Operator 1 ", "Lido (All)", "CSM Operators"])
+        self.assertEqual(create_output_file.call_args.args[2], "2025-01-12_2025-01-14")
+
+if __name__ == '__main__':
+    unittest.main()
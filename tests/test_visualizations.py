@@ -1,3 +1,8 @@
+import collections
+import io
+import os
+import tempfile
+import time
 import unittest
 from unittest.mock import patch, MagicMock, call
 import matplotlib.pyplot as plt
@@ -8,7 +13,8 @@ from visualizations import (
     get_average_ratings_for_dates,
     format_title,
     format_label,
-    create_output_file
+    create_output_file,
+    create_metric_page
 )
 
 class TestPlottingFunctions(unittest.TestCase):
@@ -96,4 +102,24 @@ class TestPlottingFunctions(unittest.TestCase):
         )
         self.assertEqual(highlighted, [5, 3])
         self.assertEqual(others, [4])
-        self.assertEqual(dates, list(self.test_data.keys()))
\ No newline at end of file
+        self.assertEqual(dates, list(self.test_data.keys()))
+
+    def test_metric_page_is_reproducible(self):
+        # identical reports must hash the same, ReportPublisher skips them by md5
+        def chart():
+            plt.figure()
+            plt.plot([1, 2, 3])
+            buffer = io.BytesIO()
+            plt.savefig(buffer, format="png")
+            plt.close()
+            return buffer
+
+        with tempfile.TemporaryDirectory() as tmp:
+            pages = []
+            for n in range(2):
+                path = os.path.join(tmp, f"{n}.pdf")
+                create_metric_page(path, "op", "avgCorrectness", "desc", [chart() for _ in range(7)], collections.defaultdict(lambda: 1.0), "2025-01-12_2025-01-16")
+                with open(path, "rb") as f:
+                    pages.append(f.read())
+                time.sleep(1.1)
+            self.assertEqual(pages[0], pages[1])
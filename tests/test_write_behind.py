@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+from tests.memory_s3 import MemoryS3
+from WriteBehind import WriteBehindWriter
+
+class SlowS3(MemoryS3):
+    def __init__(self, latency=0.02, failing=()):
+        super().__init__()
+        self.latency = latency
+        self.failing = set(failing)
+        self.puts = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def write_object(self, key, body, **kwargs):
+        self.release.wait()
+        time.sleep(self.latency)
+        if key in self.failing:
+            return False
+        self.puts.append(key)
+        return super().write_object(key, body, **kwargs)
+
+class TestWriteBehindWriter(unittest.TestCase):
+    def test_writes_return_before_the_put(self):
+        s3 = SlowS3()
+        writer = WriteBehindWriter(s3, workers=8)
+        started = time.perf_counter()
+        for n in range(40):
+            writer.write_data(f"lido_csm/operator_data/{n}", {"2025-01-16": {"n": n}})
+        # 40 synchronous puts would take 0.8s
+        self.assertLess(time.perf_counter() - started, 0.2)
+
+        results = writer.close()
+        self.assertEqual(len(results), 40)
+        self.assertTrue(all(results.values()))
+        self.assertEqual(s3.get_data("lido_csm/operator_data/7"), {"2025-01-16": {"n": 7}})
+
+    def test_last_write_wins_and_is_readable_before_stored(self):
+        s3 = SlowS3()
+        s3.release.clear()
+        writer = WriteBehindWriter(s3, workers=4)
+        data = {"n": 1}
+        writer.write_data("key", data)
+        # payloads are serialized when written
+        data["n"] = 2
+        writer.write_data("key", {"n": 3})
+        writer.write_data("key", {"n": 4})
+        self.assertEqual(writer.get_data("key"), {"n": 4})
+        self.assertIsNone(s3.get_data("key"))
+
+        s3.release.set()
+        writer.flush()
+        self.assertEqual(s3.get_data("key"), {"n": 4})
+        self.assertLessEqual(len(s3.puts), 2)
+        writer.close()
+
+    def test_failures_are_reported(self):
+        s3 = SlowS3(latency=0, failing={"b"})
+        writer = WriteBehindWriter(s3, workers=2, max_pending=1)
+        for key in ["a", "b", "c"]:
+            writer.write_data(key, {})
+        self.assertEqual(writer.flush(), {"a": True, "b": False, "c": True})
+        self.assertEqual(writer.failed, ["b"])
+        writer.write_data("d", {})
+        self.assertEqual(writer.close(), {"d": True})
+
+if __name__ == '__main__':
+    unittest.main()